@@ -0,0 +1,401 @@
+'''
+Nome:   Benchmark de desempenho
+Sobre:  Reproduz um vídeo gravado (ou uma pasta de imagens) através de todas as etapas da inspeção:
+        estimativa de postura, detecção de objetos, comparação com regiões de interesse e tomada de decisão.
+        Não utiliza câmera nem janela, podendo ser executado em qualquer máquina.
+        Gera um relatório JSON com os tempos de cada etapa (média, p50, p95, p99), a taxa de quadros
+        processados e o pico de memória residente (RSS).
+        Se for informado um arquivo de referência (baseline), os resultados são comparados e o programa
+        retorna código de saída 1 quando alguma etapa ficar mais lenta que a tolerância permitida.
+        Com --partida, mede o tempo até a primeira inspeção em processos novos, com os modelos carregados na
+        primeira inspeção (preguicoso), pré-carregados um após o outro (sequencial) ou em paralelo (paralelo).
+        Cada modo é medido com os pesos do darknet (.cfg + .weights) e, se existir, com o modelo pré-convertido
+        (vcad_epis.detector.modelConvertido), ou somente com o modelo informado em --modelo.
+        Com --preprocessamento, compara as cópias de frame (arrays alocados), os bytes e o tempo do
+        pré-processamento anterior (cada etapa redimensiona e converte o frame por conta própria) com o
+        pré-processamento compartilhado (vcad_epis.preprocessamento). Não carrega os modelos.
+        Com --cascata, a inspeção usa a YOLOv4-tiny antes da rede completa (vcad_epis.cascata) e o relatório
+        inclui a fração de inspeções escalonadas e a latência média da inspeção.
+        Com --paralelo, a postura e a rede são executadas ao mesmo tempo em cada frame (Inspector(paralelo=True)).
+        A etapa "inspecao" (postura + rede + decisão nos frames com pessoa) permite comparar com o modo sequencial.
+Uso:    python benchmark.py --entrada teste.mp4 --saida resultado.json --baseline benchmark_baseline.json
+        python benchmark.py --entrada pasta_de_imagens --baseline benchmark_baseline.json --atualizar-baseline
+        python benchmark.py --entrada teste.mp4 --partida
+        python benchmark.py --entrada teste.mp4 --partida --modelo YOLOv4/yolov4-epi.onnx
+        python benchmark.py --entrada teste.mp4 --preprocessamento --intervalo-inspecao 10
+        python benchmark.py --entrada teste.mp4 --cascata --zona-cinza 0.5 0.9
+        python benchmark.py --entrada teste.mp4 --paralelo
+Desenvolvedor: felipeSperb
+'''
+
+import time
+
+# Início do processo, antes de importar o OpenCV e o vcad_epis (usado na medição da partida)
+inicioProcesso = time.perf_counter()
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import cv2
+import imutils
+
+import vcad_epis as vcad
+from vcad_epis import quadros
+
+
+# ---------------------- ARQUIVOS -------------------------- #
+
+# Extensões de imagem aceitas quando a entrada é uma pasta
+extensoesImagem = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Mesma largura de frame do programa principal
+larguraFrame = 920
+
+# Etapas comparadas com o arquivo de referência
+percentisComparados = ('p50', 'p95')
+
+
+# ------------------- DECLARAR FUNÇÕES --------------------- #
+
+'''
+Gerador de frames:
+    Recebe o caminho de um vídeo, de uma pasta de imagens ou de um armazém de quadros (vcad_epis.quadros)
+    e retorna os frames em ordem.
+    As imagens de uma pasta são lidas em ordem alfabética para que o resultado seja reproduzível.
+'''
+def lerFrames(entrada, maxFrames=None):
+    lidos = 0
+    if os.path.isdir(entrada) and not quadros.ehArmazem(entrada):
+        arquivos = sorted(f for f in os.listdir(entrada) if f.lower().endswith(extensoesImagem))
+        for arquivo in arquivos:
+            if maxFrames is not None and lidos >= maxFrames:
+                return
+            frame = cv2.imread(os.path.join(entrada, arquivo))
+            if frame is None:
+                continue
+            lidos += 1
+            yield frame
+    else:
+        cap = quadros.abrirCaptura(entrada)
+        try:
+            while maxFrames is None or lidos < maxFrames:
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                lidos += 1
+                yield frame
+        finally:
+            cap.release()
+
+
+'''
+Pico de memória residente do processo em bytes.
+'''
+def picoRSS():
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # No macOS o valor é retornado em bytes, no Linux em kilobytes
+    if platform.system() == 'Darwin':
+        return pico
+    return pico * 1024
+
+
+'''
+Executa o benchmark e retorna o relatório em forma de dicionário.
+    Os primeiros frames (aquecimento) são processados mas não entram nas estatísticas.
+    zonaCinza: Se informada, usa a inspeção em cascata (YOLOv4-tiny e, quando ambígua, a rede completa).
+    paralelo: Se true, a postura e a rede são executadas ao mesmo tempo. Neste modo a rede é executada em todos
+              os frames, pois a presença de pessoa só é conhecida ao final da inspeção.
+'''
+def executar(entrada, maxFrames=None, aquecimento=5, zonaCinza=None, paralelo=False):
+    metricas = vcad.coletorMetricas(janela=100000)
+    if zonaCinza is not None:
+        inspetor = vcad.inspetorCascata(zonaCinza=zonaCinza, metricas=metricas)
+    else:
+        inspetor = vcad.Inspector(metricas=metricas, paralelo=paralelo)
+    preparador = vcad.preparadorQuadros(largura=larguraFrame, whT=inspetor.detector.whT)
+    decisoes = {}
+    frames = 0
+    inspecoes = 0
+    tempoTotal = 0.0
+
+    for n, frame in enumerate(lerFrames(entrada, maxFrames)):
+        # Durante o aquecimento os tempos não são registrados
+        metricas.habilitado = n >= aquecimento
+        if n == aquecimento and zonaCinza is not None:
+            inspetor.reiniciarResumo()
+        inicio = time.perf_counter()
+
+        with metricas.cronometrar('redimensionar'):
+            quadro = preparador.preparar(frame)
+
+        resultado = None
+        if paralelo and zonaCinza is None:
+            with metricas.cronometrar('blob'):
+                blob = quadro.blob
+            resultado = inspetor.inspect(quadro.bgr, blob=blob, imgRGB=quadro.rgb)
+            if len(resultado.lmList) == 0:
+                resultado = None
+        else:
+            lmList = inspetor.estimarPostura(quadro.bgr, quadro.rgb)
+            # Sem pessoa na cena não há inspeção, assim como no programa principal
+            if len(lmList) != 0:
+                with metricas.cronometrar('blob'):
+                    blob = quadro.blob
+                resultado = inspetor.inspect(quadro.bgr, lmList=lmList, blob=blob)
+
+        # Tempo dos frames inspecionados (a postura e a rede se sobrepõem no modo paralelo)
+        if resultado is not None and metricas.habilitado:
+            metricas.registrar('inspecao', time.perf_counter() - inicio)
+            decisoes[resultado.decisao] = decisoes.get(resultado.decisao, 0) + 1
+            inspecoes += 1
+
+        decorrido = time.perf_counter() - inicio
+        if metricas.habilitado:
+            metricas.registrar('total', decorrido)
+            tempoTotal += decorrido
+            frames += 1
+
+    resumo = metricas.resumo()
+    relatorio = {
+        'entrada': entrada,
+        'frames': frames,
+        'inspecoes': inspecoes,
+        'decisoes': decisoes,
+        'fps': frames / tempoTotal if tempoTotal else 0.0,
+        'pico_rss_bytes': picoRSS(),
+        'etapas': resumo['etapas'],
+        'ambiente': {
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'plataforma': platform.platform()
+        }
+    }
+    if zonaCinza is not None:
+        relatorio['cascata'] = inspetor.resumoCascata()
+    return relatorio
+
+
+# Modos de partida comparados em --partida
+modosPartida = ('preguicoso', 'sequencial', 'paralelo')
+
+
+'''
+Mede a partida neste processo: cria o inspetor, pré-carrega os modelos conforme o modo e inspeciona o primeiro
+frame da entrada. Deve ser executada em um processo novo (ver medirPartidas).
+    pesos: Arquivo de pesos da rede (.weights ou .onnx). Padrão para o do detector (ver detector.pesosPadrao).
+'''
+def medirPartida(entrada, modo, pesos=None):
+    frame = imutils.resize(next(lerFrames(entrada, 1)), width=larguraFrame)
+    inicio = time.perf_counter()
+    inspetor = vcad.Inspector(detector=vcad.detectorEPI(pesos=pesos))
+    if modo != 'preguicoso':
+        inspetor.aquecer(paralelo=modo == 'paralelo')
+    pronto = time.perf_counter()
+    inspetor.inspect(frame)
+    fim = time.perf_counter()
+    return {
+        'modo': modo,
+        'modelo': os.path.basename(inspetor.detector.pesos),
+        'importacao': inicio - inicioProcesso,
+        'preparacao': pronto - inicio,
+        'primeira_inspecao': fim - pronto,
+        'ate_primeira_inspecao': fim - inicioProcesso
+    }
+
+
+'''
+Executa cada modo de partida, com cada modelo, em um processo novo e retorna os tempos (em segundos).
+    "processo" inclui a inicialização do interpretador Python.
+    modelos: Arquivos de pesos comparados. Padrão para os pesos do darknet e, se existir, o modelo pré-convertido.
+'''
+def medirPartidas(entrada, modelos=None):
+    if modelos is None:
+        modelos = [vcad.detector.modelWeights]
+        if os.path.exists(vcad.detector.modelConvertido):
+            modelos.append(vcad.detector.modelConvertido)
+    resultados = []
+    for pesos in modelos:
+        for modo in modosPartida:
+            inicio = time.perf_counter()
+            comando = [sys.executable, os.path.abspath(__file__), '--entrada', entrada, '--partida-modo', modo,
+                       '--modelo', pesos]
+            saida = subprocess.run(comando, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+            dados = json.loads(saida.stdout.strip().splitlines()[-1])
+            dados['processo'] = time.perf_counter() - inicio
+            resultados.append(dados)
+    return {'entrada': entrada, 'partida': resultados}
+
+
+'''
+Pré-processamento anterior ao vcad_epis.preprocessamento, como era feito no programa principal:
+    redimensionamento, RGB para a postura, blob da rede e miniatura (somente nos frames inspecionados)
+    e RGB para a exibição. Retorna os arrays criados.
+'''
+def preprocessamentoSeparado(frame, inspecionar, whT=416):
+    criados = []
+    frame = imutils.resize(frame, width=larguraFrame)
+    criados.append(frame)
+    criados.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    if inspecionar:
+        criados.append(cv2.dnn.blobFromImage(frame, 1 / 255, (whT, whT), [0, 0, 0], 1, crop=False))
+        miniatura = imutils.resize(frame, width=350)
+        criados.append(miniatura)
+        criados.append(cv2.cvtColor(miniatura, cv2.COLOR_BGR2RGB))
+    criados.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    return criados
+
+
+# Mesmas representações, com o pré-processamento compartilhado
+def preprocessamentoCompartilhado(preparador, frame, inspecionar):
+    quadro = preparador.preparar(frame)
+    quadro.rgb
+    if inspecionar:
+        quadro.blob
+        quadro.miniatura()
+    return quadro
+
+
+'''
+Compara o pré-processamento separado com o compartilhado nos mesmos frames (decodificados uma única vez).
+    Um a cada "intervaloInspecao" frames é tratado como frame inspecionado (blob e miniatura).
+    Cópias são arrays de imagem alocados: no compartilhado, somente os buffers criados na primeira vez.
+'''
+def compararPreprocessamento(entrada, maxFrames=None, intervaloInspecao=10):
+    preparador = vcad.preparadorQuadros(largura=larguraFrame)
+    separado = {'copias': 0, 'bytes': 0, 'tempo': 0.0}
+    compartilhado = {'tempo': 0.0}
+    frames = 0
+    inspecoes = 0
+
+    for n, frame in enumerate(lerFrames(entrada, maxFrames)):
+        inspecionar = n % intervaloInspecao == 0
+        inicio = time.perf_counter()
+        criados = preprocessamentoSeparado(frame, inspecionar)
+        meio = time.perf_counter()
+        preprocessamentoCompartilhado(preparador, frame, inspecionar)
+        fim = time.perf_counter()
+
+        separado['copias'] += len(criados)
+        separado['bytes'] += sum(c.nbytes for c in criados)
+        separado['tempo'] += meio - inicio
+        compartilhado['tempo'] += fim - meio
+        frames += 1
+        inspecoes += inspecionar
+
+    if frames == 0:
+        return {'entrada': entrada, 'frames': 0}
+    compartilhado['copias'] = preparador.alocacoes
+    compartilhado['bytes'] = preparador.bytesAlocados
+    porFrame = lambda r: {
+        'copias_por_frame': r['copias'] / frames,
+        'bytes_por_frame': r['bytes'] / frames,
+        'ms_por_frame': 1000 * r['tempo'] / frames
+    }
+    return {
+        'entrada': entrada,
+        'frames': frames,
+        'inspecoes': inspecoes,
+        'separado': dict(porFrame(separado), copias=separado['copias']),
+        'compartilhado': dict(porFrame(compartilhado), copias=compartilhado['copias'],
+                              operacoes=preparador.operacoes),
+        'copias_removidas_por_frame': (separado['copias'] - compartilhado['copias']) / frames
+    }
+
+
+'''
+Compara o relatório com o arquivo de referência:
+    Uma etapa regride quando um percentil ficar maior que a referência multiplicada por (1 + tolerancia).
+    A taxa de quadros regride quando ficar menor que a referência dividida por (1 + tolerancia).
+    Retorna a lista de regressões encontradas.
+'''
+def comparar(relatorio, referencia, tolerancia=0.15):
+    regressoes = []
+    for etapa, valores in referencia.get('etapas', {}).items():
+        atual = relatorio['etapas'].get(etapa)
+        if atual is None:
+            continue
+        for p in percentisComparados:
+            limite = valores[p] * (1 + tolerancia)
+            if valores[p] > 0 and atual[p] > limite:
+                regressoes.append({'etapa': etapa, 'metrica': p, 'referencia': valores[p], 'atual': atual[p]})
+
+    fpsReferencia = referencia.get('fps', 0.0)
+    if fpsReferencia and relatorio['fps'] < fpsReferencia / (1 + tolerancia):
+        regressoes.append({'etapa': 'total', 'metrica': 'fps', 'referencia': fpsReferencia, 'atual': relatorio['fps']})
+
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de desempenho do VCAD_EPIs sem câmera e sem janela.')
+    parser.add_argument('--entrada', required=True, help='vídeo ou pasta de imagens')
+    parser.add_argument('--frames', type=int, default=None, help='quantidade máxima de frames')
+    parser.add_argument('--aquecimento', type=int, default=5, help='frames descartados no início')
+    parser.add_argument('--saida', default=None, help='arquivo JSON do relatório (padrão: terminal)')
+    parser.add_argument('--baseline', default=None, help='arquivo JSON de referência')
+    parser.add_argument('--tolerancia', type=float, default=0.15, help='tolerância relativa (padrão 0.15)')
+    parser.add_argument('--atualizar-baseline', action='store_true', help='grava o resultado como nova referência')
+    parser.add_argument('--partida', action='store_true', help='mede o tempo até a primeira inspeção')
+    parser.add_argument('--partida-modo', choices=modosPartida, help=argparse.SUPPRESS)
+    parser.add_argument('--modelo', default=None,
+                        help='pesos medidos em --partida (.weights ou .onnx, padrão: darknet e o modelo convertido)')
+    parser.add_argument('--preprocessamento', action='store_true',
+                        help='compara as cópias do pré-processamento separado e do compartilhado')
+    parser.add_argument('--cascata', action='store_true', help='inspeção em cascata (YOLOv4-tiny + YOLOv4)')
+    parser.add_argument('--zona-cinza', type=float, nargs=2, default=(0.5, 0.9), metavar=('MINIMO', 'MAXIMO'),
+                        help='confianças incertas da tiny na cascata (padrão 0.5 0.9)')
+    parser.add_argument('--paralelo', action='store_true', help='postura e rede executadas ao mesmo tempo')
+    parser.add_argument('--intervalo-inspecao', type=int, default=10,
+                        help='um frame inspecionado a cada N frames em --preprocessamento (padrão 10)')
+    args = parser.parse_args(argv)
+
+    if args.partida_modo:
+        print(json.dumps(medirPartida(args.entrada, args.partida_modo, args.modelo)))
+        return 0
+    if args.partida or args.preprocessamento:
+        if args.partida:
+            relatorio = medirPartidas(args.entrada, [args.modelo] if args.modelo else None)
+        else:
+            relatorio = compararPreprocessamento(args.entrada, args.frames, args.intervalo_inspecao)
+        texto = json.dumps(relatorio, indent=2)
+        if args.saida:
+            with open(args.saida, 'w') as f:
+                f.write(texto)
+        else:
+            print(texto)
+        return 0
+
+    relatorio = executar(args.entrada, args.frames, args.aquecimento, args.zona_cinza if args.cascata else None,
+                         args.paralelo)
+
+    regressoes = []
+    if args.baseline and not args.atualizar_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'rt') as f:
+            referencia = json.load(f)
+        regressoes = comparar(relatorio, referencia, args.tolerancia)
+        relatorio['regressoes'] = regressoes
+
+    texto = json.dumps(relatorio, indent=2)
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.baseline and args.atualizar_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(texto)
+
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
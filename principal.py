@@ -21,18 +21,14 @@ from tkinter import filedialog
 from PIL import Image
 from PIL import ImageTk
 import cv2
-import imutils
-import numpy as np
 import time
+import threading
 import cvzone
 
 
 # ------------------ IMPORTAR CLASSES ---------------------- #
 
-import estimativa_de_postura as ep
-
-# Ativação classe de estimativa de postura
-pose = ep.poseDetector()
+import vcad_epis as vcad
 
 # ---------------------- ARQUIVOS -------------------------- #
 
@@ -101,41 +97,22 @@ myIconesNeutro = [
 # Endereço de histórico
 hist_path = "Arquivos/Imagens_Registradas"
 
-# Abrir e ler arquivos de classes de objetos
-classesFile = 'YOLOv4/epi.names'
-classNames = []
-with open(classesFile, 'rt') as f:
-    classNames = f.read().rstrip('\n').split('\n')
-
-# Arquivo com arquitetura YOLOv4 modificada
-modelConfiguration = "YOLOv4/yolov4-epi.cfg"
-# Arquivo de pesos treinados
-modelWeights = "YOLOv4/yolov4-epi360_3200.weights"
-
+# Arquivo de política da portaria (EPIs obrigatórios, limiares e regras de região de interesse).
+# Alterações no arquivo são aplicadas com o programa em execução.
+myPolitica = myPath + "Politicas/padrao.json"
 
-# ------------ CONFIGURAÇÃO DE BACKEND ------------ #
+# Registro das inspeções (decisão, status de cada classe, confianças, tempos e ângulos), um JSON por linha
+myRegistro = myPath + "Registros/inspecoes.jsonl"
 
-# Configurar framework darknet como backend usando openCV
-net = cv2.dnn.readNetFromDarknet(modelConfiguration, modelWeights)
-# Configurar opencv como backend
-net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-# Configurar cpu
-net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+# Auditoria das mudanças do controle adaptativo de qualidade, um JSON por linha
+myRegistroQualidade = myPath + "Registros/qualidade.jsonl"
 
 
 # ----------------- VARIAVEIS GLOBAIS ---------------------- #
 
-# Proporções da imagem de entrada da CNN
-whT = 416
-# Confiança mínima da rede
-confThreshold = 0.9
-# Supressão não máxima. Limite de IOU
-nmsThreshold = 0.3
-
-# Variáveis de contagem
-t = 0
-espera = 0
-tempoDetect = 0
+# Tempos da inspeção: duração de cada número da contagem, números da contagem,
+# intervalo mínimo entre contagens (tempo de ciclo) e tempo de exibição do resultado
+temposInspecao = vcad.temposInspecao(passo=1.0, contagem=3, intervalo=5.0, exibicao=30.0)
 
 # Variáveis de configuração. O objeto só será detectado quando igual a 1
 chMascara = 1
@@ -146,6 +123,56 @@ chColete = 1
 chLuva = 1
 chBota = 1
 
+# Instrumentação das etapas. Se definido como False, nenhuma medição é realizada
+habilitarMetricas = True
+# Porta do endpoint local /metrics. Se definido como None, o servidor não é iniciado
+portaMetricas = None
+
+metricas = vcad.coletorMetricas(habilitado=habilitarMetricas)
+if habilitarMetricas and portaMetricas is not None:
+    metricas.iniciarServidor(portaMetricas)
+
+# Tempo máximo de processamento por frame (segundos). Em computadores mais fracos a qualidade é reduzida
+# (complexidade da postura, frames sem postura, resolução da rede e taxa de exibição) para respeitá-lo
+orcamentoFrame = 1 / 15
+
+# Contagem de frames, usada para estimar a postura a cada N frames (saltoPose)
+framesPostura = 0
+# Momento da última atualização da imagem no menu
+ultimaExibicao = 0.0
+
+
+# ------------------ INICIAR INSPEÇÃO ---------------------- #
+
+# Inspeção de EPIs (YOLOv4 + estimativa de postura). Os modelos são carregados na primeira inspeção
+# A postura do frame capturado é estimada em qualidade máxima (imagem estática, fora do controle de qualidade),
+# ao mesmo tempo que a rede é executada
+inspetor = vcad.Inspector(metricas=metricas, pose=vcad.poseDetector(mode=True), paralelo=True)
+
+# Classe de estimativa de postura usada na contagem da pose de inspeção
+pose = vcad.poseDetector()
+
+# Pré-processamento compartilhado: redimensionamento, RGB, blob da rede e miniatura calculados uma vez por frame
+preparador = vcad.preparadorQuadros(largura=920, whT=inspetor.detector.whT, larguraMiniatura=350)
+
+# Máquina de estados da contagem, captura e restauração do menu
+maquina = vcad.maquinaInspecao(temposInspecao)
+
+# Nomes das classes de objetos
+classNames = inspetor.classNames
+
+# Registro das inspeções, com gravação em blocos e rotação dos arquivos
+registro = vcad.registroInspecoes(myRegistro, classNames=classNames)
+
+# Controle adaptativo de qualidade, com auditoria de cada mudança de nível
+registroQualidade = vcad.registroInspecoes(myRegistroQualidade, classNames=classNames)
+qualidade = vcad.controladorQualidade(
+    orcamentoFrame, registro=registroQualidade,
+    aoMudar=lambda nivel: vcad.aplicarNivel(nivel, pose, inspetor.detector, preparador))
+
+# Observa o arquivo de política. A verificação é chamada pela janela principal (verificarPolitica)
+observadorPolitica = vcad.observadorPolitica(myPolitica, lambda politica: aplicarPolitica(politica))
+
 
 # ------------------- INICIAR HARDWARES -------------------- #
 
@@ -157,28 +184,11 @@ cap = cv2.VideoCapture(0)
 
 '''
 Função de detecção de objetos:
-    Recebe o frame a ser analisado, realiza as operações previstas pela CNN, realiza as detecções levando em 
-    consideração os índices de confiança mínima e de limite de IOU, salva o frame junto de arquivo .txt com as 
-    coordenadas da detecção, compara as coordenadas espaciais da detecção com a zona de interesse do corpo,
-    desenha as caixas delimitadoras dos objetos na imagem e realiza a tomada de decisão. 
+    Recebe o frame preparado a ser analisado e realiza a inspeção (detecção, comparação com a zona de interesse
+    do corpo e tomada de decisão) através da biblioteca vcad_epis, salva o frame junto de arquivo .txt com as
+    coordenadas da detecção, desenha as caixas delimitadoras dos objetos na imagem e atualiza o menu.
 '''
-def encontrarEPI(frame):
-
-    # Arrays de detecção
-    bbox = []
-    classIds = []
-    confs = []
-    posicao = []
-    pos = [0, 0, 0, 0, 0, 0, 0]
-
-    # Contagem de alertas
-    alert = 0
-
-    # Variável aux para colar ícones em miniatura de imagem
-    deslocaIcon = 0
-
-    # Recebe tempo real
-    relogio = time.localtime()
+def encontrarEPI(quadro):
 
     # Status dos objetos
     global chMascara
@@ -189,226 +199,82 @@ def encontrarEPI(frame):
     global chLuva
     global chBota
 
-    # Variáveis auxiliares na detecção de luvas e botas
-    compLuvaDir = 0
-    compLuvaEsq = 0
-    compBotaDir = 0
-    compBotaEsq = 0
-
-    # Converte imagem em um objeto BLOB
-    blob = cv2.dnn.blobFromImage(frame, 1 / 255, (whT, whT), [0, 0, 0], 1, crop=False)
-    # Define blob como entrada da rede
-    net.setInput(blob)
-    # Estrutura da rede treinada
-    layerNames = net.getLayerNames()
-    # Camadas da rede não conectadas
-    outputNames = [layerNames[i[0] - 1] for i in net.getUnconnectedOutLayers()]
-    # Retorna lista de objetos detectados
-    outputs = net.forward(outputNames)
-
-    # Retorna as dimenções da imagem
-    hT, wT, cT = frame.shape
-
-    # Para cada detecção
-    for output in outputs:
-        for det in output:
-            # Armazena a confiança correspondente a cada objeto
-            scores = det[5:]
-            # Índice correspondente a classe com maior confiança
-            classId = np.argmax(scores)
-            # Valor de confiança referente a classe
-            confidence = scores[classId]
-
-            # Se confiança maior que confiança minima:
-            if confidence > confThreshold:
-                # Adiciona as coordenadas a lista posição
-                posicao.append([det[0], det[1], det[2], det[3]])
-                # Converte as coordenadas para as proporções da imagem
-                w, h = int(det[2] * wT), int(det[3] * hT)
-                x, y = int((det[0] * wT) - w / 2), int((det[1] * hT) - h / 2)
-                # Adiciona as coordenadas convertidas à lista bbox
-                bbox.append([x, y, w, h])
-                # Adiciona o índice correspondente a classe na lista classIds
-                # 0 = mascara, 1 = capacete, 2 = óculos, 3 = abafador, 4 = colete, 5 = luva, 6 = bota.
-                classIds.append(classId)
-                # Adiciona o valor de confiança da classe a lista confs
-                confs.append(float(confidence))
-
-    # Executa supressão não máxima
-    indices = cv2.dnn.NMSBoxes(bbox, confs, confThreshold, nmsThreshold)
-
-    # Caso houver detecção
-    if classIds:
-        # Salvar cópia de imagem na pasta de positivos
-        cv2.imwrite(myImagensPositivas + str(relogio.tm_year) + "-" + str(relogio.tm_mon) + "-" +
-                    str(relogio.tm_mday) + "_" + str(relogio.tm_hour) + "-" +
-                    str(relogio.tm_min) + "-" + str(relogio.tm_sec) + "_Positivo" + ".png", frame)
-        # Cria arquivo de marcação
-        arquivo = open(myImagensPositivas + str(relogio.tm_year) + "-" + str(relogio.tm_mon) + "-" +
-                       str(relogio.tm_mday) + "_" + str(relogio.tm_hour) + "-" +
-                       str(relogio.tm_min) + "-" + str(relogio.tm_sec) + "_Positivo" + '.txt', 'a')
-
-        # Para cada uma das detecções
-        for i in indices:
-            i = i[0]
-            box = bbox[i]
-            x, y, w, h = box[0], box[1], box[2], box[3]
-
-            # Comparar Objeto com a região de interesse
-            comp = pose.comparar(frame, x, y, w, h, classIds[i])
-
-            '''
-            Os EPIs detectados que coincidirem com a região de interesse serão marcados com a cor verde.
-            Os EPIs detectados que NÃO coincidirem serão marcados de amarelo.
-            As detecções de luvas e botas serão marcadas na imagem, mas a detecção só será completa se os membros direito e esquerdo forem detectados. 
-            '''
-            if comp == 1:
-                # Sucesso na comparação com zona de interesse
-                img2 = PhotoImage(file=myIconesPositivos[classIds[i]])
-                corBox = (0, 255, 0)
-            elif comp == 2:
-                # Sucesso na comparação de um EPI localizado em um membro direito
-                img2 = PhotoImage(file=myIconesPositivos[classIds[i]])
-                corBox = (0, 255, 0)
-                if classIds[i] == 5:
-                    compLuvaDir += 1
-                elif classIds[i] == 6:
-                    compBotaDir += 1
-            elif comp == 3:
-                # Sucesso na comparação de um EPI localizado em um membro esquerdo
-                img2 = PhotoImage(file=myIconesPositivos[classIds[i]])
-                corBox = (0, 255, 0)
-                if classIds[i] == 5:
-                    compLuvaEsq += 1
-                elif classIds[i] == 6:
-                    compBotaEsq += 1
-            else:
-                # Inssucesso na comparação com zona de interesse
-                img2 = PhotoImage(file=myIconesAlerta[classIds[i]])
-                corBox = (0, 255, 255)
-                alert += 1
-
-            # Desenhar caixa delimitadora na imagem
-            cv2.rectangle(frame, (x, y), (x + w, y + h), corBox, 1)
-
-            # Escrever rótulo na caixa
-            cv2.putText(frame, f'{classNames[classIds[i]].upper()} {int(confs[i] * 100)}%', (x, y - 10),
-                        cv2.FONT_HERSHEY_COMPLEX, 0.6, corBox, 1)
-
-            # Escrever em arquivo de coordenadas
-            arquivo.write(str(classIds[i]) + " " + str(posicao[i][0]) + " " + str(posicao[i][1]) + " " + str(posicao[i][2]) + " " + str(posicao[i][3]) + "\n")
-
-            # Incerir icone do objeto na imagem miniatura
-            iconePositivo = cv2.imread(myIconesPositivos[classIds[i]], cv2.IMREAD_UNCHANGED)
+    # Variável aux para colar ícones em miniatura de imagem
+    deslocaIcon = 0
+
+    # EPIs levados em conta na tomada de decisão
+    requeridos = [chMascara, chCapacete, chOculos, chAbafador, chColete, chLuva, chBota]
+
+    # Inspeção com a postura e a rede executadas em paralelo
+    # A rede recebe o blob gerado no pré-processamento
+    resultado = inspetor.inspect(quadro.bgr, requeridos=requeridos, blob=quadro.blob, imgRGB=quadro.rgb)
+    registro.registrar(resultado, portaria='principal')
+
+    # Salvar cópia de imagem na pasta de positivos ou negativos, com o arquivo de marcação
+    with metricas.cronometrar('evidencias'):
+        vcad.salvarEvidencias(myPath, quadro.bgr, resultado)
+
+    '''
+    Os EPIs detectados que coincidirem com a região de interesse serão marcados com a cor verde.
+    Os EPIs detectados que NÃO coincidirem serão marcados de amarelo.
+    As detecções de luvas e botas serão marcadas na imagem, mas a detecção só será completa se os membros direito e esquerdo forem detectados. 
+    '''
+    # As caixas são desenhadas na imagem exibida (RGB), que também dá origem à miniatura
+    vcad.desenharResultado(quadro.rgb, resultado, classNames, ordemRGB=True)
+
+    with metricas.cronometrar('miniatura'):
+        miniatura = quadro.miniatura()
+
+        # Incerir icone do objeto na imagem miniatura (ícones já reduzidos para a escala da miniatura)
+        for d in resultado.deteccoes:
+            iconePositivo = preparador.iconeMiniatura(myIconesPositivos[d.classId])
             hf, wf, cf = iconePositivo.shape
-            hb, wb, cb = frame.shape
-            frame = cvzone.overlayPNG(frame, iconePositivo, [0 + deslocaIcon, hb - hf])
-            deslocaIcon += 75
-
-            # Substituir icone e escrever a confiança da detecção no menu
-            if classIds[i] == 0 and chMascara == 1:
-                lblIcone0.configure(image=img2)
-                lblIcone0.image =img2
-                lblPerIcone0.configure(text=f'{int(confs[i] * 100)}%')
-                pos[0] = 1
-            elif classIds[i] == 1 and chCapacete == 1:
-                lblIcone1.configure(image=img2)
-                lblIcone1.image = img2
-                lblPerIcone1.configure(text=f'{int(confs[i] * 100)}%')
-                pos[1] = 1
-            elif classIds[i] == 2 and chOculos == 1:
-                lblIcone2.configure(image=img2)
-                lblIcone2.image = img2
-                lblPerIcone2.configure(text=f'{int(confs[i] * 100)}%')
-                pos[2] = 1
-            elif classIds[i] == 3 and chAbafador == 1:
-                lblIcone3.configure(image=img2)
-                lblIcone3.image = img2
-                lblPerIcone3.configure(text=f'{int(confs[i] * 100)}%')
-                pos[3] = 1
-            elif classIds[i] == 4 and chColete == 1:
-                lblIcone4.configure(image=img2)
-                lblIcone4.image = img2
-                lblPerIcone4.configure(text=f'{int(confs[i] * 100)}%')
-                pos[4] = 1
-            elif classIds[i] == 5 and chLuva == 1:
-                if compLuvaDir != 0 and compLuvaEsq != 0:
-                    lblIcone5.configure(image=img2)
-                    lblIcone5.image = img2
-                    lblPerIcone5.configure(text=f'{int(confs[i] * 100)}%')
-                    pos[5] = 1
-            elif classIds[i]==6 and chBota == 1:
-                if compBotaDir != 0 and compBotaEsq != 0:
-                    lblIcone6.configure(image=img2)
-                    lblIcone6.image = img2
-                    lblPerIcone6.configure(text=f'{int(confs[i] * 100)}%')
-                    pos[6] = 1
-
-        # Fechar arquivo
-        arquivo.close()
-
-    # Se não houver detecção, salva imagem na pasta de negativos com arquivo txt de mesmo nome
-    else:
-        cv2.imwrite(myImagensNegativas + str(relogio.tm_year) + "-" + str(relogio.tm_mon) + "-" +
-                    str(relogio.tm_mday) + "_" + str(relogio.tm_hour) + "-" +
-                    str(relogio.tm_min) + "-" + str(relogio.tm_sec) + "_Negativo" + ".png", frame)
-
-        arquivo = open(myImagensNegativas + str(relogio.tm_year) + "-" + str(relogio.tm_mon) + "-" +
-                       str(relogio.tm_mday) + "_" + str(relogio.tm_hour) + "-" +
-                       str(relogio.tm_min) + "-" + str(relogio.tm_sec) + "_Negativo" + '.txt', 'a')
-
-
-    # Imprime miniatura da detecção no menu
-    frame = imutils.resize(frame, width=350)
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    im2 = Image.fromarray(frame)
-    img2 = ImageTk.PhotoImage(image=im2)
-    lblDeteccao.configure(image=img2)
-    lblDeteccao.image = img2
-
-    # Substitui icones dos objetos não detectados
-    if pos[0] != 1 and chMascara == 1:
-        img3 = PhotoImage(file=myIconesNegativos[0])
-        lblIcone0.configure(image=img3)
-        lblIcone0.image = img3
-    if pos[1] != 1 and chCapacete == 1:
-        img3 = PhotoImage(file=myIconesNegativos[1])
-        lblIcone1.configure(image=img3)
-        lblIcone1.image = img3
-    if pos[2] != 1 and chOculos == 1:
-        img3 = PhotoImage(file=myIconesNegativos[2])
-        lblIcone2.configure(image=img3)
-        lblIcone2.image = img3
-    if pos[3] != 1 and chAbafador == 1:
-        img3 = PhotoImage(file=myIconesNegativos[3])
-        lblIcone3.configure(image=img3)
-        lblIcone3.image = img3
-    if pos[4] != 1 and chColete == 1:
-        img3 = PhotoImage(file=myIconesNegativos[4])
-        lblIcone4.configure(image=img3)
-        lblIcone4.image = img3
-    if pos[5] != 1 and chLuva == 1:
-        img3 = PhotoImage(file=myIconesNegativos[5])
-        lblIcone5.configure(image=img3)
-        lblIcone5.image = img3
-    if pos[6] != 1 and chBota == 1:
-        img3 = PhotoImage(file=myIconesNegativos[6])
-        lblIcone6.configure(image=img3)
-        lblIcone6.image = img3
-
-    # Compara detecções com expectativas
-    detectObj = 0
-    Obj = chMascara + chCapacete + chOculos + chColete + chAbafador + chLuva + chBota
-    detectObj = pos[0] + pos[1] + pos[2] + pos[3] + pos[4] + pos[5] + pos[6]
+            hb, wb, cb = miniatura.shape
+            miniatura = cvzone.overlayPNG(miniatura, iconePositivo, [0 + deslocaIcon, hb - hf])
+            deslocaIcon += wf
+
+        # Imprime miniatura da detecção no menu
+        im2 = Image.fromarray(miniatura)
+        img2 = ImageTk.PhotoImage(image=im2)
+        lblDeteccao.configure(image=img2)
+        lblDeteccao.image = img2
+
+    # Substitui icones e escreve a confiança da detecção no menu
+    for c, status in enumerate(resultado.status):
+        if status == vcad.IGNORADO:
+            continue
+        if status == vcad.POSITIVO:
+            img3 = PhotoImage(file=myIconesPositivos[c])
+        elif status == vcad.ALERTA:
+            img3 = PhotoImage(file=myIconesAlerta[c])
+        else:
+            img3 = PhotoImage(file=myIconesNegativos[c])
+        lblIcones[c].configure(image=img3)
+        lblIcones[c].image = img3
+        if resultado.confiancas[c] is not None:
+            lblPerIcones[c].configure(text=f'{int(resultado.confiancas[c] * 100)}%')
 
     # TOMADA DE DECISÃO
-    if Obj == detectObj and alert == 0:
+    if resultado.decisao == vcad.LIBERADO:
         btnAcesso.configure(text="ACESSO LIBERADO", bg="green")
-    elif alert > 0:
+    elif resultado.decisao == vcad.MAL_POSICIONADO:
         btnAcesso.configure(text="EPI MAL POSICIONADO", bg="yellow")
     else:
         btnAcesso.configure(text="ACESSO NEGADO", bg="red")
 
+    return resultado
+
+
+# Estima a postura no frame preparado e retorna os pontos encontrados
+def estimarPostura(quadro):
+    # Chama classe de estimativa de postura, com a imagem RGB do pré-processamento.
+    # Substituindo False por True, a estimativa será desenhada na imagem.
+    with metricas.cronometrar('findPose'):
+        frame = pose.findPose(quadro.bgr, False, imgRGB=quadro.rgb)
+    # Define os pontos encontrados
+    with metricas.cronometrar('findPosition'):
+        return pose.findPosition(frame, False)
+
 
 '''
 Função de Estimativa de Postura Humana:
@@ -416,78 +282,82 @@ Função de Estimativa de Postura Humana:
     A detecção será realizada somente na pessoa mais bem posicionada na imagem.
     Se a pessoa permanecer na postura de inspeção por 3 segundos, o frame será enviado para CNN.
     O menu é restaurado após 30 segundos da última detecção.
+    A contagem e os tempos são controlados pela máquina de estados (vcad_epis.estado).
+    Com o controle de qualidade, a postura pode ser estimada a cada N frames (nos demais os últimos pontos são
+    mantidos). A postura do frame enviado para a CNN é estimada novamente pela inspeção, em qualidade máxima.
 '''
-def detectPostura (frame):
+def detectPostura (quadro):
+    global framesPostura
+
+    frame = quadro.bgr
+    estimada = framesPostura % qualidade.nivel.saltoPose == 0
+    framesPostura += 1
+    lmList = estimarPostura(quadro) if estimada else pose.lmList
+
+    # Se os ângulos dos braços estiverem corretos a contagem avança.
+    # Se a postura permanecer durante a contagem, chama a função de detecção de objetos.
+    pessoa = len(lmList) != 0
+    emPostura = pessoa and pose.posturaInspecao(frame)
+
+    for evento in maquina.atualizar(pessoa, emPostura):
+        if evento.tipo == vcad.CAPTURADO:
+            with metricas.cronometrar('inspecao'):
+                resultado = encontrarEPI(quadro)
+            maquina.decidido(resultado)
+        # O Menu será restaurado após 30 segundos da última detecção
+        elif evento.tipo == vcad.RESTAURADO:
+            restauraMenu()
+
+    # Exibe a contagem na imagem (RGB)
+    if maquina.contador != 0:
+        cv2.putText(quadro.rgb, str(maquina.contador), (460, 650), cv2.FONT_HERSHEY_COMPLEX, 3, (255, 255, 0), 2)
+        cv2.circle(quadro.rgb, (490, 620), 50, (255, 255, 0), 2)
 
-    # Variáveis de contagem
-    global t
-    global espera
-    global tempoDetect
-    tempo = time.time()
-
-    # Chama classe de estimativa de postura.
-    # Substituindo False por True, a estimativa será desenhada na imagem.
-    frame = pose.findPose(frame, False)
-    # Define os pontos encontrados
-    lmList = pose.findPosition(frame, False)
-
-    # Apenas se houver detecção...
-    if len(lmList) != 0:
-
-        # Calcula ângulo dos pontos referentes ao ombro, ao cotovelo e ao pulso dos dois braços.
-        bracoDireito = pose.findAngle(frame, 12, 14, 16)
-        bracoEsquerdo = pose.findAngle(frame, 11, 13, 15)
-
-        # Se os ângulos estiverem corretos iniciará a contagem.
-        # Se a postura permanecer durante 3 segundos, chama a função de detecção de objetos.
-        if 20 < bracoEsquerdo < 160 and -160 < bracoDireito < -20:
-            if (t == 3) and (tempo - espera >= 3):
-                t = 0
-                encontrarEPI(frame)
-                tempoDetect = tempo
-            elif (t == 2) and (tempo - espera >= 2):
-                t = 3
-                cv2.putText(frame, str(t), (460, 650), cv2.FONT_HERSHEY_COMPLEX, 3, (0, 255, 255), 2)
-                cv2.circle(frame, (490, 620), 50, (0, 255, 255), 2)
-            elif (t == 1) and (tempo - espera >= 1):
-                t = 2
-                cv2.putText(frame, str(t), (460, 650), cv2.FONT_HERSHEY_COMPLEX, 3, (0, 255, 255), 2)
-                cv2.circle(frame, (490, 620), 50, (0, 255, 255), 2)
-            elif (t == 0) and (tempo - espera >= 5):
-                t = 1
-                cv2.putText(frame, str(t), (460, 650), cv2.FONT_HERSHEY_COMPLEX, 3, (0, 255, 255), 2)
-                cv2.circle(frame, (490, 620), 50, (0, 255, 255), 2)
-                espera = tempo
-        else:
-            t = 0
 
-    # O Menu será restaurado após 30 segundos da última detecção
-    if tempoDetect != 0 and tempo - tempoDetect >= 30:
-        restauraMenu()
-        tempoDetect = 0
+'''
+Pré-carregamento dos modelos, executado em segundo plano na abertura do programa.
+'''
+def aquecerModelos():
+    try:
+        inicio = time.perf_counter()
+        # A postura da contagem primeiro, pois é usada desde o primeiro frame
+        pose.aquecer()
+        inspetor.aquecer()
+        tempo = time.perf_counter() - inicio
+    except Exception as erro:
+        # Os modelos serão carregados na primeira inspeção
+        print('Falha no pré-carregamento dos modelos: {}'.format(erro))
+        return
+    print('Modelos carregados em {:.1f} s, pronto para inspeção'.format(tempo))
 
 
 '''
 Função de visualização de imagem:
-    Redimenciona a imagem, chama a função de estimativa de postura, 
-    converte a imagem de BGR para RGB e atualiza o frame no menu.
+    Prepara o frame (redimensionamento e conversão de BGR para RGB, uma única vez),
+    chama a função de estimativa de postura e atualiza o frame no menu.
+    O tempo de cada frame é informado ao controle de qualidade, que também limita a taxa de exibição.
 '''
 def visualizar():
     global cap
     global frame
     global pTime
+    global ultimaExibicao
 
     if cap is not None:
-        ret, frame = cap.read()
+        with metricas.cronometrar('captura'):
+            ret, frame = cap.read()
         if ret == True:
+            inicio = time.perf_counter()
+
             # Redimencionar imagem
-            frame = imutils.resize(frame, width=920)
+            with metricas.cronometrar('redimensionar'):
+                quadro = preparador.preparar(frame)
 
             # Detecção de Postura
-            detectPostura(frame)
+            detectPostura(quadro)
 
-            # Conversão de imagem BGR para RGB
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Imagem RGB já convertida para a postura, com a contagem e as caixas desenhadas
+            frame = quadro.rgb
 
             # Esse trecho de código imprime a taxa de FPS na tela
             # cTime = time.time()
@@ -495,11 +365,16 @@ def visualizar():
             # pTime = cTime
             # cv2.putText(frame, str(int(fps)), (50, 100), cv2.FONT_HERSHEY_PLAIN, 5, (255, 0, 0), 5)
 
-            # Atualizar frame
-            im = Image.fromarray(frame)
-            img = ImageTk.PhotoImage(image=im)
-            lblVideo.configure(image=img)
-            lblVideo.image = img
+            # Atualizar frame, respeitando a taxa de exibição do nível de qualidade atual
+            if inicio - ultimaExibicao >= 1 / qualidade.nivel.fpsExibicao:
+                ultimaExibicao = inicio
+                with metricas.cronometrar('tk'):
+                    im = Image.fromarray(frame)
+                    img = ImageTk.PhotoImage(image=im)
+                    lblVideo.configure(image=img)
+                    lblVideo.image = img
+
+            qualidade.registrar(time.perf_counter() - inicio)
             lblVideo.after(10, visualizar)
         else:
             # Caso Camera não ligue
@@ -509,6 +384,36 @@ def visualizar():
     return 0
 
 
+'''
+Aplica a política lida do arquivo:
+    Atualiza os EPIs levados em conta na decisão e os ícones do menu, e os limiares do detector.
+'''
+def aplicarPolitica(politica):
+    global chMascara
+    global chCapacete
+    global chOculos
+    global chAbafador
+    global chColete
+    global chLuva
+    global chBota
+
+    inspetor.aplicarPolitica(politica)
+    chMascara, chCapacete, chOculos, chAbafador, chColete, chLuva, chBota = politica.requeridos
+
+    for c, requerido in enumerate(politica.requeridos):
+        icone = PhotoImage(file=myIcones[c] if requerido else myIconesNeutro[c])
+        lblIcones[c].configure(image=icone)
+        lblIcones[c].image = icone
+
+
+'''
+Verifica a cada segundo se o arquivo de política foi alterado
+'''
+def verificarPolitica():
+    observadorPolitica.verificar()
+    janelaPrincipal.after(1000, verificarPolitica)
+
+
 '''
 Restaura o menu para a configuração padrão
 '''
@@ -692,31 +597,38 @@ def openConfig():
 
     var0 = IntVar()
     c0 = Checkbutton(janelaConfig, text='Máscara', variable=var0, onvalue=1, offvalue=0, command=funcMas)
-    c0.select()
+    if chMascara == 1:
+        c0.select()
     c0.grid(column=0, row=1)
     var1 = IntVar()
     c1 = Checkbutton(janelaConfig, text='Capacete', variable=var1,onvalue=1, offvalue=0, command=funcCap)
-    c1.select()
+    if chCapacete == 1:
+        c1.select()
     c1.grid(column=1, row=1)
     var2 = IntVar()
     c2 = Checkbutton(janelaConfig, text='Óculos', variable=var2, onvalue=1, offvalue=0, command=funcOcu)
-    c2.select()
+    if chOculos == 1:
+        c2.select()
     c2.grid(column=2, row=1)
     var3 = IntVar()
     c3 = Checkbutton(janelaConfig, text='Abafador', variable=var3, onvalue=1, offvalue=0, command=funcAba)
-    c3.select()
+    if chAbafador == 1:
+        c3.select()
     c3.grid(column=3, row=1)
     var4 = IntVar()
     c4 = Checkbutton(janelaConfig, text='Colete', variable=var4, onvalue=1, offvalue=0, command=funcCol)
-    c4.select()
+    if chColete == 1:
+        c4.select()
     c4.grid(column=0, row=2)
     var5 = IntVar()
     c5 = Checkbutton(janelaConfig, text='Luvas', variable=var5, onvalue=1, offvalue=0, command=funcLuv)
-    c5.select()
+    if chLuva == 1:
+        c5.select()
     c5.grid(column=1, row=2)
     var6 = IntVar()
     c6 = Checkbutton(janelaConfig, text='Botas', variable=var6, onvalue=1, offvalue=0, command=funcBot)
-    c6.select()
+    if chBota == 1:
+        c6.select()
     c6.grid(column=2, row=2)
 
 
@@ -816,6 +728,10 @@ lblPerIcone5.grid(column=9, row=19, rowspan=2)
 lblPerIcone6 = Label(janelaPrincipal, text="  -  ", font="Arial 15", bd=2, relief="solid")
 lblPerIcone6.grid(column=10, row=19, rowspan=2)
 
+# Listas de ícones e textos, na ordem das classes
+lblIcones = [lblIcone0, lblIcone1, lblIcone2, lblIcone3, lblIcone4, lblIcone5, lblIcone6]
+lblPerIcones = [lblPerIcone0, lblPerIcone1, lblPerIcone2, lblPerIcone3, lblPerIcone4, lblPerIcone5, lblPerIcone6]
+
 # Botão de Acesso. Restaura o menu quando precionado.
 btnAcesso = Button(janelaPrincipal, text=" * ", font="Arial 22", width=20, bg="#ededed", command=restauraMenu)
 btnAcesso.grid(column=8, row=21, columnspan=4)
@@ -826,6 +742,13 @@ btnHistorico = Button(janelaPrincipal, text="Histórico", width=22, command=open
 # Abrir Janela de Configurações
 btnConfig = Button(janelaPrincipal, text="Configurações", width=22, command=openConfig).grid(column=10, row=22, columnspan=2)
 
+# Ler e observar o arquivo de política
+verificarPolitica()
+
+# Carrega a YOLOv4 e o MediaPipe em paralelo, em segundo plano, com uma inferência de aquecimento.
+# A janela é exibida imediatamente e a primeira inspeção não paga o carregamento dos modelos
+threading.Thread(target=aquecerModelos, daemon=True).start()
+
 # Chamar função de exibição de video
 visualizar()
 
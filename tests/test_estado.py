@@ -0,0 +1,122 @@
+'''
+Testes da máquina de estados da inspeção (vcad_epis.estado) com relógio manual.
+'''
+
+import time
+
+from vcad_epis import estado
+from vcad_epis.estado import (CAPTURADO, CONTAGEM, DECIDIDO, POSE_INICIADA, POSE_PERDIDA, RESTAURADO,
+                              maquinaInspecao, relogioManual, simular, temposInspecao)
+
+
+def tipos(eventos):
+    return [ev.tipo for ev in eventos]
+
+
+def test_contagem_e_captura():
+    relogio = relogioManual()
+    maquina = maquinaInspecao(relogio=relogio)
+
+    eventos = maquina.atualizar(True, True)
+    assert tipos(eventos) == [POSE_INICIADA, CONTAGEM]
+    assert eventos[1].valor == 1
+    assert maquina.estado == estado.CONTANDO
+
+    relogio.agora = 0.5
+    assert maquina.atualizar(True, True) == []
+
+    relogio.agora = 1.0
+    eventos = maquina.atualizar(True, True)
+    assert [(ev.tipo, ev.valor) for ev in eventos] == [(CONTAGEM, 2)]
+
+    relogio.agora = 2.0
+    eventos = maquina.atualizar(True, True)
+    assert [(ev.tipo, ev.valor) for ev in eventos] == [(CONTAGEM, 3)]
+
+    relogio.agora = 2.99
+    assert maquina.atualizar(True, True) == []
+
+    relogio.agora = 3.0
+    eventos = maquina.atualizar(True, True)
+    assert tipos(eventos) == [CAPTURADO]
+    assert maquina.estado == estado.EXIBINDO
+    assert maquina.contador == 0
+    assert maquina.tempoCaptura == 3.0
+
+
+def test_pose_perdida_cancela_contagem():
+    relogio = relogioManual()
+    maquina = maquinaInspecao(relogio=relogio)
+    maquina.atualizar(True, True)
+
+    relogio.agora = 1.5
+    eventos = maquina.atualizar(True, False)
+    assert tipos(eventos) == [POSE_PERDIDA]
+    assert maquina.estado == estado.AGUARDANDO
+    assert maquina.contador == 0
+
+    # Nova contagem só depois do intervalo (5 s) desde o início da anterior
+    relogio.agora = 4.9
+    assert maquina.atualizar(True, True) == []
+    relogio.agora = 5.0
+    assert tipos(maquina.atualizar(True, True)) == [POSE_INICIADA, CONTAGEM]
+
+
+def test_captura_independe_da_taxa_de_quadros():
+    for fps in (2, 10, 30):
+        capturas = [ev.tempo for ev in simular([(4.0, True, True)], fps=fps) if ev.tipo == CAPTURADO]
+        assert capturas == [3.0]
+
+
+def test_restauracao_apos_exibicao():
+    relogio = relogioManual()
+    maquina = maquinaInspecao(relogio=relogio)
+    maquina.atualizar(True, True)
+    relogio.agora = 3.0
+    assert tipos(maquina.atualizar(True, True)) == [CAPTURADO]
+
+    relogio.agora = 4.0
+    eventos = maquina.decidido('negado')
+    assert [(ev.tipo, ev.valor) for ev in eventos] == [(DECIDIDO, 'negado')]
+
+    # A pessoa saiu: o resultado continua na tela até completar 30 s da captura
+    relogio.agora = 32.99
+    assert maquina.atualizar(False, False) == []
+    assert maquina.tempoCaptura == 3.0
+
+    relogio.agora = 33.0
+    eventos = maquina.atualizar(False, False)
+    assert tipos(eventos) == [RESTAURADO]
+    assert maquina.estado == estado.AGUARDANDO
+    assert maquina.tempoCaptura is None and maquina.tempoDecisao is None
+
+
+def test_tempos_configuraveis():
+    tempos = temposInspecao(passo=0.5, contagem=4, intervalo=1.0, exibicao=10.0)
+    eventos = simular([(3.0, True, True), (20.0, False, False)], tempos, fps=20)
+    assert [ev.valor for ev in eventos if ev.tipo == CONTAGEM][:4] == [1, 2, 3, 4]
+    # A contagem dura contagem * passo segundos, mesmo com um intervalo menor
+    assert [ev.tempo for ev in eventos if ev.tipo == CAPTURADO] == [2.0]
+    assert [ev.tempo for ev in eventos if ev.tipo == RESTAURADO] == [12.0]
+
+
+def test_horas_de_portaria_em_milissegundos():
+    # Ciclos de 60 s durante 2 horas: 20 s na pose, 10 s fora da pose e 30 s sem ninguém
+    roteiro = [(20.0, True, True), (10.0, True, False), (30.0, False, False)] * 120
+    decisoes = []
+
+    inicio = time.perf_counter()
+    eventos = simular(roteiro, fps=10, decidir=lambda tempo: decisoes.append(tempo) or 'liberado')
+    duracao = time.perf_counter() - inicio
+
+    # Na pose, uma nova contagem a cada 5 s (intervalo): capturas em 3, 8, 13 e 18 s de cada ciclo
+    capturas = [ev.tempo for ev in eventos if ev.tipo == CAPTURADO]
+    assert len(capturas) == 4 * 120
+    assert capturas[:5] == [3.0, 8.0, 13.0, 18.0, 63.0]
+    assert decisoes == capturas
+
+    # O menu é restaurado 30 s após a última captura de cada ciclo
+    restauracoes = [ev.tempo for ev in eventos if ev.tipo == RESTAURADO]
+    assert len(restauracoes) == 120
+    assert restauracoes[:2] == [48.0, 108.0]
+    assert duracao < 2.0
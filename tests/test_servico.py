@@ -0,0 +1,144 @@
+'''
+Testes do serviço de inspeção (vcad_epis.servico) com um inspetor simulado, sem os modelos.
+Os pedidos são feitos ao servidor local através do clienteInspecao.
+'''
+
+import http.client
+import json
+import threading
+import urllib.error
+
+import numpy as np
+import pytest
+
+from vcad_epis.inspecao import InspectionResult
+from vcad_epis.servico import clienteInspecao, criarServidor, poolInspetores
+
+
+classNames = ['mascara', 'capacete', 'oculos', 'abafador', 'colete', 'luva', 'bota']
+
+
+class inspetorSimulado():
+
+    def __init__(self, erro=None):
+        self.classNames = classNames
+        self.erro = erro
+        self.requeridos = []
+        # Com "liberar" limpo, a inspeção aguarda até ele ser sinalizado
+        self.liberar = threading.Event()
+        self.liberar.set()
+        self.iniciado = threading.Event()
+
+    def aquecer(self):
+        pass
+
+    def inspecionarLote(self, frames, requeridos, lmLists):
+        self.iniciado.set()
+        self.liberar.wait(5)
+        if self.erro is not None:
+            raise self.erro
+        self.requeridos.extend(requeridos)
+        return [InspectionResult('liberado', [], ['positivo'] * len(classNames), [0.95] * len(classNames), 0,
+                                 [[0, 10, 20]]) for _ in frames]
+
+
+@pytest.fixture
+def servico():
+    abertos = []
+
+    def iniciar(inspetor, tamanhoFila=32, timeout=5.0):
+        pool = poolInspetores(tamanhoFila=tamanhoFila, fabrica=lambda metricas: inspetor, aquecer=False)
+        servidor = criarServidor(pool, porta=0, timeout=timeout)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        abertos.append((servidor, pool, inspetor))
+        return clienteInspecao('http://127.0.0.1:{}'.format(servidor.server_port), timeout=5), pool
+
+    yield iniciar
+    for servidor, pool, inspetor in abertos:
+        inspetor.liberar.set()
+        servidor.shutdown()
+        servidor.server_close()
+        pool.encerrar()
+
+
+def frame():
+    return np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+def erroHTTP(cliente, imagem, **kwargs):
+    with pytest.raises(urllib.error.HTTPError) as erro:
+        cliente.inspecionar(imagem, **kwargs)
+    return erro.value.code, json.loads(erro.value.read().decode('utf-8'))
+
+
+def test_inspecao(servico):
+    inspetor = inspetorSimulado()
+    cliente, _ = servico(inspetor)
+
+    resposta = cliente.inspecionar(frame(), requeridos=[1, 1, 0, 0, 1, 0, 0])
+    assert resposta['decisao'] == 'liberado'
+    assert resposta['pessoa'] is True
+    assert resposta['status']['capacete'] == 'positivo'
+    assert inspetor.requeridos == [[1, 1, 0, 0, 1, 0, 0]]
+
+    saude = cliente.saude()
+    assert saude['instancias'] == 1 and saude['pronto'] is True
+
+
+def test_pedido_invalido(servico):
+    cliente, _ = servico(inspetorSimulado())
+
+    codigo, corpo = erroHTTP(cliente, b'nao e uma imagem')
+    assert codigo == 400 and 'erro' in corpo
+
+    codigo, corpo = erroHTTP(cliente, frame(), requeridos=[1, 1])
+    assert codigo == 400
+
+    endereco = cliente.url.split('//')[1]
+    conexao = http.client.HTTPConnection(endereco, timeout=5)
+    conexao.putrequest('POST', '/inspect')
+    conexao.putheader('Content-Length', 'abc')
+    conexao.endheaders()
+    resposta = conexao.getresponse()
+    assert resposta.status == 400
+    conexao.close()
+
+
+def test_fila_cheia(servico):
+    inspetor = inspetorSimulado()
+    inspetor.liberar.clear()
+    cliente, pool = servico(inspetor, tamanhoFila=1)
+
+    # Um pedido em execução (bloqueado no inspetor) e outro ocupando a única posição da fila
+    emExecucao = pool.enviar(frame())
+    assert inspetor.iniciado.wait(5)
+    naFila = pool.enviar(frame())
+
+    codigo, corpo = erroHTTP(cliente, frame())
+    assert codigo == 503 and 'cheia' in corpo['erro']
+
+    inspetor.liberar.set()
+    assert emExecucao.result(5).decisao == 'liberado'
+    assert naFila.result(5).decisao == 'liberado'
+
+
+def test_tempo_esgotado(servico):
+    inspetor = inspetorSimulado()
+    inspetor.liberar.clear()
+    cliente, _ = servico(inspetor, timeout=0.1)
+
+    codigo, corpo = erroHTTP(cliente, frame())
+    assert codigo == 504 and 'esgotado' in corpo['erro']
+
+
+def test_erro_do_inspetor(servico):
+    cliente, pool = servico(inspetorSimulado(erro=RuntimeError('rede não carregada')))
+
+    codigo, corpo = erroHTTP(cliente, frame())
+    assert codigo == 500
+    assert corpo['erro'] == 'RuntimeError: rede não carregada'
+
+    # A thread do pool continua atendendo após o erro
+    codigo, _ = erroHTTP(cliente, frame())
+    assert codigo == 500
+    assert all(thread.is_alive() for thread in pool.threads)
@@ -0,0 +1,26 @@
+'''
+Nome:   Biblioteca de inspeção de EPIs (VCAD_EPIs)
+Sobre:  Núcleo do programa sem interface gráfica e sem câmera.
+        Importar este pacote não carrega nenhum modelo: a YOLOv4 e o MediaPipe são carregados na primeira inspeção.
+        Exemplo:
+            import cv2
+            import vcad_epis
+            resultado = vcad_epis.inspect(cv2.imread('imagem.jpg'))
+            print(resultado.decisao)
+Desenvolvedor: felipeSperb
+'''
+
+from .cache import cacheInferencia, hashConfiguracao, hashFrame
+from .cascata import inspetorCascata
+from .detector import detectorEPI, deteccao, lerClasses
+from .estado import (maquinaInspecao, temposInspecao, relogioManual, simular,
+                     POSE_INICIADA, CONTAGEM, POSE_PERDIDA, CAPTURADO, DECIDIDO, RESTAURADO)
+from .evidencias import salvarEvidencias
+from .inspecao import (Inspector, InspectionResult, inspect, decidir, desenharResultado,
+                       LIBERADO, MAL_POSICIONADO, NEGADO, POSITIVO, ALERTA, NEGATIVO, IGNORADO)
+from .metricas import coletorMetricas
+from .politica import politica, politicaInvalida, lerPolitica, observadorPolitica
+from .preprocessamento import preparadorQuadros, quadroPreparado
+from .postura import poseDetector, compararROI, angulosBracos
+from .qualidade import controladorQualidade, nivelQualidade, niveisPadrao, aplicarNivel
+from .registro import registroInspecoes, lerRegistros
@@ -0,0 +1,413 @@
+'''
+Nome:   Anel de quadros em memória compartilhada
+Sobre:  Buffer circular de quadros com tamanho fixo em um único bloco de memória compartilhada
+        (multiprocessing.shared_memory), para passar frames entre processos (captura, postura, detecção,
+        gravação de evidências) sem serializar os arrays: os processos trocam apenas números de sequência.
+        Formato do bloco:
+            cabeçalho   dimensões, quantidade de posições e de leitores, próxima sequência a escrever,
+                        sequência guardada em cada posição, cursor de cada leitor e tempo de cada quadro
+            dados       posições de altura x largura x canais (uint8)
+        Um produtor e vários leitores. Cada leitor tem o seu cursor e recebe todos os quadros em ordem:
+            bloquear=True   o produtor espera o leitor mais lento liberar a posição (nenhum quadro é perdido)
+            bloquear=False  o produtor sobrescreve a posição mais antiga (câmera ao vivo). O leitor atrasado pula
+                            para o quadro mais antigo ainda disponível e conta os perdidos. Como o quadro pode ser
+                            sobrescrito durante o uso, valido(seq) deve ser verificado depois de usar o array.
+        O produtor pode escrever diretamente na posição (reservar, ex: cv2.resize(..., dst=posicao)) e publicar,
+        sem cópia intermediária. Os leitores recebem arrays que apontam para a memória compartilhada.
+        O anel pode ser passado como argumento para outro processo: somente o nome do bloco é serializado.
+Uso:    python -m vcad_epis.anel --quadros 300 --fps 30
+        (compara o anel com multiprocessing.Queue, que serializa cada frame, nas resoluções do programa)
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import json
+import multiprocessing as mp
+import time
+import uuid
+
+import numpy as np
+
+
+# Identificação do formato do cabeçalho
+_assinatura = 0x56434144
+# Campos do cabeçalho (int64)
+_ASSINATURA, _POSICOES, _ALTURA, _LARGURA, _CANAIS, _LEITORES, _ESCRITA, _FECHADO = range(8)
+_campos = 8
+
+# Intervalo de espera (segundos) enquanto não há quadro novo ou posição livre
+intervaloEspera = 0.0005
+
+
+def _memoria(nome=None, tamanho=0):
+    from multiprocessing import shared_memory
+    if nome is None:
+        return shared_memory.SharedMemory(create=True, size=tamanho, name='vcad_' + uuid.uuid4().hex[:16])
+    # O processo que só abre o bloco não deve registrá-lo para ser apagado ao terminar (somente o criador apaga)
+    try:
+        # Python >= 3.13
+        return shared_memory.SharedMemory(name=nome, track=False)
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    registrar = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name=nome)
+    finally:
+        resource_tracker.register = registrar
+
+
+def _tamanhoCabecalho(posicoes, leitores):
+    tamanho = 8 * (_campos + 2 * posicoes + leitores)
+    # Os dados começam em um múltiplo de 64 bytes (linha de cache)
+    return (tamanho + 63) // 64 * 64
+
+
+class anelQuadros():
+
+    def __init__(self, forma=(690, 920, 3), posicoes=8, leitores=4, bloquear=False, nome=None):
+
+        '''
+        forma:  Forma (altura, largura, canais) de cada quadro. Padrão para 690 x 920 x 3 (câmera 4:3 em 920 px).
+
+        posicoes:   Quantidade de quadros guardados. Padrão para 8.
+
+        leitores:   Quantidade máxima de leitores. Padrão para 4.
+
+        bloquear:   Se definido como true, o produtor espera uma posição livre em vez de sobrescrever quadros ainda
+                    não lidos. Padrão para false.
+
+        nome:   Nome de um bloco existente. Se informado, os demais parâmetros são lidos do cabeçalho
+                (ver abrir). Padrão para criar um novo bloco.
+        '''
+        self.bloquear = bloquear
+        self.criador = nome is None
+        if self.criador:
+            forma = tuple(forma)
+            if len(forma) == 2:
+                forma = forma + (1,)
+            tamanhoQuadro = int(np.prod(forma))
+            self._memoria = _memoria(tamanho=_tamanhoCabecalho(posicoes, leitores) + posicoes * tamanhoQuadro)
+        else:
+            self._memoria = _memoria(nome)
+            controle = np.ndarray((_campos,), dtype=np.int64, buffer=self._memoria.buf)
+            if controle[_ASSINATURA] != _assinatura:
+                self._memoria.close()
+                raise ValueError('O bloco {} não é um anel de quadros'.format(nome))
+            posicoes = int(controle[_POSICOES])
+            leitores = int(controle[_LEITORES])
+            forma = (int(controle[_ALTURA]), int(controle[_LARGURA]), int(controle[_CANAIS]))
+            del controle
+
+        self.nome = self._memoria.name
+        self.forma = forma
+        self.posicoes = posicoes
+        self.leitores = leitores
+
+        buf = self._memoria.buf
+        self._controle = np.ndarray((_campos,), dtype=np.int64, buffer=buf)
+        # Sequência guardada em cada posição (-1: vazia ou sendo escrita)
+        self._sequencias = np.ndarray((posicoes,), dtype=np.int64, buffer=buf, offset=8 * _campos)
+        # Próxima sequência de cada leitor (-1: leitor inativo)
+        self._cursores = np.ndarray((leitores,), dtype=np.int64, buffer=buf, offset=8 * (_campos + posicoes))
+        self._tempos = np.ndarray((posicoes,), dtype=np.float64, buffer=buf,
+                                  offset=8 * (_campos + posicoes + leitores))
+        self._dados = np.ndarray((posicoes,) + forma, dtype=np.uint8, buffer=buf,
+                                 offset=_tamanhoCabecalho(posicoes, leitores))
+
+        if self.criador:
+            self._controle[:] = (_assinatura, posicoes, forma[0], forma[1], forma[2], leitores, 0, 0)
+            self._sequencias[:] = -1
+            self._cursores[:] = -1
+            self._tempos[:] = 0.0
+
+
+    '''
+    Abre, em outro processo, um anel criado com anelQuadros(...). Somente o criador apaga o bloco.
+    '''
+    @classmethod
+    def abrir(cls, nome, bloquear=False):
+        return cls(nome=nome, bloquear=bloquear)
+
+
+    # Ao ser enviado para outro processo, somente o nome do bloco é serializado
+    def __reduce__(self):
+        return (anelQuadros.abrir, (self.nome, self.bloquear))
+
+
+    # Próxima sequência a ser escrita (quantidade de quadros publicados)
+    @property
+    def escritos(self):
+        return int(self._controle[_ESCRITA])
+
+
+    @property
+    def fechado(self):
+        return bool(self._controle[_FECHADO])
+
+
+    # ------------------------- PRODUTOR ------------------------- #
+
+    '''
+    Reserva a próxima posição e retorna (seq, array da posição) para ser preenchido pelo produtor.
+        Com bloquear=True espera até que todos os leitores tenham liberado o quadro que ocupava a posição.
+        Retorna None se o tempo limite (segundos) terminar antes.
+    '''
+    def reservar(self, timeout=None):
+        seq = self.escritos
+        if self.bloquear:
+            limite = None if timeout is None else time.perf_counter() + timeout
+            while True:
+                ativos = self._cursores[self._cursores >= 0]
+                if not len(ativos) or seq - int(ativos.min()) < self.posicoes:
+                    break
+                if limite is not None and time.perf_counter() >= limite:
+                    return None
+                time.sleep(intervaloEspera)
+        posicao = seq % self.posicoes
+        # Marca a posição como em escrita: leitores atrasados percebem que o quadro antigo não é mais válido
+        self._sequencias[posicao] = -1
+        return seq, self._dados[posicao]
+
+
+    # Publica o quadro reservado, tornando-o visível aos leitores
+    def publicar(self, seq, tempo=None):
+        posicao = seq % self.posicoes
+        self._tempos[posicao] = time.time() if tempo is None else tempo
+        self._sequencias[posicao] = seq
+        self._controle[_ESCRITA] = seq + 1
+        return seq
+
+
+    '''
+    Copia um frame para a próxima posição e o publica. Retorna a sequência, ou None (tempo limite).
+        O frame deve ter a forma do anel.
+    '''
+    def escrever(self, frame, tempo=None, timeout=None):
+        if frame.shape != self.forma and frame.shape != self.forma[:2]:
+            raise ValueError('Quadro com forma {}, o anel guarda {}'.format(frame.shape, self.forma))
+        reserva = self.reservar(timeout)
+        if reserva is None:
+            return None
+        seq, destino = reserva
+        np.copyto(destino, frame.reshape(self.forma))
+        return self.publicar(seq, tempo)
+
+
+    # Indica aos leitores que não haverá novos quadros
+    def fechar(self):
+        self._controle[_FECHADO] = 1
+
+
+    # ------------------------- LEITORES ------------------------- #
+
+    '''
+    Registra um leitor e retorna o seu índice.
+        doInicio: Se true, o leitor recebe desde o quadro mais antigo ainda guardado. Padrão para somente os novos.
+    '''
+    def registrarLeitor(self, indice=None, doInicio=False):
+        if indice is None:
+            livres = np.flatnonzero(self._cursores < 0)
+            if not len(livres):
+                raise ValueError('O anel aceita no máximo {} leitores'.format(self.leitores))
+            indice = int(livres[0])
+        escritos = self.escritos
+        self._cursores[indice] = max(0, escritos - self.posicoes) if doInicio else escritos
+        return indice
+
+
+    def removerLeitor(self, indice):
+        self._cursores[indice] = -1
+
+
+    '''
+    Próximo quadro do leitor: retorna (seq, array, tempo), ou None se o anel foi fechado (e todos os quadros
+    foram lidos) ou se o tempo limite terminou.
+        O array aponta para a memória compartilhada e é válido até liberar(indice, seq) com bloquear=True.
+    '''
+    def ler(self, indice, timeout=None):
+        limite = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            seq = int(self._cursores[indice])
+            escritos = self.escritos
+            if seq < escritos:
+                # O produtor deu a volta no anel: pula para o quadro mais antigo ainda guardado
+                if escritos - seq > self.posicoes:
+                    seq = escritos - self.posicoes
+                    self._cursores[indice] = seq
+                posicao = seq % self.posicoes
+                if self._sequencias[posicao] == seq:
+                    return seq, self._dados[posicao], float(self._tempos[posicao])
+                # Sobrescrito durante a leitura: tenta de novo com o cursor atualizado
+                self._cursores[indice] = seq + 1
+                continue
+            if self.fechado:
+                return None
+            if limite is not None and time.perf_counter() >= limite:
+                return None
+            time.sleep(intervaloEspera)
+
+
+    # Libera o quadro lido, avançando o cursor do leitor
+    def liberar(self, indice, seq):
+        if self._cursores[indice] <= seq:
+            self._cursores[indice] = seq + 1
+
+
+    # Retorna true se o quadro seq ainda não foi sobrescrito (usar depois de processar com bloquear=False)
+    def valido(self, seq):
+        return self._sequencias[seq % self.posicoes] == seq
+
+
+    # Libera a memória deste processo. O criador também apaga o bloco
+    # Os arrays retornados por reservar e ler não podem mais ser usados (e devem ter sido descartados)
+    def encerrar(self):
+        self._controle = self._sequencias = self._cursores = self._tempos = self._dados = None
+        self._memoria.close()
+        if self.criador:
+            try:
+                self._memoria.unlink()
+            except FileNotFoundError:
+                pass
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.encerrar()
+
+
+# ------------------------- BENCHMARK ------------------------- #
+
+# Leitor do benchmark com o anel: devolve (latência, lido) de cada quadro pela fila de resultados
+def _leitorAnel(anel, indice, resultados):
+    latencias = []
+    perdidos = 0
+    anterior = None
+    while True:
+        item = anel.ler(indice)
+        if item is None:
+            break
+        seq, quadro, tempo = item
+        # Toca os dados, como um consumidor real faria
+        int(quadro[::64, ::64, 0].sum())
+        latencias.append(time.perf_counter() - tempo)
+        if anterior is not None:
+            perdidos += seq - anterior - 1
+        anterior = seq
+        anel.liberar(indice, seq)
+        del quadro
+    resultados.put((latencias, perdidos))
+    anel.encerrar()
+
+
+# Leitor do benchmark com a fila: cada frame chega serializado (pickle) e é copiado para este processo
+def _leitorFila(fila, resultados):
+    latencias = []
+    while True:
+        item = fila.get()
+        if item is None:
+            break
+        quadro, tempo = item
+        int(quadro[::64, ::64, 0].sum())
+        latencias.append(time.perf_counter() - tempo)
+    resultados.put((latencias, 0))
+
+
+def _resumo(modo, forma, fps, quadros, tempoEnvio, duracao, latencias, perdidos):
+    latencias = np.array(latencias) * 1000
+    return {
+        'modo': modo,
+        'forma': list(forma),
+        'fps_alvo': fps,
+        'quadros': quadros,
+        'recebidos': len(latencias),
+        'perdidos': perdidos,
+        'envio_ms': 1000 * tempoEnvio / quadros,
+        'latencia_media_ms': float(latencias.mean()) if len(latencias) else None,
+        'latencia_p95_ms': float(np.percentile(latencias, 95)) if len(latencias) else None,
+        'vazao_fps': len(latencias) / duracao if duracao else 0.0
+    }
+
+
+'''
+Envia "quadros" frames de forma "forma" para um processo leitor, a "fps" quadros por segundo (0: sem limite),
+pelo anel (somente a sequência é trocada) ou por multiprocessing.Queue (o frame é serializado).
+    O tempo de envio é carimbado com time.perf_counter, que usa o mesmo relógio em todos os processos (Linux).
+'''
+def comparar(forma, fps=30, quadros=300, modo='anel', posicoes=8):
+    frame = np.random.randint(0, 256, forma, dtype=np.uint8)
+    resultados = mp.Queue()
+    intervalo = 1.0 / fps if fps else 0.0
+    tempoEnvio = 0.0
+
+    if modo == 'anel':
+        anel = anelQuadros(forma, posicoes=posicoes, leitores=1, bloquear=True)
+        indice = anel.registrarLeitor()
+        processo = mp.Process(target=_leitorAnel, args=(anel, indice, resultados))
+    else:
+        fila = mp.Queue(maxsize=posicoes)
+        processo = mp.Process(target=_leitorFila, args=(fila, resultados))
+    processo.start()
+
+    inicio = time.perf_counter()
+    for n in range(quadros):
+        if intervalo:
+            espera = inicio + n * intervalo - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+        antes = time.perf_counter()
+        if modo == 'anel':
+            seq, destino = anel.reservar()
+            np.copyto(destino, frame)
+            del destino
+            anel.publicar(seq, time.perf_counter())
+        else:
+            fila.put((frame, time.perf_counter()))
+        tempoEnvio += time.perf_counter() - antes
+
+    if modo == 'anel':
+        anel.fechar()
+    else:
+        fila.put(None)
+    latencias, perdidos = resultados.get()
+    duracao = time.perf_counter() - inicio
+    processo.join()
+    if modo == 'anel':
+        anel.encerrar()
+    return _resumo(modo, forma, fps, quadros, tempoEnvio, duracao, latencias, perdidos)
+
+
+# Resoluções do programa: 920 px de largura (câmeras 16:9 e 4:3) e a captura 1280 x 720 antes do redimensionamento
+formasPadrao = ((518, 920, 3), (690, 920, 3), (720, 1280, 3))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara o anel de quadros com multiprocessing.Queue.')
+    parser.add_argument('--quadros', type=int, default=300, help='quadros enviados em cada medição')
+    parser.add_argument('--fps', type=float, nargs='+', default=[30, 0], help='taxas de envio (0: sem limite)')
+    parser.add_argument('--posicoes', type=int, default=8, help='posições do anel e tamanho da fila')
+    parser.add_argument('--saida', default=None, help='arquivo JSON do relatório (padrão: terminal)')
+    args = parser.parse_args(argv)
+
+    relatorio = []
+    for forma in formasPadrao:
+        for fps in args.fps:
+            for modo in ('fila', 'anel'):
+                resultado = comparar(forma, fps, args.quadros, modo, args.posicoes)
+                relatorio.append(resultado)
+                print('{:>4}x{:<4} {:>4} fps  {:4s}  envio {:6.3f} ms  latência média {:7.3f} ms  p95 {:7.3f} ms  '
+                      'vazão {:7.1f} fps'.format(forma[1], forma[0], int(fps), modo, resultado['envio_ms'],
+                                                 resultado['latencia_media_ms'], resultado['latencia_p95_ms'],
+                                                 resultado['vazao_fps']))
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump(relatorio, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
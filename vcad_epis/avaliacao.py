@@ -0,0 +1,272 @@
+'''
+Nome:   Avaliação do modelo de EPIs
+Sobre:  Mede o desempenho do modelo em um conjunto de teste rotulado (lista "valid" do epi.data do darknet):
+            - AP@0.5 (precisão média com IOU mínimo de 0.5) de cada classe e mAP;
+            - Acurácia da decisão de acesso: a decisão obtida com as detecções do modelo é comparada com a decisão
+              obtida com as marcações verdadeiras, usando a mesma postura, a mesma comparação com as regiões de
+              interesse e a mesma política. Imagens sem pessoa ficam de fora (semPessoa): a decisão é sempre
+              NEGADO nos dois casos, qualquer que seja a saída da rede, e inflaria a acurácia.
+        As imagens são processadas em paralelo, cada trabalhador com sua própria rede e seu estimador de postura.
+        A lista é lida sob demanda, com no máximo 2 imagens por trabalhador em processamento ou aguardando: a
+        memória usada não depende do tamanho do conjunto de teste.
+        As saídas da rede e os landmarks de cada imagem ficam em cache, identificados pelo conteúdo da imagem e
+        pelos arquivos do modelo: ao alterar limiares, NMS ou regras de região de interesse a rede não é executada
+        novamente, e ao trocar os pesos o cache antigo deixa de ser usado.
+Uso:    python -m vcad_epis.avaliacao --data YOLOv4/epi.data --trabalhadores 4 --politica Arquivos/Politicas/padrao.json
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from .cache import cacheInferencia, compactarSaida, hashConfiguracao, hashFrame, pastaCache
+from .detector import detectorEPI, deteccao, lerClasses, modelConfiguration
+from .inspecao import Inspector, LIBERADO, MAL_POSICIONADO, NEGADO
+from .politica import lerPolitica
+from .postura import poseDetector
+from .varredura import lerLista, lerRotulos, casar
+
+
+# Confiança mínima usada no cálculo da AP
+minimoAP = 0.005
+
+decisoes = (LIBERADO, MAL_POSICIONADO, NEGADO)
+
+
+'''
+Lê um arquivo .data do darknet (chave = valor) e retorna um dicionário.
+'''
+def lerData(arquivo):
+    dados = {}
+    with open(arquivo, 'rt') as f:
+        for linha in f:
+            if '=' in linha and not linha.lstrip().startswith('#'):
+                chave, valor = linha.split('=', 1)
+                dados[chave.strip()] = valor.strip()
+    return dados
+
+
+class _trabalhadores():
+
+    def __init__(self, cache, configuracao, pesos):
+
+        '''
+        Executa a rede e a postura de cada imagem. Cada thread cria sua própria rede e seu estimador de postura
+        (a rede do OpenCV não pode ser usada por duas threads ao mesmo tempo).
+        '''
+        self.cache = cache
+        self.configuracao = configuracao
+        self.pesos = pesos
+        self._local = threading.local()
+        self.executadas = 0
+        self._trava = threading.Lock()
+
+    def _modelos(self):
+        if not hasattr(self._local, 'detector'):
+            self._local.detector = detectorEPI(self.configuracao, self.pesos)
+            self._local.pose = poseDetector(mode=True)
+        return self._local.detector, self._local.pose
+
+    # Retorna (caminho, saida, shape, lmList). saida é None se a imagem não puder ser lida
+    def processar(self, caminho):
+        frame = cv2.imread(caminho)
+        if frame is None:
+            return caminho, None, None, None
+        chave = hashFrame(frame)
+        if self.cache is not None:
+            dados = self.cache.ler(chave)
+            if dados is not None and dados[2] is not None:
+                return (caminho,) + dados
+
+        detector, pose = self._modelos()
+        saida = compactarSaida(detector.inferir(frame))
+        pose.findPose(frame, False)
+        lmList = pose.findPosition(frame, False)
+        with self._trava:
+            self.executadas += 1
+        if self.cache is not None:
+            self.cache.gravar(chave, saida, frame.shape, lmList)
+        return caminho, saida, frame.shape, lmList
+
+
+'''
+Precisão média (AP) de uma classe, com interpolação em todos os pontos (VOC 2010 em diante).
+    registros: lista de (confianca, verdadeiroPositivo, ...). totalRotulos: quantidade de objetos verdadeiros.
+'''
+def precisaoMedia(registros, totalRotulos):
+    if totalRotulos == 0:
+        return None
+    if not registros:
+        return 0.0
+    ordem = sorted(registros, key=lambda r: -r[0])
+    tps = np.cumsum([r[1] for r in ordem])
+    fps = np.cumsum([not r[1] for r in ordem])
+    recall = np.concatenate([[0.0], tps / totalRotulos, [1.0]])
+    precisao = np.concatenate([[0.0], tps / np.maximum(tps + fps, 1), [0.0]])
+    # Envelope da curva: maior precisão com recall maior ou igual
+    precisao = np.maximum.accumulate(precisao[::-1])[::-1]
+    mudancas = np.where(recall[1:] != recall[:-1])[0]
+    return float(np.sum((recall[mudancas + 1] - recall[mudancas]) * precisao[mudancas + 1]))
+
+
+'''
+Converte as marcações verdadeiras de uma imagem em detecções com confiança 1, nas proporções da imagem.
+'''
+def deteccoesVerdadeiras(rotulos, shape):
+    hT, wT = shape[:2]
+    deteccoes = []
+    for classId, (cx, cy, w, h) in rotulos:
+        caixa = [int((cx - w / 2) * wT), int((cy - h / 2) * hT), int(w * wT), int(h * hT)]
+        deteccoes.append(deteccao(classId, 1.0, caixa, [cx, cy, w, h]))
+    return deteccoes
+
+
+'''
+Executa a função em cada item através do executor, com no máximo "limite" tarefas enviadas ao mesmo tempo.
+    Ao contrário de executor.map, os itens são consumidos à medida que as tarefas terminam.
+    Retorna, na ordem em que terminam, os pares (índice do item, resultado).
+'''
+def processarLimitado(executor, funcao, itens, limite):
+    itens = enumerate(itens)
+    pendentes = {}
+    while True:
+        for indice, item in itens:
+            pendentes[executor.submit(funcao, item)] = indice
+            if len(pendentes) >= limite:
+                break
+        if not pendentes:
+            return
+        prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+        for futuro in prontos:
+            yield pendentes.pop(futuro), futuro.result()
+
+
+'''
+Avalia o modelo nas imagens informadas.
+    politica: Política usada na decisão (limiares, NMS, regiões de interesse e EPIs obrigatórios).
+    cache: Pasta do cache, ou None para não usar cache.
+Retorna o relatório (dicionário).
+'''
+def avaliar(imagens, politica=None, trabalhadores=1, cache=pastaCache, configuracao=modelConfiguration,
+            pesos=None, limiarIOU=0.5):
+    classNames = lerClasses()
+    n = len(classNames)
+    if cache is not None:
+        modelo = hashConfiguracao(detectorEPI(configuracao, pesos), poseDetector(mode=True))
+        cacheModelo = cacheInferencia(cache, modelo)
+    else:
+        cacheModelo = None
+    execucao = _trabalhadores(cacheModelo, configuracao, pesos)
+
+    # Decodificação com confiança baixa para a AP, e com os limiares da política para a decisão
+    decodificadorAP = detectorEPI(limiaresClasse=[minimoAP] * n)
+    inspetor = Inspector(detector=detectorEPI(), pose=poseDetector(), politica=politica)
+    decodificadorAP.definirLimiares(nmsThreshold=inspetor.politica.nms, nmsPorClasse=inspetor.politica.nmsPorClasse)
+
+    registros = [[] for _ in range(n)]
+    totais = [0] * n
+    matriz = {esperada: {obtida: 0 for obtida in decisoes} for esperada in decisoes}
+    imagensAvaliadas = ignoradas = semPessoa = invalidos = 0
+
+    trabalhadores = max(1, trabalhadores)
+    with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+        for indice, (caminho, saida, shape, lmList) in processarLimitado(executor, execucao.processar, imagens,
+                                                                          2 * trabalhadores):
+            if saida is None:
+                ignoradas += 1
+                print('Imagem ignorada: {}'.format(caminho), file=sys.stderr)
+                continue
+            imagensAvaliadas += 1
+            rotulos, ignorados = lerRotulos(caminho, n)
+            invalidos += ignorados
+            for classId, _ in rotulos:
+                totais[classId] += 1
+
+            deteccoes = [(d.classId, d.confianca, d.posicao) for d in decodificadorAP.decodificar([saida], shape)]
+            for classId, confianca, tp in casar(deteccoes, rotulos, limiarIOU):
+                registros[classId].append((confianca, tp, indice))
+
+            # Sem pessoa as duas decisões são NEGADO independentemente das detecções
+            if not lmList:
+                semPessoa += 1
+                continue
+            obtida = inspetor.concluir(inspetor.detector.decodificar([saida], shape), lmList).decisao
+            esperada = inspetor.concluir(deteccoesVerdadeiras(rotulos, shape), lmList).decisao
+            matriz[esperada][obtida] += 1
+
+    # As imagens terminam fora de ordem: a ordem original desempata as confianças iguais
+    aps = {nome: precisaoMedia(sorted(registros[c], key=lambda r: r[2]), totais[c])
+           for c, nome in enumerate(classNames)}
+    validas = [ap for ap in aps.values() if ap is not None]
+    acertos = sum(matriz[d][d] for d in decisoes)
+    comPessoa = imagensAvaliadas - semPessoa
+    return {
+        'imagens': imagensAvaliadas,
+        'ignoradas': ignoradas,
+        'semPessoa': semPessoa,
+        'inferencias': execucao.executadas,
+        'rotulos': dict(zip(classNames, totais)),
+        'rotulosInvalidos': invalidos,
+        'ap50': aps,
+        'map50': sum(validas) / len(validas) if validas else None,
+        'acuraciaDecisao': acertos / comPessoa if comPessoa else None,
+        'matrizDecisao': matriz
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AP@0.5 por classe, mAP e acurácia da decisão de acesso.')
+    parser.add_argument('--data', default=None, help='arquivo .data do darknet (usa a lista "valid")')
+    parser.add_argument('--lista', default=None, help='lista de imagens de teste (alternativa ao --data)')
+    parser.add_argument('--raiz', default=None,
+                        help='pasta base dos caminhos relativos (padrão: pasta do arquivo .data ou a pasta acima da lista)')
+    parser.add_argument('--politica', default=None, help='arquivo de política usado na decisão')
+    parser.add_argument('--trabalhadores', type=int, default=1, help='imagens processadas em paralelo (padrão 1)')
+    parser.add_argument('--cache', default=pastaCache, help='pasta do cache (padrão: Arquivos/Cache)')
+    parser.add_argument('--sem-cache', action='store_true', help='não lê nem grava o cache')
+    parser.add_argument('--iou', type=float, default=0.5, help='IOU mínimo para casar detecção e rótulo')
+    parser.add_argument('--saida', default=None, help='arquivo JSON do relatório (padrão: terminal)')
+    args = parser.parse_args(argv)
+
+    if args.data is None and args.lista is None:
+        parser.error('informe --data ou --lista')
+    if args.lista is not None:
+        lista = args.lista
+        raiz = args.raiz
+    else:
+        raiz = args.raiz if args.raiz is not None else os.path.dirname(os.path.abspath(args.data))
+        lista = lerData(args.data)['valid']
+        if not os.path.isabs(lista):
+            lista = os.path.join(raiz, lista)
+
+    politica = lerPolitica(args.politica) if args.politica else None
+    relatorio = avaliar(lerLista(lista, raiz), politica, args.trabalhadores, None if args.sem_cache else args.cache,
+                        limiarIOU=args.iou)
+
+    texto = json.dumps(relatorio, indent=2)
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    print('Imagens: {}  inferências executadas: {}'.format(relatorio['imagens'], relatorio['inferencias']),
+          file=sys.stderr)
+    for nome, ap in relatorio['ap50'].items():
+        print('{:10s} AP@0.5: {}'.format(nome, '-' if ap is None else '{:.3f}'.format(ap)), file=sys.stderr)
+    if relatorio['map50'] is not None:
+        print('mAP@0.5: {:.3f}'.format(relatorio['map50']), file=sys.stderr)
+    if relatorio['acuraciaDecisao'] is not None:
+        print('Acurácia da decisão: {:.3f} ({} imagens com pessoa)'.format(
+            relatorio['acuraciaDecisao'], relatorio['imagens'] - relatorio['semPessoa']), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
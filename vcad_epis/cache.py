@@ -0,0 +1,256 @@
+'''
+Nome:   Cache de inferência
+Sobre:  Guarda as saídas brutas da YOLOv4 e os landmarks da postura de cada frame, identificados pelo conteúdo
+        do frame (hash dos pixels) e pela configuração dos modelos (hash do .cfg, dos pesos, da resolução de
+        entrada e dos parâmetros da postura).
+        Ao reprocessar gravações para testar novos limiares, NMS ou regras de região de interesse, somente a
+        decodificação é executada: a rede e a postura são lidas do cache.
+        As saídas ficam em arquivos .npy (shards) abertos com memória mapeada e o índice em um banco SQLite.
+        Cada shard é preenchido em sequência. Quando o tamanho total passa do limite, o shard usado há mais
+        tempo é removido inteiro (LRU por shard), evitando buracos nos arquivos.
+        Só as linhas da saída com alguma classe acima de "piso" são guardadas: a decodificação com qualquer
+        confiança mínima maior ou igual ao piso tem exatamente o mesmo resultado da saída completa.
+        Pode ser usado por várias threads do mesmo processo.
+Desenvolvedor: felipeSperb
+'''
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from .detector import modelConfiguration, modelWeights, whT
+
+
+# Pasta padrão do cache, relativa à pasta de execução
+pastaCache = os.path.join('Arquivos', 'Cache')
+
+# Linhas da saída da rede com confiança menor que este valor não são guardadas
+pisoConfianca = 0.001
+
+# Hashes dos arquivos de modelo já calculados: (caminho, modificação, tamanho) -> hash
+_hashesArquivos = {}
+
+
+def _hashArquivo(caminho):
+    info = os.stat(caminho)
+    chave = (os.path.abspath(caminho), info.st_mtime_ns, info.st_size)
+    if chave not in _hashesArquivos:
+        h = hashlib.sha1()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloco)
+        _hashesArquivos[chave] = h.hexdigest()
+    return _hashesArquivos[chave]
+
+
+'''
+Identificação do modelo: hash dos arquivos de configuração e de pesos e da resolução de entrada.
+'''
+def hashModelo(configuracao=modelConfiguration, pesos=modelWeights, resolucao=whT):
+    h = hashlib.sha1()
+    h.update(_hashArquivo(configuracao).encode())
+    h.update(_hashArquivo(pesos).encode())
+    h.update(str(resolucao).encode())
+    return h.hexdigest()
+
+
+'''
+Identificação da configuração completa de um inspetor: modelo do detector e parâmetros da postura.
+'''
+def hashConfiguracao(detector, pose=None):
+    h = hashlib.sha1(hashModelo(detector.configuracao, detector.pesos, detector.whT).encode())
+    if pose is not None:
+        h.update(repr((pose.mode, pose.complexity, pose.smooth, pose.detectionCon, pose.trackCon)).encode())
+    return h.hexdigest()
+
+
+'''
+Hash do conteúdo de um frame (pixels e dimensões).
+'''
+def hashFrame(frame):
+    h = hashlib.sha1(repr((frame.shape, frame.dtype.str)).encode())
+    h.update(memoryview(np.ascontiguousarray(frame)).cast('B'))
+    return h.hexdigest()
+
+
+'''
+Junta as saídas das camadas YOLO em uma única matriz e descarta as linhas sem nenhuma classe acima do piso.
+'''
+def compactarSaida(outputs, piso=pisoConfianca):
+    saida = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+    return saida[saida[:, 5:].max(axis=1) >= piso]
+
+
+class cacheInferencia():
+
+    def __init__(self, pasta=pastaCache, modelo=None, limiteBytes=2 << 30, tamanhoShard=64 << 20, colunas=12):
+
+        '''
+        pasta:  Pasta do cache.
+
+        modelo: Hash da configuração dos modelos (ver hashConfiguracao). Cada configuração usa uma subpasta
+                própria, então trocar os pesos nunca retorna saídas do modelo antigo.
+
+        limiteBytes:    Tamanho máximo dos shards em disco. Padrão para 2 GB.
+
+        tamanhoShard:   Tamanho de cada shard. Padrão para 64 MB.
+
+        colunas:    Colunas de cada linha da saída da rede (4 coordenadas, objeto e uma por classe).
+        '''
+        self.pasta = os.path.join(pasta, modelo[:16]) if modelo else pasta
+        os.makedirs(self.pasta, exist_ok=True)
+        self.limiteBytes = limiteBytes
+        self.colunas = colunas
+        self.capacidadeShard = max(1, tamanhoShard // (colunas * 4))
+        self.acertos = 0
+        self.faltas = 0
+
+        self._trava = threading.RLock()
+        self._mapas = {}
+        self._db = sqlite3.connect(os.path.join(self.pasta, 'indice.sqlite'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS shards (id INTEGER PRIMARY KEY, linhas INTEGER, '
+                         'capacidade INTEGER, uso INTEGER)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entradas (chave TEXT PRIMARY KEY, shard INTEGER, '
+                         'inicio INTEGER, linhas INTEGER, altura INTEGER, largura INTEGER, canais INTEGER, '
+                         'lmList BLOB, uso INTEGER)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entradasShard ON entradas (shard)')
+        self._db.commit()
+        # Contador de uso (mais recente = maior), continua do valor salvo
+        self._uso = self._db.execute('SELECT COALESCE(MAX(uso), 0) FROM shards').fetchone()[0]
+
+
+    def _arquivoShard(self, shard):
+        return os.path.join(self.pasta, 'shard_{:06d}.npy'.format(shard))
+
+
+    def _mapa(self, shard):
+        if shard not in self._mapas:
+            self._mapas[shard] = np.load(self._arquivoShard(shard), mmap_mode='r+')
+        return self._mapas[shard]
+
+
+    def _usar(self):
+        self._uso += 1
+        return self._uso
+
+
+    # Quantidade de entradas no cache
+    def __len__(self):
+        with self._trava:
+            return self._db.execute('SELECT COUNT(*) FROM entradas').fetchone()[0]
+
+
+    # Tamanho dos shards em disco, em bytes
+    @property
+    def tamanhoBytes(self):
+        with self._trava:
+            capacidade = self._db.execute('SELECT COALESCE(SUM(capacidade), 0) FROM shards').fetchone()[0]
+        return capacidade * self.colunas * 4
+
+
+    '''
+    Retorna (saida, shape, lmList) do frame identificado pela chave (ver hashFrame), ou None.
+        saida é uma cópia: continua válida mesmo se o shard for removido depois.
+    '''
+    def ler(self, chave):
+        with self._trava:
+            linha = self._db.execute('SELECT shard, inicio, linhas, altura, largura, canais, lmList FROM entradas '
+                                     'WHERE chave = ?', (chave,)).fetchone()
+            if linha is None:
+                self.faltas += 1
+                return None
+            shard, inicio, linhas, altura, largura, canais, lm = linha
+            try:
+                saida = np.array(self._mapa(shard)[inicio:inicio + linhas])
+            except (OSError, ValueError):
+                # Shard removido ou corrompido fora do programa
+                self._db.execute('DELETE FROM entradas WHERE shard = ?', (shard,))
+                self._db.execute('DELETE FROM shards WHERE id = ?', (shard,))
+                self._db.commit()
+                self.faltas += 1
+                return None
+            uso = self._usar()
+            self._db.execute('UPDATE entradas SET uso = ? WHERE chave = ?', (uso, chave))
+            self._db.execute('UPDATE shards SET uso = ? WHERE id = ?', (uso, shard))
+            self._db.commit()
+            self.acertos += 1
+        lmList = np.frombuffer(lm, dtype=np.int32).reshape(-1, 3).tolist() if lm is not None else None
+        return saida, (altura, largura, canais), lmList
+
+
+    '''
+    Guarda as saídas da rede (já compactadas, ver compactarSaida) e os landmarks de um frame.
+    '''
+    def gravar(self, chave, saida, shape, lmList=None):
+        saida = np.asarray(saida, dtype=np.float32).reshape(-1, self.colunas)
+        lm = np.asarray(lmList, dtype=np.int32).tobytes() if lmList is not None else None
+        canais = shape[2] if len(shape) > 2 else 1
+        with self._trava:
+            if self._db.execute('SELECT 1 FROM entradas WHERE chave = ?', (chave,)).fetchone() is not None:
+                return
+            shard, inicio = self._reservar(len(saida))
+            self._mapa(shard)[inicio:inicio + len(saida)] = saida
+            uso = self._usar()
+            self._db.execute('INSERT INTO entradas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (chave, shard, inicio, len(saida), shape[0], shape[1], canais, lm, uso))
+            self._db.execute('UPDATE shards SET linhas = ?, uso = ? WHERE id = ?', (inicio + len(saida), uso, shard))
+            self._db.commit()
+            self._limitar(shard)
+
+
+    # Retorna o shard e a primeira linha livre para "linhas" linhas, criando um shard novo se necessário
+    def _reservar(self, linhas):
+        ultimo = self._db.execute('SELECT id, linhas, capacidade FROM shards ORDER BY id DESC LIMIT 1').fetchone()
+        if ultimo is not None and ultimo[2] - ultimo[1] >= linhas:
+            return ultimo[0], ultimo[1]
+        shard = ultimo[0] + 1 if ultimo is not None else 1
+        capacidade = max(self.capacidadeShard, linhas)
+        self._mapas[shard] = np.lib.format.open_memmap(self._arquivoShard(shard), mode='w+', dtype=np.float32,
+                                                       shape=(capacidade, self.colunas))
+        self._db.execute('INSERT INTO shards VALUES (?, 0, ?, ?)', (shard, capacidade, self._usar()))
+        return shard, 0
+
+
+    # Remove os shards usados há mais tempo até respeitar o limite. O shard em uso na gravação é mantido
+    def _limitar(self, atual):
+        while self.tamanhoBytes > self.limiteBytes:
+            antigo = self._db.execute('SELECT id FROM shards WHERE id != ? ORDER BY uso LIMIT 1',
+                                      (atual,)).fetchone()
+            if antigo is None:
+                break
+            self._remover(antigo[0])
+
+
+    def _remover(self, shard):
+        self._db.execute('DELETE FROM entradas WHERE shard = ?', (shard,))
+        self._db.execute('DELETE FROM shards WHERE id = ?', (shard,))
+        self._db.commit()
+        mapa = self._mapas.pop(shard, None)
+        if mapa is not None:
+            mapa.flush()
+            del mapa
+        try:
+            os.remove(self._arquivoShard(shard))
+        except OSError:
+            pass
+
+
+    # Remove todas as entradas
+    def limpar(self):
+        with self._trava:
+            for (shard,) in self._db.execute('SELECT id FROM shards').fetchall():
+                self._remover(shard)
+
+
+    # Grava os shards em disco e fecha o índice
+    def fechar(self):
+        with self._trava:
+            for mapa in self._mapas.values():
+                mapa.flush()
+            self._mapas.clear()
+            self._db.close()
@@ -0,0 +1,158 @@
+'''
+Nome:   Inspeção em cascata
+Sobre:  Executa primeiro uma YOLOv4-tiny treinada com as mesmas 7 classes (epi.names) e só executa a YOLOv4
+        completa quando o resultado da tiny for ambíguo:
+            ausente     algum EPI obrigatório não foi encontrado (ou só um dos membros, em luvas e botas)
+            zona_cinza  alguma detecção da tiny tem confiança dentro da zona cinza configurada
+            roi         alguma detecção está fora da região de interesse (comparação de postura.compararROI)
+        Sem pessoa na imagem o acesso é negado de qualquer forma e a rede completa não é executada.
+        A decisão final usa as mesmas regras e limiares da inspeção normal (Inspector.concluir), com as detecções
+        da tiny ou, se houver escalonamento, com as da rede completa.
+        A fração de inspeções escalonadas e a latência média ficam em resumoCascata().
+Desenvolvedor: felipeSperb
+'''
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .detector import detectorEPI, modelRapidoConfiguration, modelRapidoWeights
+from .inspecao import Inspector, decidir, NEGATIVO
+
+
+# Motivos de escalonamento para a rede completa
+AUSENTE = 'ausente'
+ZONA_CINZA = 'zona_cinza'
+ROI = 'roi'
+
+
+class inspetorCascata(Inspector):
+
+    def __init__(self, rapido=None, zonaCinza=(0.5, 0.9), **kwargs):
+
+        '''
+        rapido: Detector da primeira etapa (detector.detectorEPI). Padrão para a YOLOv4-tiny
+                (modelRapidoConfiguration e modelRapidoWeights), com a mesma resolução da rede completa.
+
+        zonaCinza:  Intervalo [mínimo, máximo) de confiança em que uma detecção da tiny é considerada incerta.
+                    Detecções abaixo do mínimo são descartadas, acima do máximo são aceitas sem escalonamento.
+                    Padrão para (0.5, 0.9).
+
+        Os demais argumentos são os do Inspector (detector, pose, requeridos, metricas, politica).
+        O cache de inferência não é usado na cascata.
+        '''
+        self.zonaCinza = tuple(zonaCinza)
+        self.rapido = rapido
+        kwargs.pop('cache', None)
+        super().__init__(**kwargs)
+        if self.rapido is None:
+            self.rapido = detectorEPI(modelRapidoConfiguration, modelRapidoWeights, whT=self.detector.whT,
+                                      metricas=self.metricas)
+        self.aplicarPolitica(self.politica)
+        self.reiniciarResumo()
+
+
+    # Zera a contagem de inspeções escalonadas e a latência acumulada (ver resumoCascata)
+    def reiniciarResumo(self):
+        self.inspecoes = 0
+        self.escalonadas = 0
+        self.motivos = {}
+        self.tempoTotal = 0.0
+
+
+    '''
+    Aplica a política nas duas redes. A tiny mantém as detecções a partir do mínimo da zona cinza, para que as
+    incertas possam ser identificadas; a confiança mínima de cada classe é aplicada depois, na decisão.
+    '''
+    def aplicarPolitica(self, politica):
+        super().aplicarPolitica(politica)
+        if self.rapido is not None:
+            limiares = [min(self.zonaCinza[0], c) for c in politica.confianca]
+            self.rapido.definirLimiares(limiares, politica.nms, politica.nmsPorClasse)
+
+
+    # Pré-carrega as duas redes e o MediaPipe em paralelo
+    def aquecer(self, paralelo=True):
+        inicio = time.perf_counter()
+        etapas = [self.rapido.aquecer, self.detector.aquecer, self.pose.aquecer]
+        with self.metricas.cronometrar('aquecer'):
+            if paralelo:
+                with ThreadPoolExecutor(max_workers=len(etapas)) as executor:
+                    for futuro in [executor.submit(etapa) for etapa in etapas]:
+                        futuro.result()
+            else:
+                for etapa in etapas:
+                    etapa()
+        return time.perf_counter() - inicio
+
+
+    '''
+    Motivo para executar a rede completa, ou None se o resultado da tiny for suficiente.
+        deteccoes: Todas as detecções da tiny (a partir do mínimo da zona cinza).
+        aceitas: Detecções acima da confiança mínima de cada classe, já comparadas com a região de interesse.
+    '''
+    def motivoEscalonamento(self, deteccoes, aceitas, lmList, requeridos):
+        if not lmList:
+            return None
+        minimo, maximo = self.zonaCinza
+        for d in deteccoes:
+            if requeridos[d.classId] and minimo <= d.confianca < maximo:
+                return ZONA_CINZA
+        resultado = decidir(aceitas, requeridos, lmList, self.politica.ambosMembros)
+        if resultado.alertas > 0:
+            return ROI
+        if NEGATIVO in resultado.status:
+            return AUSENTE
+        return None
+
+
+    '''
+    Inspeção em cascata de um frame BGR. Mesmos argumentos de Inspector.inspect.
+        O blob só é usado nas redes com a mesma resolução de entrada (whT).
+        Em resultado.latencias, "rapido" é o tempo da tiny e "deteccao" o da rede completa (0 sem escalonamento).
+    '''
+    def inspect(self, frame, lmList=None, requeridos=None, blob=None, imgRGB=None):
+        if requeridos is None:
+            requeridos = self.requeridos
+        inicio = time.perf_counter()
+        if lmList is None:
+            lmList = self.estimarPostura(frame, imgRGB)
+        postura = time.perf_counter()
+
+        with self.metricas.cronometrar('rapido'):
+            deteccoes = self.rapido.detectar(frame, blob if self.rapido.whT == self.detector.whT else None)
+        limiares = self.politica.confianca
+        aceitas = [d for d in deteccoes if d.confianca >= limiares[d.classId]]
+        if lmList:
+            self.compararDeteccoes(aceitas, lmList)
+        motivo = self.motivoEscalonamento(deteccoes, aceitas, lmList, requeridos)
+        rapido = time.perf_counter()
+
+        if motivo is not None:
+            aceitas = self.detector.detectar(frame, blob)
+        deteccao = time.perf_counter()
+
+        resultado = self.concluir(aceitas, lmList, requeridos)
+        fim = time.perf_counter()
+        resultado.latencias = {'postura': (postura - inicio) * 1000,
+                               'rapido': (rapido - postura) * 1000,
+                               'deteccao': (deteccao - rapido) * 1000,
+                               'decisao': (fim - deteccao) * 1000}
+
+        self.metricas.incrementar('cascata', motivo=motivo or 'rapido')
+        self.inspecoes += 1
+        self.tempoTotal += fim - inicio
+        if motivo is not None:
+            self.escalonadas += 1
+            self.motivos[motivo] = self.motivos.get(motivo, 0) + 1
+        return resultado
+
+
+    # Fração de inspeções escalonadas, motivos e latência média da inspeção (ms)
+    def resumoCascata(self):
+        return {
+            'inspecoes': self.inspecoes,
+            'escalonadas': self.escalonadas,
+            'fracao_escalonada': self.escalonadas / self.inspecoes if self.inspecoes else 0.0,
+            'motivos': dict(self.motivos),
+            'latencia_media_ms': 1000 * self.tempoTotal / self.inspecoes if self.inspecoes else 0.0
+        }
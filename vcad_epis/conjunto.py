@@ -0,0 +1,366 @@
+'''
+Nome:   Montagem do conjunto de treinamento
+Sobre:  Percorre o arquivo de evidências (imagens e arquivos .txt da YOLO salvos a cada inspeção) e gera as listas
+        train.txt e test.txt e o arquivo epi.data para treinar a YOLOv4 com o darknet.
+        Os arquivos são lidos um a um e as listas são gravadas à medida que são percorridos. As classes de cada
+        imagem, usadas para completar as classes no final, ficam em um arquivo auxiliar ao lado de cada lista
+        (apagado no final). A única memória que cresce com o conjunto é o índice da remoção de duplicatas: o hash
+        de cada imagem mantida é guardado uma vez em cada uma das (tolerancia + 1) faixas (ver indiceDuplicatas).
+        Frames quase idênticos (a mesma pessoa parada na frente da câmera) são removidos pelo hash perceptual
+        (dHash de 64 bits): duas imagens com distância de Hamming menor ou igual à tolerância são duplicatas.
+        A divisão é estratificada por classe: cada imagem é decidida pela classe mais rara entre as presentes que
+        ainda precisa de imagens no treino ou no teste (imagens sem marcação formam um estrato próprio). Assim cada
+        classe envia aproximadamente a fração pedida para o teste e toda classe com pelo menos 2 imagens aparece
+        nas duas listas, inclusive as raras. Em conjuntos pequenos, com classes sempre juntas, uma classe pode
+        ficar fora de uma das listas: no final, imagens dela são movidas da outra lista, desde que nenhuma outra
+        classe fique fora. As que continuarem fora (sem combinação possível) são informadas no relatório.
+Uso:    python -m vcad_epis.conjunto Arquivos/Imagens_Registradas --saida YOLOv4/data --teste 0.2
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import os
+import posixpath
+import sys
+
+import cv2
+
+from .detector import classesFile, lerClasses
+
+
+# Extensões de imagem aceitas pelo darknet
+extensoes = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+'''
+Percorre as pastas recursivamente e retorna, uma a uma, as imagens que têm arquivo de marcação (.txt).
+'''
+def percorrer(pasta):
+    pilha = [pasta]
+    while pilha:
+        atual = pilha.pop()
+        try:
+            entradas = os.scandir(atual)
+        except OSError as erro:
+            print('Pasta ignorada: {}'.format(erro), file=sys.stderr)
+            continue
+        with entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    pilha.append(entrada.path)
+                elif entrada.name.lower().endswith(extensoes):
+                    if os.path.exists(os.path.splitext(entrada.path)[0] + '.txt'):
+                        yield entrada.path
+
+
+'''
+Lê as classes presentes no arquivo de marcação de uma imagem.
+    Retorna None se o arquivo for inválido (classe desconhecida ou linha fora do formato "classe x y w h").
+'''
+def classesImagem(caminhoImagem, quantidadeClasses):
+    classes = set()
+    with open(os.path.splitext(caminhoImagem)[0] + '.txt', 'rt') as f:
+        for linha in f:
+            partes = linha.split()
+            if not partes:
+                continue
+            try:
+                classId = int(partes[0])
+                valores = [float(v) for v in partes[1:]]
+            except ValueError:
+                return None
+            if len(valores) != 4 or not 0 <= classId < quantidadeClasses:
+                return None
+            classes.add(classId)
+    return frozenset(classes)
+
+
+'''
+Hash perceptual (dHash) de 64 bits: compara o brilho de pixels vizinhos da imagem reduzida para 9x8.
+    Imagens quase idênticas (ruído, compressão, pequenas variações de iluminação) têm hashes próximos.
+    Retorna None se a imagem não puder ser lida.
+'''
+def hashPerceptual(caminhoImagem):
+    imagem = cv2.imread(caminhoImagem, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if imagem is None:
+        return None
+    reduzida = cv2.resize(imagem, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (reduzida[:, 1:] > reduzida[:, :-1]).flatten()
+    valor = 0
+    for bit in bits:
+        valor = (valor << 1) | int(bit)
+    return valor
+
+
+class indiceDuplicatas():
+
+    def __init__(self, tolerancia=4):
+
+        '''
+        Índice de hashes perceptuais para encontrar duplicatas sem comparar cada imagem com todas as outras.
+        O hash é dividido em (tolerancia + 1) faixas: se duas imagens diferem em até "tolerancia" bits, pelo
+        menos uma faixa é idêntica, então só as imagens que compartilham alguma faixa são comparadas.
+        Cada hash adicionado é guardado em todas as faixas: a memória cresce com a quantidade de imagens mantidas,
+        proporcionalmente a (tolerancia + 1).
+
+        tolerancia: Distância de Hamming máxima entre duplicatas. Padrão para 4 (de 64 bits).
+        '''
+        self.tolerancia = tolerancia
+        faixas = tolerancia + 1
+        self._limites = [(64 * i // faixas, 64 * (i + 1) // faixas) for i in range(faixas)]
+        self._faixas = [{} for _ in range(faixas)]
+
+
+    def _chaves(self, valor):
+        for (inicio, fim), faixa in zip(self._limites, self._faixas):
+            yield faixa, (valor >> inicio) & ((1 << (fim - inicio)) - 1)
+
+
+    # Adiciona o hash ao índice e retorna true se ele for duplicata de algum já adicionado
+    def duplicata(self, valor):
+        for faixa, chave in self._chaves(valor):
+            for outro in faixa.get(chave, ()):
+                if bin(valor ^ outro).count('1') <= self.tolerancia:
+                    return True
+        for faixa, chave in self._chaves(valor):
+            faixa.setdefault(chave, []).append(valor)
+        return False
+
+
+class divisaoEstratificada():
+
+    def __init__(self, fracaoTeste=0.2):
+
+        '''
+        Divide as imagens entre treino e teste à medida que chegam, sem conhecer o total.
+        Cada classe tem uma cota de teste (fracaoTeste das imagens vistas, no mínimo 1 a partir da segunda imagem)
+        e a primeira imagem de cada classe vai para o treino. A imagem é decidida pela classe mais rara entre as
+        presentes que ainda tem necessidade (treino vazio ou teste abaixo da cota); sem necessidade, vai para o treino.
+
+        fracaoTeste:    Fração das imagens de cada classe usada no teste. Padrão para 0.2.
+        '''
+        self.fracaoTeste = fracaoTeste
+        # Imagens vistas e enviadas para o teste, por classe (None para as imagens sem marcação)
+        self._vistas = {}
+        self._teste = {}
+
+
+    def _cota(self, vistas):
+        if self.fracaoTeste <= 0 or vistas < 2:
+            return 0
+        return max(1, int(vistas * self.fracaoTeste))
+
+
+    # Retorna true se a imagem com as classes informadas deve ir para o teste
+    def teste(self, classes):
+        estratos = list(classes) or [None]
+        for c in estratos:
+            self._vistas[c] = self._vistas.get(c, 0) + 1
+
+        destino = False
+        for c in sorted(estratos, key=lambda c: (self._vistas[c], -1 if c is None else c)):
+            vistas, teste = self._vistas[c], self._teste.get(c, 0)
+            # vistas - 1: a imagem atual ainda não foi contada em nenhuma lista
+            if vistas - 1 - teste == 0:
+                break
+            if teste < self._cota(vistas):
+                destino = True
+                break
+
+        if destino:
+            for c in estratos:
+                self._teste[c] = self._teste.get(c, 0) + 1
+        return destino
+
+
+'''
+Arquivo .data do darknet.
+'''
+def escreverData(arquivo, quantidadeClasses, treino, teste, nomes, backup):
+    with open(arquivo, 'w') as f:
+        f.write('classes = {}\n'.format(quantidadeClasses))
+        f.write('train = {}\n'.format(treino))
+        f.write('valid = {}\n'.format(teste))
+        f.write('names = {}\n'.format(nomes))
+        f.write('backup = {}\n'.format(backup))
+
+
+# Bytes da máscara de classes (bit classId) de cada imagem no arquivo auxiliar
+def larguraMascara(quantidadeClasses):
+    return max(1, (quantidadeClasses + 7) // 8)
+
+
+'''
+Lê, uma a uma, as máscaras de classes gravadas no arquivo auxiliar de uma lista (uma por linha da lista).
+'''
+def lerMascaras(arquivo, quantidadeClasses):
+    largura = larguraMascara(quantidadeClasses)
+    with open(arquivo, 'rb') as f:
+        while True:
+            dados = f.read(largura)
+            if len(dados) < largura:
+                return
+            yield int.from_bytes(dados, 'little')
+
+
+'''
+Completa as classes com pelo menos 2 imagens que ficaram fora de uma das listas, escolhendo imagens para mover.
+    Uma imagem só é movida se as suas outras classes continuarem nas duas listas (ou tiverem menos de 2 imagens).
+    mascaras: Arquivo auxiliar de cada lista com as classes de cada imagem (ver lerMascaras), relido a cada busca.
+    contagem: Imagens de cada classe por lista, atualizada com as mudanças.
+Retorna os índices das linhas a mover de cada lista e as classes que continuam incompletas.
+'''
+def completarClasses(mascaras, contagem, quantidadeClasses):
+    mover = {'treino': set(), 'teste': set()}
+    outra = {'treino': 'teste', 'teste': 'treino'}
+
+    def incompleta(c):
+        return contagem['treino'][c] + contagem['teste'][c] >= 2 and \
+            (contagem['treino'][c] == 0 or contagem['teste'][c] == 0)
+
+    mudou = True
+    while mudou:
+        mudou = False
+        for c in range(quantidadeClasses):
+            if not incompleta(c):
+                continue
+            origem = 'treino' if contagem['teste'][c] == 0 else 'teste'
+            for i, mascara in enumerate(lerMascaras(mascaras[origem], quantidadeClasses)):
+                if i in mover[origem] or not mascara >> c & 1:
+                    continue
+                classes = [k for k in range(quantidadeClasses) if mascara >> k & 1]
+                if any(k != c and contagem[origem][k] < 2 and contagem[outra[origem]][k] > 0 for k in classes):
+                    continue
+                mover[origem].add(i)
+                for k in classes:
+                    contagem[origem][k] -= 1
+                    contagem[outra[origem]][k] += 1
+                mudou = True
+                break
+    return mover, [c for c in range(quantidadeClasses) if incompleta(c)]
+
+
+'''
+Move as linhas indicadas (índices) de cada lista para o final da outra, regravando as listas linha a linha.
+'''
+def moverLinhas(arquivos, mover):
+    movidas = {}
+    for lista, arquivo in arquivos.items():
+        movidas[lista] = []
+        temporario = arquivo + '.tmp'
+        with open(arquivo, 'r') as entrada, open(temporario, 'w') as saida:
+            for i, linha in enumerate(entrada):
+                if i in mover[lista]:
+                    movidas[lista].append(linha)
+                else:
+                    saida.write(linha)
+        os.replace(temporario, arquivo)
+    with open(arquivos['teste'], 'a') as saida:
+        saida.writelines(movidas['treino'])
+    with open(arquivos['treino'], 'a') as saida:
+        saida.writelines(movidas['teste'])
+
+
+'''
+Monta o conjunto a partir das pastas informadas.
+    saida: Pasta onde são gravados train.txt, test.txt e epi.data.
+    prefixo: Se informado, substitui a pasta de cada imagem nas listas (ex: "data/obj" para o Colab) e as
+             listas e o arquivo de nomes são referenciados no epi.data pela pasta acima dela (ex: "data/train.txt"
+             e "data/epi.names").
+             Padrão para o caminho absoluto das imagens e das listas.
+Retorna o relatório com as quantidades de imagens e de cada classe em cada lista.
+'''
+def montar(pastas, saida, fracaoTeste=0.2, tolerancia=4, prefixo=None, nomes=classesFile, backup='backup'):
+    classNames = lerClasses(nomes)
+    n = len(classNames)
+    indice = indiceDuplicatas(tolerancia) if tolerancia >= 0 else None
+    divisao = divisaoEstratificada(fracaoTeste)
+    relatorio = {'imagens': 0, 'duplicatas': 0, 'invalidas': 0,
+                 'treino': {'imagens': 0, 'classes': [0] * n},
+                 'teste': {'imagens': 0, 'classes': [0] * n}}
+
+    os.makedirs(saida, exist_ok=True)
+    arquivoTreino = os.path.join(saida, 'train.txt')
+    arquivoTeste = os.path.join(saida, 'test.txt')
+    arquivos = {'treino': arquivoTreino, 'teste': arquivoTeste}
+    # Arquivos auxiliares com as classes de cada imagem (bit classId), na ordem das linhas de cada lista
+    mascaras = {lista: arquivo + '.classes' for lista, arquivo in arquivos.items()}
+    largura = larguraMascara(n)
+    try:
+        with open(arquivoTreino, 'w') as treino, open(arquivoTeste, 'w') as teste, \
+                open(mascaras['treino'], 'wb') as mascaraTreino, open(mascaras['teste'], 'wb') as mascaraTeste:
+            for pasta in pastas:
+                for caminho in percorrer(pasta):
+                    relatorio['imagens'] += 1
+                    classes = classesImagem(caminho, n)
+                    valor = hashPerceptual(caminho) if classes is not None else None
+                    if valor is None:
+                        relatorio['invalidas'] += 1
+                        continue
+                    if indice is not None and indice.duplicata(valor):
+                        relatorio['duplicatas'] += 1
+                        continue
+
+                    lista = 'teste' if divisao.teste(classes) else 'treino'
+                    linha = os.path.abspath(caminho) if prefixo is None else \
+                        posixpath.join(prefixo, os.path.basename(caminho))
+                    (teste if lista == 'teste' else treino).write(linha + '\n')
+                    mascara = sum(1 << classId for classId in classes)
+                    (mascaraTeste if lista == 'teste' else mascaraTreino).write(mascara.to_bytes(largura, 'little'))
+                    relatorio[lista]['imagens'] += 1
+                    for classId in classes:
+                        relatorio[lista]['classes'][classId] += 1
+
+        # Classes com pelo menos 2 imagens que ficaram fora de uma das listas (sem teste, ficam só no treino)
+        relatorio['incompletas'] = []
+        if fracaoTeste > 0:
+            contagem = {lista: relatorio[lista]['classes'] for lista in arquivos}
+            mover, relatorio['incompletas'] = completarClasses(mascaras, contagem, n)
+            if mover['treino'] or mover['teste']:
+                moverLinhas(arquivos, mover)
+                relatorio['treino']['imagens'] += len(mover['teste']) - len(mover['treino'])
+                relatorio['teste']['imagens'] += len(mover['treino']) - len(mover['teste'])
+    finally:
+        for arquivo in mascaras.values():
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+
+    if prefixo is None:
+        listas = (os.path.abspath(arquivoTreino), os.path.abspath(arquivoTeste), os.path.abspath(nomes))
+    else:
+        base = posixpath.dirname(prefixo.rstrip('/'))
+        listas = (posixpath.join(base, 'train.txt'), posixpath.join(base, 'test.txt'),
+                  posixpath.join(base, os.path.basename(nomes)))
+    escreverData(os.path.join(saida, 'epi.data'), n, listas[0], listas[1], listas[2], backup)
+    return relatorio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera train.txt, test.txt e epi.data a partir das evidências.')
+    parser.add_argument('pastas', nargs='*', default=[os.path.join('Arquivos', 'Imagens_Registradas')],
+                        help='pastas com imagens e marcações (padrão: Arquivos/Imagens_Registradas)')
+    parser.add_argument('--saida', default='conjunto', help='pasta das listas geradas (padrão: conjunto)')
+    parser.add_argument('--teste', type=float, default=0.2, help='fração de cada classe para teste (padrão 0.2)')
+    parser.add_argument('--tolerancia', type=int, default=4,
+                        help='bits de diferença entre duplicatas, -1 desativa a remoção (padrão 4)')
+    parser.add_argument('--prefixo', default=None, help='pasta das imagens nas listas (ex: data/obj)')
+    parser.add_argument('--backup', default='backup', help='pasta de backup dos pesos no epi.data')
+    args = parser.parse_args(argv)
+
+    if not 0.0 <= args.teste < 1.0:
+        parser.error('--teste deve estar entre 0 e 1')
+
+    relatorio = montar(args.pastas, args.saida, args.teste, args.tolerancia, args.prefixo, backup=args.backup)
+    classNames = lerClasses()
+    print('Imagens: {}  duplicatas: {}  inválidas: {}'.format(relatorio['imagens'], relatorio['duplicatas'],
+                                                             relatorio['invalidas']))
+    print('Treino: {}  teste: {}'.format(relatorio['treino']['imagens'], relatorio['teste']['imagens']))
+    for c, nome in enumerate(classNames):
+        print('{:10s} treino: {:6d}  teste: {:6d}'.format(nome, relatorio['treino']['classes'][c],
+                                                          relatorio['teste']['classes'][c]))
+    for c in relatorio['incompletas']:
+        print('Aviso: a classe {} não aparece nas duas listas'.format(classNames[c]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
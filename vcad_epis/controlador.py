@@ -0,0 +1,215 @@
+'''
+Nome:   Controlador de portarias
+Sobre:  Executa várias câmeras (portarias) ao mesmo tempo em um único processo.
+        Cada câmera tem sua própria thread de captura, seu estimador de postura e sua própria máquina de estados
+        de inspeção (contagem da pose de inspeção, última detecção e restauração após 30 segundos).
+        As inspeções (YOLOv4) são enviadas a um pool de inspetores compartilhado, com rodízio entre câmeras,
+        de forma que uma portaria movimentada não impede o atendimento das demais.
+        Aceita índices de câmera, arquivos de vídeo, URLs e armazéns de quadros (ver quadros.py).
+        Para arquivos, o tempo usado na contagem é o tempo do próprio vídeo, permitindo processar gravações
+        mais rápido que o tempo real.
+Uso:    python -m vcad_epis.controlador 0 1 portaria3.mp4 --instancias 2
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import threading
+import time
+
+import cv2
+import imutils
+
+from . import metricas as mt
+from .estado import maquinaInspecao, CAPTURADO, RESTAURADO
+from .inspecao import requeridosPadrao
+from .postura import poseDetector
+from .quadros import abrirCaptura
+from .registro import registroInspecoes, arquivoRegistro
+from .servico import poolInspetores, filaCheia
+
+
+# Largura dos frames, a mesma do programa principal
+larguraFrame = 920
+
+
+class camera():
+
+    def __init__(self, fonte, nome=None, requeridos=requeridosPadrao, complexidade=1, tempos=None):
+
+        '''
+        fonte:  Índice da câmera (int), caminho de um arquivo de vídeo ou URL de stream.
+
+        nome:   Identificação da portaria. Padrão para a própria fonte.
+
+        requeridos: Lista com os 7 EPIs obrigatórios desta portaria.
+
+        complexidade:   Complexidade do modelo de postura (ver poseDetector).
+
+        tempos: Tempos da contagem desta portaria (ver estado.temposInspecao).
+        '''
+        self.fonte = fonte
+        self.nome = nome if nome is not None else str(fonte)
+        self.requeridos = list(requeridos)
+        self.arquivo = not isinstance(fonte, int)
+        self.pose = poseDetector(complexity=complexidade)
+        self.estado = maquinaInspecao(tempos)
+        self.ultimoResultado = None
+        self.frames = 0
+        self.inspecoes = 0
+        self.thread = None
+
+
+class controladorPortarias():
+
+    def __init__(self, cameras, pool=None, instancias=1, lote=1, maxPorCamera=2, metricas=None,
+                 aoDecidir=None, aoRestaurar=None, tempoReal=False, registro=None):
+
+        '''
+        cameras:    Lista de objetos camera (ou de fontes, convertidas em camera com os valores padrão).
+
+        pool:   Pool de inspetores compartilhado (ver servico.poolInspetores). Se não informado, é criado
+                com "instancias" inspetores e lotes de até "lote" frames.
+
+        maxPorCamera:   Quantidade máxima de inspeções pendentes de uma mesma câmera.
+
+        metricas:   Coletor de métricas. Padrão para desabilitado.
+
+        aoDecidir:  Função chamada com (camera, InspectionResult) a cada decisão.
+
+        aoRestaurar:    Função chamada com (camera) quando o resultado expira (30 segundos).
+
+        tempoReal:  Se definido como true, arquivos de vídeo são lidos na velocidade original.
+                    Padrão para false (o mais rápido possível, usando o tempo do vídeo).
+
+        registro:   Registro de inspeções (ver registro.registroInspecoes). Cada decisão é registrada com
+                    o nome da câmera.
+        '''
+        self.cameras = [c if isinstance(c, camera) else camera(c) for c in cameras]
+        self.metricas = metricas if metricas is not None else mt.coletorMetricas(habilitado=False)
+        if pool is None:
+            pool = poolInspetores(instancias, lote, metricas=self.metricas, maxPorCliente=maxPorCamera)
+        self.pool = pool
+        self.aoDecidir = aoDecidir
+        self.aoRestaurar = aoRestaurar
+        self.tempoReal = tempoReal
+        self.registro = registro
+        self._parar = threading.Event()
+
+
+    # Recebe o resultado de uma inspeção (executado na thread do pool)
+    def _concluido(self, cam, futuro):
+        try:
+            resultado = futuro.result()
+        except Exception as erro:
+            print('[{}] erro na inspeção: {}'.format(cam.nome, erro))
+            return
+        cam.ultimoResultado = resultado
+        cam.inspecoes += 1
+        cam.estado.decidido(resultado)
+        self.metricas.incrementar('decisoes_camera', camera=cam.nome, decisao=resultado.decisao)
+        if self.registro is not None:
+            self.registro.registrar(resultado, portaria=cam.nome)
+        if self.aoDecidir is not None:
+            self.aoDecidir(cam, resultado)
+
+
+    # Laço de uma câmera: captura, postura, contagem e envio das inspeções ao pool
+    def _executar(self, cam):
+        cap = abrirCaptura(cam.fonte)
+        inicio = time.time()
+        try:
+            while not self._parar.is_set():
+                with self.metricas.cronometrar('captura'):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                cam.frames += 1
+
+                # Tempo da contagem: relógio para câmeras, tempo do vídeo para arquivos
+                if cam.arquivo:
+                    tempo = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+                    if self.tempoReal and tempo > time.time() - inicio:
+                        time.sleep(tempo - (time.time() - inicio))
+                else:
+                    tempo = time.time()
+
+                frame = imutils.resize(frame, width=larguraFrame)
+                with self.metricas.cronometrar('findPose'):
+                    cam.pose.findPose(frame, False)
+                with self.metricas.cronometrar('findPosition'):
+                    lmList = cam.pose.findPosition(frame, False)
+                pessoa = len(lmList) != 0
+                emPostura = pessoa and cam.pose.posturaInspecao(frame)
+
+                for evento in cam.estado.atualizar(pessoa, emPostura, tempo):
+                    if evento.tipo == CAPTURADO:
+                        try:
+                            futuro = self.pool.enviar(frame, cam.requeridos, list(lmList), cliente=cam.nome)
+                        except filaCheia:
+                            print('[{}] inspeção descartada: fila cheia'.format(cam.nome))
+                            continue
+                        futuro.add_done_callback(lambda f, c=cam: self._concluido(c, f))
+                    elif evento.tipo == RESTAURADO:
+                        cam.ultimoResultado = None
+                        if self.aoRestaurar is not None:
+                            self.aoRestaurar(cam)
+        finally:
+            cap.release()
+
+
+    # Inicia uma thread por câmera
+    def iniciar(self):
+        self._parar.clear()
+        for cam in self.cameras:
+            cam.thread = threading.Thread(target=self._executar, args=(cam,), name=cam.nome, daemon=True)
+            cam.thread.start()
+        return self
+
+
+    # Aguarda o fim de todas as câmeras (arquivos de vídeo terminam sozinhos)
+    def aguardar(self):
+        for cam in self.cameras:
+            if cam.thread is not None:
+                cam.thread.join()
+
+
+    # Interrompe as câmeras e encerra o pool após concluir as inspeções pendentes
+    def parar(self):
+        self._parar.set()
+        self.aguardar()
+        self.pool.encerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Controlador de várias portarias em um único processo.')
+    parser.add_argument('fontes', nargs='+', help='índices de câmera, arquivos de vídeo ou URLs')
+    parser.add_argument('--instancias', type=int, default=1, help='inspetores compartilhados (padrão 1)')
+    parser.add_argument('--lote', type=int, default=1, help='frames por execução da rede (padrão 1)')
+    parser.add_argument('--tempo-real', action='store_true', help='lê arquivos na velocidade original')
+    parser.add_argument('--registro', default=None, const=arquivoRegistro, nargs='?',
+                        help='registra cada inspeção (arquivo padrão: Arquivos/Registros/inspecoes.jsonl)')
+    args = parser.parse_args(argv)
+
+    fontes = [int(f) if f.isdigit() else f for f in args.fontes]
+
+    def aoDecidir(cam, resultado):
+        print('[{}] {}'.format(cam.nome, resultado.decisao))
+
+    registro = registroInspecoes(args.registro) if args.registro else None
+    controlador = controladorPortarias(fontes, instancias=args.instancias, lote=args.lote,
+                                       aoDecidir=aoDecidir, tempoReal=args.tempo_real, registro=registro)
+    controlador.iniciar()
+    try:
+        controlador.aguardar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controlador.parar()
+        if registro is not None:
+            registro.fechar()
+    for cam in controlador.cameras:
+        print('[{}] frames: {}  inspeções: {}'.format(cam.nome, cam.frames, cam.inspecoes))
+
+
+if __name__ == "__main__":
+    main()
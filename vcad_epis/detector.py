@@ -0,0 +1,298 @@
+'''
+Nome:   Classe de detecção de EPIs
+Sobre:  Carrega a rede YOLOv4 treinada para as 7 classes de EPIs e executa a detecção em um frame.
+        A rede só é carregada na primeira detecção, importar este módulo não lê o arquivo de pesos.
+        Retorna as detecções mantidas após a supressão não máxima, já convertidas para as proporções da imagem.
+Desenvolvedor: felipeSperb
+'''
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from . import metricas as mt
+
+
+# ---------------------- ARQUIVOS -------------------------- #
+
+# Pasta com os arquivos da YOLOv4, relativa à raiz do repositório
+pastaYOLO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'YOLOv4')
+
+# Arquivo de classes de objetos
+classesFile = os.path.join(pastaYOLO, 'epi.names')
+# Arquivo com arquitetura YOLOv4 modificada
+modelConfiguration = os.path.join(pastaYOLO, 'yolov4-epi.cfg')
+# Arquivo de pesos treinados
+modelWeights = os.path.join(pastaYOLO, 'yolov4-epi360_3200.weights')
+# Modelo pré-convertido opcional (ONNX), carregado mais rápido que o .cfg + .weights. Quando existe, é o padrão.
+# As saídas devem ter o mesmo formato das camadas YOLO do darknet: [x, y, w, h, objeto, confiança de cada classe]
+# A entrada é fixada na conversão: whT deve ser a resolução usada na exportação e não pode ser alterado depois.
+modelConvertido = os.path.join(pastaYOLO, 'yolov4-epi.onnx')
+# YOLOv4-tiny treinada com as mesmas classes, usada como primeira etapa da inspeção em cascata (ver cascata)
+modelRapidoConfiguration = os.path.join(pastaYOLO, 'yolov4-tiny-epi.cfg')
+modelRapidoWeights = os.path.join(pastaYOLO, 'yolov4-tiny-epi.weights')
+
+
+# ----------------- VARIAVEIS GLOBAIS ---------------------- #
+
+# Proporções da imagem de entrada da CNN
+whT = 416
+# Confiança mínima da rede
+confThreshold = 0.9
+# Supressão não máxima. Limite de IOU
+nmsThreshold = 0.3
+
+# Índices das classes
+# 0 = mascara, 1 = capacete, 2 = óculos, 3 = abafador, 4 = colete, 5 = luva, 6 = bota.
+MASCARA, CAPACETE, OCULOS, ABAFADOR, COLETE, LUVA, BOTA = range(7)
+
+
+'''
+Abre e lê o arquivo de classes de objetos
+'''
+def lerClasses(arquivo=classesFile):
+    with open(arquivo, 'rt') as f:
+        return f.read().rstrip('\n').split('\n')
+
+
+'''
+Carrega a rede a partir dos arquivos do darknet e configura o OpenCV como backend em CPU
+    Se "pesos" for um arquivo .onnx (modelo pré-convertido), a configuração não é usada.
+'''
+def carregarRede(configuracao=modelConfiguration, pesos=modelWeights):
+    if pesos.lower().endswith('.onnx'):
+        net = cv2.dnn.readNetFromONNX(pesos)
+    else:
+        # Configurar framework darknet como backend usando openCV
+        net = cv2.dnn.readNetFromDarknet(configuracao, pesos)
+    # Configurar opencv como backend
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    # Configurar cpu
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+
+'''
+Pesos usados por padrão: o modelo pré-convertido (modelConvertido), se existir, ou os pesos do darknet.
+'''
+def pesosPadrao():
+    return modelConvertido if os.path.exists(modelConvertido) else modelWeights
+
+
+'''
+Supressão não máxima por classe:
+    Caixas de classes diferentes não se suprimem (uma bota não elimina uma luva sobreposta).
+    Usa cv2.dnn.NMSBoxesBatched quando disponível (OpenCV >= 4.7). Nas versões anteriores desloca as caixas
+    de cada classe para regiões que não se sobrepõem e executa uma única NMSBoxes.
+    Retorna os índices das caixas mantidas.
+'''
+def nmsPorClasse(bbox, confs, classIds, nmsThreshold, scoreThreshold=0.0):
+    if len(bbox) == 0:
+        return np.empty(0, dtype=int)
+    if hasattr(cv2.dnn, 'NMSBoxesBatched'):
+        indices = cv2.dnn.NMSBoxesBatched(bbox.tolist(), confs.tolist(), classIds.tolist(), scoreThreshold, nmsThreshold)
+        return np.array(indices, dtype=int).flatten()
+    bbox = np.asarray(bbox)
+    minimo = bbox[:, :2].min()
+    deslocamento = (np.maximum(bbox[:, 0] + bbox[:, 2], bbox[:, 1] + bbox[:, 3]).max() - minimo + 1) * np.asarray(classIds)
+    caixas = bbox.copy()
+    caixas[:, 0] += deslocamento
+    caixas[:, 1] += deslocamento
+    return np.array(cv2.dnn.NMSBoxes(caixas.tolist(), confs.tolist(), scoreThreshold, nmsThreshold), dtype=int).flatten()
+
+
+'''
+Retorna os nomes das camadas de saída da rede.
+    O formato de getUnconnectedOutLayers mudou entre versões do OpenCV, por isso o flatten.
+'''
+def camadasSaida(net):
+    layerNames = net.getLayerNames()
+    return [layerNames[i - 1] for i in np.array(net.getUnconnectedOutLayers()).flatten()]
+
+
+class deteccao():
+
+    def __init__(self, classId, confianca, caixa, posicao):
+
+        '''
+        classId:    Índice da classe detectada.
+
+        confianca:  Valor de confiança da classe.
+
+        caixa:  Coordenadas (x, y, w, h) em pixels, nas proporções da imagem.
+
+        posicao:    Coordenadas (centro x, centro y, largura, altura) normalizadas entre 0 e 1,
+                    no formato usado pelos arquivos de marcação da YOLO.
+        '''
+        self.classId = classId
+        self.confianca = confianca
+        self.caixa = caixa
+        self.posicao = posicao
+
+        # Resultado da comparação com a região de interesse (ver compararROI)
+        self.comparacao = 0
+
+    def __repr__(self):
+        return 'deteccao(classId={}, confianca={:.2f}, caixa={})'.format(self.classId, self.confianca, self.caixa)
+
+
+class detectorEPI():
+
+    def __init__(self, configuracao=modelConfiguration, pesos=None, whT=whT,
+                 confThreshold=confThreshold, nmsThreshold=nmsThreshold, metricas=None, limiaresClasse=None,
+                 nmsPorClasse=True):
+
+        '''
+        configuracao:   Arquivo .cfg com a arquitetura da rede.
+
+        pesos:  Arquivo .weights com os pesos treinados, ou o modelo pré-convertido (.onnx, ver modelConvertido).
+                Padrão para modelConvertido, se existir, ou modelWeights (ver pesosPadrao).
+
+        whT:    Largura e altura da imagem de entrada da CNN.
+                Padrão para 416. Em um modelo .onnx, deve ser a resolução usada na conversão.
+
+        confThreshold:  Confiança mínima para que uma detecção seja considerada.
+                        Padrão para 0.9.
+
+        nmsThreshold:   Limite de IOU da supressão não máxima.
+                        Padrão para 0.3.
+
+        metricas:   Coletor de métricas (ver metricas.coletorMetricas). Padrão para desabilitado.
+
+        limiaresClasse: Lista com a confiança mínima de cada classe. Padrão para confThreshold em todas.
+
+        nmsPorClasse:   Se definido como true, a supressão não máxima é feita separadamente para cada classe.
+                        Padrão para true.
+        '''
+        self.configuracao = configuracao
+        self.pesos = pesos if pesos is not None else pesosPadrao()
+        self.whT = whT
+        self.confThreshold = confThreshold
+        self.nmsThreshold = nmsThreshold
+        self.limiaresClasse = list(limiaresClasse) if limiaresClasse is not None else None
+        self.nmsPorClasse = nmsPorClasse
+        self.metricas = metricas if metricas is not None else mt.coletorMetricas(habilitado=False)
+
+        # A rede é carregada na primeira chamada de detectar
+        self.net = None
+        self.outputNames = None
+        self._trava = threading.Lock()
+        # A rede do OpenCV não pode ser executada por duas threads ao mesmo tempo (ex: aquecimento e inspeção)
+        self._execucao = threading.Lock()
+
+
+    # Modelos pré-convertidos (.onnx) têm a resolução de entrada fixa: whT não pode ser alterado
+    @property
+    def entradaFixa(self):
+        return self.pesos.lower().endswith('.onnx')
+
+
+    # Carrega a rede, caso ainda não tenha sido carregada. Pode ser chamada por outra thread (pré-carregamento)
+    def carregar(self):
+        if self.net is None:
+            with self._trava:
+                if self.net is None:
+                    with self.metricas.cronometrar('carregar_rede'):
+                        net = carregarRede(self.configuracao, self.pesos)
+                        self.outputNames = camadasSaida(net)
+                        self.net = net
+        return self
+
+
+    # Carrega a rede e executa uma inferência com uma imagem vazia, alocando as camadas antes da primeira inspeção
+    def aquecer(self):
+        self.carregar()
+        with self.metricas.cronometrar('aquecimento'):
+            self.inferir(np.zeros((self.whT, self.whT, 3), dtype=np.uint8))
+        return self
+
+
+    # Altera os limiares sem recarregar a rede
+    def definirLimiares(self, limiaresClasse=None, nmsThreshold=None, nmsPorClasse=None):
+        if limiaresClasse is not None:
+            self.limiaresClasse = list(limiaresClasse)
+            self.confThreshold = min(self.limiaresClasse)
+        if nmsThreshold is not None:
+            self.nmsThreshold = nmsThreshold
+        if nmsPorClasse is not None:
+            self.nmsPorClasse = nmsPorClasse
+
+
+    # Executa a rede e retorna a lista bruta de saídas. blob: entrada já gerada (ver preprocessamento)
+    def inferir(self, frame, blob=None):
+        self.carregar()
+        # Converte imagem em um objeto BLOB (se não foi gerado no pré-processamento)
+        if blob is None:
+            with self.metricas.cronometrar('blob'):
+                blob = cv2.dnn.blobFromImage(frame, 1 / 255, (self.whT, self.whT), [0, 0, 0], 1, crop=False)
+        with self._execucao:
+            # Define blob como entrada da rede
+            self.net.setInput(blob)
+            # Retorna lista de objetos detectados
+            with self.metricas.cronometrar('forward'):
+                return self.net.forward(self.outputNames)
+
+
+    # Converte as saídas da rede em detecções, aplicando a confiança mínima e a supressão não máxima
+    def decodificar(self, outputs, shape):
+
+        # Retorna as dimenções da imagem
+        hT, wT = shape[:2]
+
+        with self.metricas.cronometrar('decodificacao'):
+            # Todas as saídas em uma única matriz: [x, y, w, h, objeto, confiança de cada classe...]
+            dets = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+            scores = dets[:, 5:]
+            # Índice correspondente a classe com maior confiança
+            classIds = scores.argmax(axis=1)
+            # Valor de confiança referente a classe
+            confs = scores[np.arange(len(dets)), classIds]
+
+            # Mantém as detecções com confiança maior que a confiança mínima da classe
+            if self.limiaresClasse is None:
+                limiares = np.full(scores.shape[1], self.confThreshold, dtype=np.float32)
+            else:
+                limiares = np.asarray(self.limiaresClasse, dtype=np.float32)
+            manter = confs > limiares[classIds]
+            dets, classIds, confs = dets[manter], classIds[manter], confs[manter]
+
+            # Converte as coordenadas para as proporções da imagem
+            w, h = (dets[:, 2] * wT).astype(int), (dets[:, 3] * hT).astype(int)
+            x, y = ((dets[:, 0] * wT) - w / 2).astype(int), ((dets[:, 1] * hT) - h / 2).astype(int)
+            bbox = np.stack([x, y, w, h], axis=1)
+
+        # Executa supressão não máxima
+        with self.metricas.cronometrar('nms'):
+            if self.nmsPorClasse:
+                indices = nmsPorClasse(bbox, confs, classIds, self.nmsThreshold)
+            else:
+                indices = np.array(cv2.dnn.NMSBoxes(bbox.tolist(), confs.tolist(), 0.0, self.nmsThreshold)).flatten()
+
+        return [deteccao(int(classIds[i]), float(confs[i]), bbox[i].tolist(), dets[i, :4].tolist()) for i in indices]
+
+
+    # Função de detecção de objetos
+    def detectar(self, frame, blob=None):
+        return self.decodificar(self.inferir(frame, blob), frame.shape)
+
+
+    '''
+    Detecção de objetos em lote:
+        Executa a rede uma única vez para vários frames e retorna uma lista de detecções por frame.
+        As camadas YOLO do OpenCV concatenam as linhas de todas as imagens do lote, por isso cada
+        saída é dividida em partes iguais antes da decodificação.
+    '''
+    def detectarLote(self, frames):
+        if len(frames) == 1:
+            return [self.detectar(frames[0])]
+        self.carregar()
+        with self.metricas.cronometrar('blob'):
+            blob = cv2.dnn.blobFromImages(frames, 1 / 255, (self.whT, self.whT), [0, 0, 0], 1, crop=False)
+        with self._execucao:
+            self.net.setInput(blob)
+            with self.metricas.cronometrar('forward'):
+                outputs = self.net.forward(self.outputNames)
+        partes = [np.split(output.reshape(-1, output.shape[-1]), len(frames)) for output in outputs]
+        return [self.decodificar([p[n] for p in partes], frame.shape) for n, frame in enumerate(frames)]
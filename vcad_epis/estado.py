@@ -0,0 +1,226 @@
+'''
+Nome:   Máquina de estados da inspeção
+Sobre:  Controla a contagem da pose de inspeção, a captura do frame, a decisão e a restauração do menu.
+        Substitui as variáveis globais de contagem (t, espera e tempoDetect) do programa principal.
+        Os tempos são configuráveis (temposInspecao) e o relógio é injetável: com um relógio manual é possível
+        simular horas de funcionamento da portaria em milissegundos.
+        A contagem depende do tempo decorrido e não da quantidade de frames recebidos: com poucos frames por
+        segundo a captura acontece no mesmo instante que com muitos.
+        Cada mudança gera um evento:
+            pose_iniciada   a pessoa assumiu a pose de inspeção e a contagem começou
+            contagem        a contagem mudou (valor: 1, 2, 3...)
+            pose_perdida    a pessoa saiu da pose antes da captura
+            capturado       a pose foi mantida até o fim da contagem, o frame atual deve ser inspecionado
+            decidido        a decisão da inspeção foi informada (valor: InspectionResult)
+            restaurado      o tempo de exibição do resultado terminou e o menu deve ser restaurado
+Desenvolvedor: felipeSperb
+'''
+
+import time
+
+
+# Estados
+AGUARDANDO = 'aguardando'
+CONTANDO = 'contando'
+EXIBINDO = 'exibindo'
+
+# Eventos
+POSE_INICIADA = 'pose_iniciada'
+CONTAGEM = 'contagem'
+POSE_PERDIDA = 'pose_perdida'
+CAPTURADO = 'capturado'
+DECIDIDO = 'decidido'
+RESTAURADO = 'restaurado'
+
+
+class temposInspecao():
+
+    def __init__(self, passo=1.0, contagem=3, intervalo=5.0, exibicao=30.0):
+
+        '''
+        passo:  Duração (em segundos) de cada número da contagem.
+                Padrão para 1.0.
+
+        contagem:   Quantidade de números da contagem. A captura ocorre após contagem * passo segundos de pose.
+                    Padrão para 3.
+
+        intervalo:  Tempo mínimo (em segundos) entre o início de duas contagens. Define o tempo de ciclo da portaria.
+                    Padrão para 5.0.
+
+        exibicao:   Tempo (em segundos) que o resultado permanece na tela antes da restauração do menu.
+                    Padrão para 30.0.
+        '''
+        self.passo = passo
+        self.contagem = contagem
+        self.intervalo = intervalo
+        self.exibicao = exibicao
+
+    # Tempo mínimo entre duas capturas consecutivas
+    @property
+    def ciclo(self):
+        return max(self.intervalo, self.passo * self.contagem)
+
+
+class evento():
+
+    def __init__(self, tipo, tempo, valor=None):
+        self.tipo = tipo
+        self.tempo = tempo
+        self.valor = valor
+
+    def __repr__(self):
+        if self.valor is None:
+            return 'evento({!r}, {:.3f})'.format(self.tipo, self.tempo)
+        return 'evento({!r}, {:.3f}, {!r})'.format(self.tipo, self.tempo, self.valor)
+
+
+class relogioManual():
+
+    def __init__(self, inicio=0.0):
+
+        '''
+        Relógio controlado pelo programa, usado em simulações e testes.
+        '''
+        self.agora = inicio
+
+    def __call__(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+        return self.agora
+
+
+class maquinaInspecao():
+
+    def __init__(self, tempos=None, relogio=time.monotonic, aoEvento=None):
+
+        '''
+        tempos: Configuração dos tempos (temposInspecao). Padrão para os tempos originais (1, 2, 3 e 5 s; 30 s).
+
+        relogio:    Função que retorna o tempo atual em segundos. Padrão para time.monotonic.
+
+        aoEvento:   Função chamada com cada evento gerado.
+        '''
+        self.tempos = tempos if tempos is not None else temposInspecao()
+        self.relogio = relogio
+        self.aoEvento = aoEvento
+
+        self.estado = AGUARDANDO
+        # Número atual da contagem (0 quando não há contagem)
+        self.contador = 0
+        # Início da última contagem
+        self.inicioContagem = None
+        # Momento da última captura
+        self.tempoCaptura = None
+        # Momento da última decisão
+        self.tempoDecisao = None
+
+
+    def _emitir(self, eventos, tipo, tempo, valor=None):
+        ev = evento(tipo, tempo, valor)
+        eventos.append(ev)
+        if self.aoEvento is not None:
+            self.aoEvento(ev)
+
+
+    '''
+    Atualiza a máquina com a observação mais recente da câmera.
+        pessoa: Se há pessoa na imagem.
+        emPostura: Se a pessoa está na pose de inspeção.
+        tempo: Momento da observação. Padrão para o relógio da máquina.
+    Retorna a lista de eventos gerados. Se houver o evento "capturado", o frame observado deve ser inspecionado.
+    '''
+    def atualizar(self, pessoa, emPostura, tempo=None):
+        if tempo is None:
+            tempo = self.relogio()
+        eventos = []
+        tp = self.tempos
+
+        if pessoa:
+            if emPostura:
+                if self.estado == CONTANDO:
+                    decorrido = tempo - self.inicioContagem
+                    if decorrido >= tp.passo * tp.contagem:
+                        # Pose mantida até o fim da contagem
+                        self.contador = 0
+                        self.estado = EXIBINDO
+                        self.tempoCaptura = tempo
+                        self._emitir(eventos, CAPTURADO, tempo)
+                    else:
+                        novo = min(tp.contagem, int(decorrido // tp.passo) + 1)
+                        if novo != self.contador:
+                            self.contador = novo
+                            self._emitir(eventos, CONTAGEM, tempo, novo)
+                elif self.inicioContagem is None or tempo - self.inicioContagem >= tp.intervalo:
+                    # Início de uma nova contagem
+                    self.estado = CONTANDO
+                    self.inicioContagem = tempo
+                    self.contador = 1
+                    self._emitir(eventos, POSE_INICIADA, tempo)
+                    self._emitir(eventos, CONTAGEM, tempo, 1)
+            elif self.estado == CONTANDO:
+                self._cancelar(eventos, tempo)
+
+        # O resultado é descartado após o tempo de exibição
+        if self.tempoCaptura is not None and tempo - self.tempoCaptura >= tp.exibicao:
+            self.restaurar(tempo, eventos)
+
+        return eventos
+
+
+    # Cancela a contagem em andamento
+    def _cancelar(self, eventos, tempo):
+        self.contador = 0
+        self.estado = EXIBINDO if self.tempoCaptura is not None else AGUARDANDO
+        self._emitir(eventos, POSE_PERDIDA, tempo)
+
+
+    # Informa a decisão da inspeção do frame capturado
+    def decidido(self, resultado, tempo=None):
+        if tempo is None:
+            tempo = self.relogio()
+        eventos = []
+        self.tempoDecisao = tempo
+        self._emitir(eventos, DECIDIDO, tempo, resultado)
+        return eventos
+
+
+    # Restaura o estado inicial de exibição (menu padrão). A contagem em andamento não é afetada
+    def restaurar(self, tempo=None, eventos=None):
+        if tempo is None:
+            tempo = self.relogio()
+        if eventos is None:
+            eventos = []
+        self.tempoCaptura = None
+        self.tempoDecisao = None
+        if self.estado == EXIBINDO:
+            self.estado = AGUARDANDO
+        self._emitir(eventos, RESTAURADO, tempo)
+        return eventos
+
+
+'''
+Simulação de uma portaria sem câmera:
+    roteiro: Lista de trechos (duracao, pessoa, emPostura), em segundos.
+    fps: Quantidade de observações por segundo.
+    decidir: Função opcional chamada a cada captura, cujo retorno é informado como decisão.
+Retorna a lista de todos os eventos gerados.
+'''
+def simular(roteiro, tempos=None, fps=10, decidir=None):
+    relogio = relogioManual()
+    maquina = maquinaInspecao(tempos, relogio)
+    eventos = []
+    # O tempo é calculado pelo número da observação para não acumular erro de arredondamento
+    n = 0
+    fim = 0
+    for duracao, pessoa, emPostura in roteiro:
+        fim += int(round(duracao * fps))
+        while n < fim:
+            relogio.agora = n / fps
+            novos = maquina.atualizar(pessoa, emPostura)
+            eventos.extend(novos)
+            if decidir is not None and any(ev.tipo == CAPTURADO for ev in novos):
+                eventos.extend(maquina.decidido(decidir(relogio())))
+            n += 1
+    return eventos
@@ -0,0 +1,44 @@
+'''
+Nome:   Gravação de evidências
+Sobre:  Salva o frame inspecionado junto de um arquivo .txt com as coordenadas das detecções no formato da YOLO.
+        Inspeções com detecções são salvas na pasta de positivos e as demais na pasta de negativos.
+        Esses arquivos podem ser utilizados para treinar o modelo no futuro.
+Desenvolvedor: felipeSperb
+'''
+
+import os
+import time
+
+import cv2
+
+
+# Endereço salvamento Imagens, relativo à pasta de arquivos
+pastaPositivas = os.path.join("Imagens_Registradas", "Positivas")
+pastaNegativas = os.path.join("Imagens_Registradas", "Negativas")
+
+
+'''
+Nome dos arquivos de evidência: ano-mês-dia_hora-minuto-segundo_Positivo (ou _Negativo)
+'''
+def nomeEvidencia(relogio, positivo):
+    return (str(relogio.tm_year) + "-" + str(relogio.tm_mon) + "-" + str(relogio.tm_mday) + "_" +
+            str(relogio.tm_hour) + "-" + str(relogio.tm_min) + "-" + str(relogio.tm_sec) +
+            ("_Positivo" if positivo else "_Negativo"))
+
+
+'''
+Salva o frame (antes de receber as marcações) e o arquivo de coordenadas.
+    Retorna o caminho da imagem salva, sem extensão.
+'''
+def salvarEvidencias(pasta, frame, resultado, relogio=None):
+    if relogio is None:
+        relogio = time.localtime()
+    positivo = len(resultado.deteccoes) != 0
+    base = os.path.join(pasta, pastaPositivas if positivo else pastaNegativas, nomeEvidencia(relogio, positivo))
+
+    cv2.imwrite(base + ".png", frame)
+    # Cria arquivo de marcação
+    with open(base + '.txt', 'a') as arquivo:
+        for d in resultado.deteccoes:
+            arquivo.write(str(d.classId) + " " + " ".join(str(v) for v in d.posicao) + "\n")
+    return base
@@ -0,0 +1,399 @@
+'''
+Nome:   Inspeção de EPIs
+Sobre:  Reúne a estimativa de postura, a detecção de objetos, a comparação com as regiões de interesse
+        e a tomada de decisão em uma única chamada: inspect(frame) -> InspectionResult.
+        Não depende de Tkinter nem de câmera e os modelos são carregados somente na primeira inspeção,
+        permitindo usar a inspeção em outros programas, em testes e em ferramentas de linha de comando.
+        As regras de decisão são as mesmas do programa principal:
+            - Um EPI obrigatório é positivo quando detectado;
+            - Luvas e botas só são positivas quando os membros direito e esquerdo forem detectados;
+            - Qualquer detecção fora da região de interesse gera um alerta (EPI mal posicionado).
+Desenvolvedor: felipeSperb
+'''
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from . import metricas as mt
+from .cache import compactarSaida, hashFrame
+from .detector import detectorEPI, lerClasses, LUVA, BOTA
+from .politica import politica as politicaEPI
+from .postura import poseDetector, compararROI
+
+
+# Decisões possíveis
+LIBERADO = 'liberado'
+MAL_POSICIONADO = 'mal_posicionado'
+NEGADO = 'negado'
+
+# Status de cada classe
+POSITIVO = 'positivo'
+ALERTA = 'alerta'
+NEGATIVO = 'negativo'
+IGNORADO = 'ignorado'
+
+# Por padrão todos os 7 EPIs são obrigatórios
+requeridosPadrao = (1, 1, 1, 1, 1, 1, 1)
+
+
+class InspectionResult():
+
+    def __init__(self, decisao, deteccoes, status, confiancas, alertas, lmList, latencias=None):
+
+        '''
+        decisao:    LIBERADO, MAL_POSICIONADO ou NEGADO.
+
+        deteccoes:  Lista de detecções (detector.deteccao) com o resultado da comparação em "comparacao".
+
+        status: Lista com o status de cada uma das 7 classes: POSITIVO, ALERTA (detectado fora da região
+                de interesse), NEGATIVO ou IGNORADO (não obrigatória).
+
+        confiancas: Lista com a confiança exibida para cada classe positiva, ou None.
+
+        alertas:    Quantidade de detecções fora da região de interesse.
+
+        lmList: Landmarks da pessoa usados na comparação.
+
+        latencias:  Tempo de cada etapa desta inspeção em milissegundos (postura, deteccao, decisao).
+        '''
+        self.decisao = decisao
+        self.deteccoes = deteccoes
+        self.status = status
+        self.confiancas = confiancas
+        self.alertas = alertas
+        self.lmList = lmList
+        self.latencias = latencias if latencias is not None else {}
+
+    @property
+    def liberado(self):
+        return self.decisao == LIBERADO
+
+    # Representação em dicionário, usada em relatórios e registros
+    def paraDict(self, classNames=None):
+        nomes = classNames or [str(i) for i in range(len(self.status))]
+        return {
+            'decisao': self.decisao,
+            'alertas': self.alertas,
+            'status': {nomes[i]: s for i, s in enumerate(self.status)},
+            'confiancas': {nomes[i]: c for i, c in enumerate(self.confiancas) if c is not None},
+            'deteccoes': [{'classe': nomes[d.classId], 'confianca': d.confianca, 'caixa': list(d.caixa),
+                           'comparacao': d.comparacao} for d in self.deteccoes],
+            'latencias': self.latencias
+        }
+
+    def __repr__(self):
+        return 'InspectionResult(decisao={!r}, alertas={}, status={})'.format(self.decisao, self.alertas, self.status)
+
+
+'''
+Tomada de decisão:
+    Recebe as detecções já comparadas com a região de interesse e a lista de EPIs obrigatórios
+    (1 = obrigatório, 0 = ignorado) e retorna um InspectionResult.
+    ambosMembros: Se false, basta uma luva (ou bota) em um dos membros.
+'''
+def decidir(deteccoes, requeridos=requeridosPadrao, lmList=None, ambosMembros=True):
+    pos = [0] * len(requeridos)
+    comparacoes = [0] * len(requeridos)
+    confiancas = [None] * len(requeridos)
+    alert = 0
+
+    # Contagem de luvas e botas em cada membro
+    direito = [0] * len(requeridos)
+    esquerdo = [0] * len(requeridos)
+
+    for d in deteccoes:
+        c = d.classId
+        if d.comparacao == 2:
+            direito[c] += 1
+        elif d.comparacao == 3:
+            esquerdo[c] += 1
+        elif d.comparacao != 1:
+            alert += 1
+
+        if not requeridos[c]:
+            continue
+        if c in (LUVA, BOTA):
+            # comparacao == 1 só ocorre quando a verificação de região de interesse da classe está desligada
+            if d.comparacao == 1 or (direito[c] != 0 and esquerdo[c] != 0) or \
+                    (not ambosMembros and (direito[c] != 0 or esquerdo[c] != 0)):
+                pos[c] = 1
+                comparacoes[c] = d.comparacao
+                confiancas[c] = d.confianca
+        else:
+            pos[c] = 1
+            comparacoes[c] = d.comparacao
+            confiancas[c] = d.confianca
+
+    status = []
+    for c in range(len(requeridos)):
+        if not requeridos[c]:
+            status.append(IGNORADO)
+        elif pos[c] and comparacoes[c] == 0:
+            status.append(ALERTA)
+        elif pos[c]:
+            status.append(POSITIVO)
+        else:
+            status.append(NEGATIVO)
+
+    # TOMADA DE DECISÃO
+    if sum(requeridos) == sum(pos) and alert == 0:
+        decisao = LIBERADO
+    elif alert > 0:
+        decisao = MAL_POSICIONADO
+    else:
+        decisao = NEGADO
+
+    return InspectionResult(decisao, deteccoes, status, confiancas, alert, lmList)
+
+
+'''
+Desenha as caixas delimitadoras e os rótulos das detecções no frame.
+    Verde: EPI coincide com a região de interesse. Amarelo: EPI fora da região de interesse.
+    ordemRGB: true se o frame estiver em RGB (ver preprocessamento).
+'''
+def desenharResultado(frame, resultado, classNames, ordemRGB=False):
+    for d in resultado.deteccoes:
+        x, y, w, h = d.caixa
+        corBox = (0, 255, 0) if d.comparacao in (1, 2, 3) else (0, 255, 255)
+        if ordemRGB:
+            corBox = corBox[::-1]
+        # Desenhar caixa delimitadora na imagem
+        cv2.rectangle(frame, (x, y), (x + w, y + h), corBox, 1)
+        # Escrever rótulo na caixa
+        cv2.putText(frame, f'{classNames[d.classId].upper()} {int(d.confianca * 100)}%', (x, y - 10),
+                    cv2.FONT_HERSHEY_COMPLEX, 0.6, corBox, 1)
+    return frame
+
+
+class Inspector():
+
+    def __init__(self, detector=None, pose=None, requeridos=requeridosPadrao, metricas=None, politica=None,
+                 cache=None, paralelo=False):
+
+        '''
+        detector:   Detector de EPIs (detector.detectorEPI). Padrão para a YOLOv4 do repositório.
+
+        pose:   Estimador de postura (postura.poseDetector). Padrão para complexidade 1.
+
+        requeridos: Lista com os 7 EPIs obrigatórios (1 = obrigatório, 0 = ignorado).
+                    Padrão para todos obrigatórios.
+
+        metricas:   Coletor de métricas (ver metricas.coletorMetricas). Padrão para desabilitado.
+
+        politica:   Política de EPIs (ver politica.politica). Se informada, substitui "requeridos".
+
+        cache:  Cache de inferência (ver cache.cacheInferencia). Se informado, frames já vistos não executam
+                a rede nem a postura, somente a decodificação e a decisão.
+
+        paralelo:   Se definido como true, quando os landmarks não são informados a postura e a rede são executadas
+                    ao mesmo tempo (a rede em uma thread auxiliar). O OpenCV e o MediaPipe liberam o GIL durante a
+                    inferência, então a inspeção leva o tempo da etapa mais lenta, não a soma das duas.
+                    Padrão para false.
+
+        Nenhum modelo é carregado na criação do objeto.
+        '''
+        self.metricas = metricas if metricas is not None else mt.coletorMetricas(habilitado=False)
+        self.detector = detector if detector is not None else detectorEPI(metricas=self.metricas)
+        self.pose = pose if pose is not None else poseDetector()
+        self.cache = cache
+        self.paralelo = paralelo
+        self._executor = None
+        self.classNames = lerClasses()
+        self.aplicarPolitica(politica if politica is not None else
+                             politicaEPI(requeridos, confianca=[self.detector.confThreshold] * len(self.classNames),
+                                         nms=self.detector.nmsThreshold, classNames=self.classNames))
+
+
+    '''
+    Aplica uma política de EPIs: obrigatórios, limiares do detector e regras de região de interesse.
+        A rede não é recarregada. Pode ser chamada com o programa em execução.
+    '''
+    def aplicarPolitica(self, politica):
+        self.detector.definirLimiares(politica.confianca, politica.nms, politica.nmsPorClasse)
+        self.politica = politica
+        self.requeridos = list(politica.requeridos)
+
+
+    '''
+    Pré-carregamento: carrega a YOLOv4 e o MediaPipe (em paralelo, por padrão) e executa uma inferência de
+    aquecimento em cada um, para que a primeira inspeção não pague a alocação das camadas.
+        Retorna o tempo gasto em segundos.
+    '''
+    def aquecer(self, paralelo=True):
+        inicio = time.perf_counter()
+        with self.metricas.cronometrar('aquecer'):
+            if paralelo:
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    futuros = [executor.submit(self.detector.aquecer), executor.submit(self.pose.aquecer)]
+                    for futuro in futuros:
+                        futuro.result()
+            else:
+                self.detector.aquecer()
+                self.pose.aquecer()
+        return time.perf_counter() - inicio
+
+
+    # Thread auxiliar da inspeção paralela, criada na primeira inspeção
+    def _executorParalelo(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+
+    # Estimativa de postura. Retorna a lista de landmarks (vazia se não houver pessoa)
+    def estimarPostura(self, frame, imgRGB=None):
+        with self.metricas.cronometrar('findPose'):
+            self.pose.findPose(frame, False, imgRGB)
+        with self.metricas.cronometrar('findPosition'):
+            return self.pose.findPosition(frame, False)
+
+
+    # Compara cada detecção com a região de interesse da pessoa
+    def compararDeteccoes(self, deteccoes, lmList):
+        roi = self.politica.roi
+        with self.metricas.cronometrar('comparar'):
+            for d in deteccoes:
+                # Classe sem verificação de região de interesse
+                if not roi[d.classId]:
+                    d.comparacao = 1
+                    continue
+                x, y, w, h = d.caixa
+                d.comparacao = compararROI(lmList, x, y, w, h, d.classId) or 0
+        return deteccoes
+
+
+    # Compara as detecções com a pessoa e toma a decisão
+    def concluir(self, deteccoes, lmList, requeridos=None):
+        if requeridos is None:
+            requeridos = self.requeridos
+
+        if lmList:
+            self.compararDeteccoes(deteccoes, lmList)
+            resultado = decidir(deteccoes, requeridos, lmList, self.politica.ambosMembros)
+        else:
+            resultado = InspectionResult(NEGADO, deteccoes, [NEGATIVO if r else IGNORADO for r in requeridos],
+                                         [None] * len(requeridos), 0, lmList)
+
+        self.metricas.incrementar('inspecoes')
+        self.metricas.incrementar('decisoes', decisao=resultado.decisao)
+        return resultado
+
+
+    '''
+    Realiza a inspeção completa de um frame BGR.
+        lmList: Landmarks já estimados para este frame. Se não informado, a postura é estimada aqui.
+        requeridos: EPIs obrigatórios nesta inspeção. Se não informado, usa self.requeridos.
+        blob: Entrada da rede já gerada para este frame (ver preprocessamento.preparadorQuadros).
+        imgRGB: O frame já convertido para RGB, usado na estimativa de postura.
+        Sem pessoa na imagem não há como comparar as regiões de interesse e o acesso é negado.
+    '''
+    def inspect(self, frame, lmList=None, requeridos=None, blob=None, imgRGB=None):
+        if self.cache is not None:
+            return self._inspecionarCache(frame, lmList, requeridos, blob)
+        if self.paralelo and lmList is None:
+            return self._inspecionarParalelo(frame, requeridos, blob, imgRGB)
+        inicio = time.perf_counter()
+        if lmList is None:
+            lmList = self.estimarPostura(frame, imgRGB)
+        postura = time.perf_counter()
+        deteccoes = self.detector.detectar(frame, blob)
+        deteccao = time.perf_counter()
+        resultado = self.concluir(deteccoes, lmList, requeridos)
+        resultado.latencias = _latencias(inicio, postura, deteccao)
+        return resultado
+
+
+    '''
+    Inspeção com a rede executada em uma thread auxiliar enquanto a postura é estimada nesta thread.
+        A comparação com as regiões de interesse começa quando as duas terminam.
+        Em resultado.latencias, "postura" e "deteccao" se sobrepõem (ambas contadas a partir do início).
+    '''
+    def _inspecionarParalelo(self, frame, requeridos, blob, imgRGB):
+        inicio = time.perf_counter()
+        futuro = self._executorParalelo().submit(self._detectar, frame, blob)
+        lmList = self.estimarPostura(frame, imgRGB)
+        postura = time.perf_counter()
+        deteccoes, deteccao = futuro.result()
+        espera = time.perf_counter()
+        resultado = self.concluir(deteccoes, lmList, requeridos)
+        resultado.latencias = {'postura': (postura - inicio) * 1000,
+                               'deteccao': (deteccao - inicio) * 1000,
+                               'decisao': (time.perf_counter() - espera) * 1000}
+        return resultado
+
+
+    # Detecção executada na thread auxiliar. Retorna também o instante em que terminou
+    def _detectar(self, frame, blob):
+        return self.detector.detectar(frame, blob), time.perf_counter()
+
+
+    # Inspeção usando o cache: a rede e a postura só são executadas para frames que não estão no cache
+    def _inspecionarCache(self, frame, lmList, requeridos, blob=None):
+        inicio = time.perf_counter()
+        with self.metricas.cronometrar('cache'):
+            chave = hashFrame(frame)
+            dados = self.cache.ler(chave)
+        if dados is None:
+            if lmList is None:
+                lmList = self.estimarPostura(frame)
+            postura = time.perf_counter()
+            saida = compactarSaida(self.detector.inferir(frame, blob))
+            self.cache.gravar(chave, saida, frame.shape, lmList)
+        else:
+            saida, _, lmCache = dados
+            if lmList is None:
+                lmList = lmCache if lmCache is not None else self.estimarPostura(frame)
+            postura = time.perf_counter()
+        self.metricas.incrementar('cache', resultado='falta' if dados is None else 'acerto')
+        deteccoes = self.detector.decodificar([saida], frame.shape)
+        deteccao = time.perf_counter()
+        resultado = self.concluir(deteccoes, lmList, requeridos)
+        resultado.latencias = _latencias(inicio, postura, deteccao)
+        return resultado
+
+
+    '''
+    Inspeção em lote: a postura é estimada frame a frame e a rede é executada uma única vez para todos.
+        requeridos: Lista com os EPIs obrigatórios de cada frame, ou None para usar self.requeridos.
+        lmLists: Lista com os landmarks já estimados de cada frame (None para estimar aqui).
+    '''
+    def inspecionarLote(self, frames, requeridos=None, lmLists=None):
+        if requeridos is None:
+            requeridos = [None] * len(frames)
+        if lmLists is None:
+            lmLists = [None] * len(frames)
+        inicio = time.perf_counter()
+        lmLists = [self.estimarPostura(frame) if lm is None else lm for frame, lm in zip(frames, lmLists)]
+        postura = time.perf_counter()
+        deteccoes = self.detector.detectarLote(frames)
+        deteccao = time.perf_counter()
+        resultados = [self.concluir(d, lm, r) for d, lm, r in zip(deteccoes, lmLists, requeridos)]
+        # Tempos do lote inteiro, divididos igualmente entre os frames
+        latencias = _latencias(inicio, postura, deteccao, len(frames))
+        for resultado in resultados:
+            resultado.latencias = dict(latencias)
+        return resultados
+
+
+# Tempos das etapas em milissegundos, a partir dos instantes medidos com time.perf_counter
+def _latencias(inicio, postura, deteccao, frames=1):
+    fim = time.perf_counter()
+    return {'postura': (postura - inicio) * 1000 / frames,
+            'deteccao': (deteccao - postura) * 1000 / frames,
+            'decisao': (fim - deteccao) * 1000 / frames}
+
+
+# Inspetor padrão, criado na primeira chamada de inspect
+_inspetorPadrao = None
+
+
+'''
+Inspeciona um frame BGR com o inspetor padrão e retorna um InspectionResult.
+'''
+def inspect(frame, lmList=None, requeridos=None):
+    global _inspetorPadrao
+    if _inspetorPadrao is None:
+        _inspetorPadrao = Inspector()
+    return _inspetorPadrao.inspect(frame, lmList, requeridos)
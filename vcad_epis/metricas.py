@@ -0,0 +1,221 @@
+'''
+Nome:   Classe de instrumentação e métricas
+Sobre:  Mede o tempo gasto em cada etapa do programa (captura, estimativa de postura, BLOB, rede, decodificação,
+        supressão não máxima, comparação, gravação de evidências e atualização da janela).
+        Mantém histogramas com os percentis p50, p95 e p99 de cada etapa e contadores de inspeções e decisões.
+        Opcionalmente expõe as métricas em um endpoint HTTP local /metrics no formato texto do Prometheus.
+        Quando desabilitada, as chamadas retornam imediatamente e o custo é desprezível.
+Desenvolvedor: felipeSperb
+'''
+
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+# Cronômetro nulo, usado quando a instrumentação está desabilitada
+class _CronometroNulo():
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_cronometroNulo = _CronometroNulo()
+
+
+# Cronômetro de uma etapa. Registra o tempo decorrido ao sair do bloco "with"
+class _Cronometro():
+
+    def __init__(self, metricas, etapa):
+        self.metricas = metricas
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.metricas.registrar(self.etapa, time.perf_counter() - self.inicio)
+        return False
+
+
+class histograma():
+
+    def __init__(self, janela=1024):
+
+        '''
+        janela: Quantidade de amostras mais recentes usadas no cálculo dos percentis.
+                A memória utilizada é constante, independente do tempo de execução.
+                Padrão para 1024.
+        '''
+        self.amostras = deque(maxlen=janela)
+        self.contagem = 0
+        self.soma = 0.0
+
+    # Adiciona uma amostra (em segundos)
+    def adicionar(self, valor):
+        self.amostras.append(valor)
+        self.contagem += 1
+        self.soma += valor
+
+    # Retorna o percentil p (0 a 100) das amostras da janela
+    def percentil(self, p):
+        if not self.amostras:
+            return 0.0
+        ordenadas = sorted(self.amostras)
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+
+class coletorMetricas():
+
+    def __init__(self, habilitado=True, janela=1024, prefixo='vcad_epis'):
+
+        '''
+        habilitado: Se definido como false, nenhuma medição é realizada.
+                    Padrão para true.
+
+        janela: Quantidade de amostras mantidas por etapa para o cálculo dos percentis.
+                Padrão para 1024.
+
+        prefixo:    Prefixo dos nomes das métricas exportadas.
+                    Padrão para 'vcad_epis'.
+        '''
+        self.habilitado = habilitado
+        self.janela = janela
+        self.prefixo = prefixo
+        self.histogramas = {}
+        self.contadores = {}
+        self.servidor = None
+        self._lock = threading.Lock()
+
+
+    # Retorna um cronômetro para ser usado em um bloco "with"
+    def cronometrar(self, etapa):
+        if not self.habilitado:
+            return _cronometroNulo
+        return _Cronometro(self, etapa)
+
+
+    # Registra a duração (em segundos) de uma etapa
+    def registrar(self, etapa, segundos):
+        if not self.habilitado:
+            return
+        with self._lock:
+            hist = self.histogramas.get(etapa)
+            if hist is None:
+                hist = self.histogramas[etapa] = histograma(self.janela)
+            hist.adicionar(segundos)
+
+
+    # Incrementa um contador. Rótulos opcionais, ex: incrementar('decisoes', decisao='liberado')
+    def incrementar(self, nome, valor=1, **rotulos):
+        if not self.habilitado:
+            return
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+
+    # Retorna um dicionário com contagem, média e percentis de cada etapa e os valores dos contadores
+    def resumo(self):
+        with self._lock:
+            etapas = {}
+            for etapa, hist in self.histogramas.items():
+                etapas[etapa] = {
+                    'contagem': hist.contagem,
+                    'media': hist.soma / hist.contagem if hist.contagem else 0.0,
+                    'p50': hist.percentil(50),
+                    'p95': hist.percentil(95),
+                    'p99': hist.percentil(99)
+                }
+            contadores = {}
+            for (nome, rotulos), valor in self.contadores.items():
+                chave = nome
+                if rotulos:
+                    chave += '{' + ','.join(k + '=' + str(v) for k, v in rotulos) + '}'
+                contadores[chave] = valor
+        return {'etapas': etapas, 'contadores': contadores}
+
+
+    # Exporta as métricas no formato texto do Prometheus
+    def formatoPrometheus(self):
+        linhas = []
+        nomeEtapas = self.prefixo + '_etapa_segundos'
+        with self._lock:
+            if self.histogramas:
+                linhas.append('# HELP ' + nomeEtapas + ' Duracao de cada etapa do processamento.')
+                linhas.append('# TYPE ' + nomeEtapas + ' summary')
+            for etapa, hist in sorted(self.histogramas.items()):
+                for q in (50, 95, 99):
+                    linhas.append(f'{nomeEtapas}{{etapa="{etapa}",quantile="{q / 100}"}} {hist.percentil(q):.6f}')
+                linhas.append(f'{nomeEtapas}_sum{{etapa="{etapa}"}} {hist.soma:.6f}')
+                linhas.append(f'{nomeEtapas}_count{{etapa="{etapa}"}} {hist.contagem}')
+
+            tipos = set()
+            for (nome, rotulos), valor in sorted(self.contadores.items()):
+                nomeCompleto = self.prefixo + '_' + nome + '_total'
+                if nomeCompleto not in tipos:
+                    linhas.append('# TYPE ' + nomeCompleto + ' counter')
+                    tipos.add(nomeCompleto)
+                txtRotulos = ''
+                if rotulos:
+                    txtRotulos = '{' + ','.join(f'{k}="{v}"' for k, v in rotulos) + '}'
+                linhas.append(f'{nomeCompleto}{txtRotulos} {valor}')
+        return '\n'.join(linhas) + '\n'
+
+
+    # Inicia um servidor HTTP local em segundo plano que responde em /metrics
+    def iniciarServidor(self, porta=9100, host='127.0.0.1'):
+        if self.servidor is not None:
+            return self.servidor
+
+        metricas = self
+
+        class _Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                corpo = metricas.formatoPrometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            # Não imprime cada requisição no terminal
+            def log_message(self, *args):
+                pass
+
+        self.servidor = HTTPServer((host, porta), _Handler)
+        thread = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        thread.start()
+        return self.servidor
+
+
+    # Encerra o servidor HTTP
+    def pararServidor(self):
+        if self.servidor is not None:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+            self.servidor = None
+
+
+# Teste de classe
+def main():
+    metricas = coletorMetricas()
+    for i in range(100):
+        with metricas.cronometrar('teste'):
+            time.sleep(0.001)
+        metricas.incrementar('inspecoes')
+    print(metricas.formatoPrometheus())
+
+
+if __name__ == "__main__":
+    main()
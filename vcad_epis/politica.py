@@ -0,0 +1,223 @@
+'''
+Nome:   Política de EPIs
+Sobre:  Lê de um arquivo JSON ou YAML a política de uma portaria (ou zona): EPIs obrigatórios,
+        confiança mínima de cada classe, limite de IOU da supressão não máxima e regras de região de interesse.
+        O arquivo é observado e, quando alterado, a nova política é aplicada sem reiniciar o programa e sem
+        recarregar a rede. Um arquivo inválido é ignorado e a política anterior continua valendo.
+Exemplo (JSON):
+        {
+            "nome": "portaria_1",
+            "requeridos": ["mascara", "capacete", "oculos", "abafador", "colete", "luva", "bota"],
+            "confianca": {"padrao": 0.9, "luva": 0.8},
+            "nms": 0.3,
+            "nmsPorClasse": true,
+            "roi": {"padrao": true, "colete": false},
+            "ambosMembros": true
+        }
+        requeridos: classes obrigatórias na tomada de decisão.
+        confianca: confiança mínima por classe. "padrao" vale para as classes não listadas.
+        nms: limite de IOU da supressão não máxima.
+        nmsPorClasse: se a supressão não máxima é feita separadamente para cada classe.
+        roi: se a posição da classe deve coincidir com a região de interesse do corpo. "padrao" como acima.
+        ambosMembros: se luvas e botas precisam ser detectadas nos membros direito e esquerdo.
+        Em YAML as chaves são as mesmas (requer PyYAML).
+Desenvolvedor: felipeSperb
+'''
+
+import json
+import os
+import threading
+
+from .detector import lerClasses, confThreshold, nmsThreshold
+
+
+# Erro lançado quando o arquivo de política é inválido
+class politicaInvalida(ValueError):
+    pass
+
+
+class politica():
+
+    def __init__(self, requeridos=None, confianca=None, nms=nmsThreshold, roi=None, ambosMembros=True,
+                 nome='padrao', classNames=None, nmsPorClasse=True):
+
+        '''
+        requeridos: Lista com os 7 EPIs obrigatórios (1 = obrigatório, 0 = ignorado). Padrão para todos.
+
+        confianca:  Lista com a confiança mínima de cada classe. Padrão para 0.9 em todas.
+
+        nms:    Limite de IOU da supressão não máxima. Padrão para 0.3.
+
+        roi:    Lista indicando se cada classe deve coincidir com a região de interesse. Padrão para todas.
+
+        ambosMembros:   Se luvas e botas precisam ser detectadas nos dois membros. Padrão para true.
+
+        nmsPorClasse:   Se a supressão não máxima é feita separadamente para cada classe. Padrão para true.
+
+        nome:   Identificação da política (portaria ou zona).
+        '''
+        self.classNames = classNames if classNames is not None else lerClasses()
+        n = len(self.classNames)
+        self.nome = nome
+        self.requeridos = list(requeridos) if requeridos is not None else [1] * n
+        self.confianca = list(confianca) if confianca is not None else [confThreshold] * n
+        self.nms = nms
+        self.roi = list(roi) if roi is not None else [True] * n
+        self.ambosMembros = ambosMembros
+        self.nmsPorClasse = nmsPorClasse
+
+
+    '''
+    Cria uma política a partir de um dicionário (conteúdo do arquivo).
+        Lança politicaInvalida se alguma classe ou valor não for reconhecido.
+    '''
+    @classmethod
+    def deDict(cls, dados, classNames=None):
+        if classNames is None:
+            classNames = lerClasses()
+        if not isinstance(dados, dict):
+            raise politicaInvalida('a política deve ser um objeto com chaves')
+
+        def indice(nome):
+            if nome not in classNames:
+                raise politicaInvalida('classe desconhecida: {}'.format(nome))
+            return classNames.index(nome)
+
+        def porClasse(valores, padrao, tipo):
+            if not isinstance(valores, dict):
+                raise politicaInvalida('valores por classe devem ser um objeto com chaves')
+            lista = [tipo(valores.get('padrao', padrao))] * len(classNames)
+            for nome, valor in valores.items():
+                if nome != 'padrao':
+                    lista[indice(nome)] = tipo(valor)
+            return lista
+
+        try:
+            requeridos = None
+            if 'requeridos' in dados:
+                requeridos = [0] * len(classNames)
+                for nome in dados['requeridos']:
+                    requeridos[indice(nome)] = 1
+            confianca = porClasse(dados.get('confianca', {}), confThreshold, float)
+            roi = porClasse(dados.get('roi', {}), True, bool)
+            nms = float(dados.get('nms', nmsThreshold))
+        except (TypeError, ValueError) as erro:
+            if isinstance(erro, politicaInvalida):
+                raise
+            raise politicaInvalida(str(erro))
+
+        for valor in confianca + [nms]:
+            if not 0.0 <= valor <= 1.0:
+                raise politicaInvalida('limiares devem estar entre 0 e 1: {}'.format(valor))
+
+        return cls(requeridos, confianca, nms, roi, bool(dados.get('ambosMembros', True)),
+                   str(dados.get('nome', 'padrao')), classNames, bool(dados.get('nmsPorClasse', True)))
+
+
+    # Representação em dicionário, no mesmo formato do arquivo
+    def paraDict(self):
+        return {
+            'nome': self.nome,
+            'requeridos': [c for c, r in zip(self.classNames, self.requeridos) if r],
+            'confianca': dict(zip(self.classNames, self.confianca)),
+            'nms': self.nms,
+            'nmsPorClasse': self.nmsPorClasse,
+            'roi': dict(zip(self.classNames, self.roi)),
+            'ambosMembros': self.ambosMembros
+        }
+
+
+'''
+Lê um arquivo de política JSON (.json) ou YAML (.yaml, .yml).
+'''
+def lerPolitica(caminho, classNames=None):
+    with open(caminho, 'rt', encoding='utf-8') as f:
+        texto = f.read()
+    if caminho.lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise politicaInvalida('PyYAML não está instalado, use um arquivo .json')
+        try:
+            dados = yaml.safe_load(texto)
+        except yaml.YAMLError as erro:
+            raise politicaInvalida(str(erro))
+    else:
+        try:
+            dados = json.loads(texto)
+        except ValueError as erro:
+            raise politicaInvalida(str(erro))
+    return politica.deDict(dados, classNames)
+
+
+class observadorPolitica():
+
+    def __init__(self, caminho, aoRecarregar, intervalo=1.0, aoErro=None, classNames=None):
+
+        '''
+        Observa um arquivo de política e chama aoRecarregar(politica) sempre que ele for alterado.
+        A verificação é feita pela data de modificação do arquivo, a cada "intervalo" segundos,
+        em uma thread em segundo plano.
+
+        caminho:    Arquivo de política (.json, .yaml ou .yml).
+
+        aoRecarregar:   Função chamada com a nova política. Também é chamada na primeira leitura.
+
+        intervalo:  Tempo entre verificações, em segundos. Padrão para 1.0.
+
+        aoErro: Função chamada com a exceção quando o arquivo for inválido. Padrão para imprimir a mensagem.
+        '''
+        self.caminho = caminho
+        self.aoRecarregar = aoRecarregar
+        self.intervalo = intervalo
+        self.aoErro = aoErro if aoErro is not None else \
+            (lambda erro: print('Política {} ignorada: {}'.format(caminho, erro)))
+        self.classNames = classNames
+        self.politica = None
+        self._modificacao = None
+        self._parar = threading.Event()
+        self._thread = None
+
+
+    # Lê o arquivo se ele foi alterado desde a última leitura. Retorna true se a política mudou
+    def verificar(self):
+        try:
+            modificacao = os.stat(self.caminho).st_mtime_ns
+        except OSError as erro:
+            if self._modificacao is not None:
+                self._modificacao = None
+                self.aoErro(erro)
+            return False
+        if modificacao == self._modificacao:
+            return False
+        self._modificacao = modificacao
+        try:
+            nova = lerPolitica(self.caminho, self.classNames)
+        except (OSError, politicaInvalida) as erro:
+            self.aoErro(erro)
+            return False
+        self.politica = nova
+        self.aoRecarregar(nova)
+        return True
+
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.verificar()
+
+
+    # Faz a primeira leitura e inicia a observação em segundo plano
+    def iniciar(self):
+        self.verificar()
+        if self._thread is None:
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._executar, daemon=True)
+            self._thread.start()
+        return self
+
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,341 @@
+'''
+Nome:   Classe de estimativa de postura
+Sobre:  Realiza a estimativa de postura humana, retorna 32 pontos referentes a articulações do corpo humano.
+        Desenha na imagem os landmarks e linhas interligando os mesmos.
+        Calcula o ângulo formado por três landmarks.
+        Compara as coordenadas recebidas com zonas de interesse:
+            boca, nariz, topo da cabeça, olhos, ouvidos, tronco, mãos e pés
+        O MediaPipe só é importado e inicializado na primeira estimativa, importar este módulo não carrega o modelo.
+Desenvolvedor: felipeSperb
+'''
+
+import cv2
+import time
+import math
+import threading
+
+import numpy as np
+
+
+class poseDetector():
+
+    def __init__(self, mode=False, complexity=1, smooth=True, detectionCon=0.5, trackCon=0.5):
+
+        '''
+        mode:   Se definido como false, a solução trata as imagens de entrada como um fluxo de vídeo.
+                Ele tentará detectar a pessoa mais proeminente nas primeiras imagens e,
+                após uma detecção bem-sucedida, localizará ainda mais os marcos da pose.
+                Em imagens subsequentes, ele simplesmente rastreia esses pontos de referência
+                sem invocar outra detecção até que perca o rastreamento, reduzindo a computação e a latência.
+                Se definido como true, a detecção de pessoas executa cada imagem de entrada,
+                ideal para processar um lote de imagens estáticas, possivelmente não relacionadas.
+                Padrão para false.
+
+        complexety: Complexidade do modelo marco postura: 0, 1ou 2.
+                    A precisão do ponto de referência, bem como a latência de inferência, geralmente aumentam
+                    com a complexidade do modelo.
+                    Padrão para 1.
+
+        smooth: Se definido como true, os filtros de solução representam pontos de referência em diferentes imagens
+                de entrada para reduzir o jitter, mas são ignorados se static_image_mode também estiver definido como true.
+                Padrão para true.
+
+        detectionCon:   Valor de confiança mínimo ( [0.0, 1.0]) do modelo de detecção de pessoa para que
+                        a detecção seja considerada bem-sucedida.
+                        Padrão para 0.5.
+
+        trackCon:   Valor de confiança mínimo ( [0.0, 1.0]) do modelo de rastreamento de pontos de referência
+                    para os pontos de referência de pose a serem considerados rastreados com sucesso, caso contrário,
+                    a detecção de pessoa será chamada automaticamente na próxima imagem de entrada.
+                    Configurá-lo com um valor mais alto pode aumentar a robustez da solução, às custas de uma
+                    latência mais alta. Ignorado se static_image_mode for true, em que a detecção de pessoas
+                    simplesmente é executada em todas as imagens.
+                    Padrão para 0.5.
+        '''
+        self.mode = mode
+        self.complexity = complexity
+        self.smooth = smooth
+        self.detectionCon = detectionCon
+        self.trackCon = trackCon
+
+        # O modelo é carregado na primeira chamada de findPose
+        self.pose = None
+        self.results = None
+        self.lmList = []
+        self._trava = threading.Lock()
+
+
+    # Importa o MediaPipe e carrega o modelo de estimativa de postura. Pode ser chamada por outra thread
+    def carregar(self):
+        if self.pose is None:
+            with self._trava:
+                self._carregar()
+        return self
+
+
+    # Carrega o modelo se necessário. Deve ser chamada com a trava obtida
+    def _carregar(self):
+        if self.pose is None:
+            import mediapipe as mp
+            # Função de desenho
+            self.mpDraw = mp.solutions.drawing_utils
+            # Função de detecção
+            self.mpPose = mp.solutions.pose
+            # Argumentos nomeados: a ordem posicional mudou entre versões do MediaPipe
+            self.pose = self.mpPose.Pose(static_image_mode=self.mode,
+                                         model_complexity=self.complexity,
+                                         smooth_landmarks=self.smooth,
+                                         min_detection_confidence=self.detectionCon,
+                                         min_tracking_confidence=self.trackCon)
+        return self.pose
+
+
+    '''
+    Carrega o modelo e processa uma imagem vazia, inicializando o grafo do MediaPipe antes da primeira pose.
+        O carregamento e o processamento são feitos com a mesma trava: definirComplexidade (em outra thread)
+        não pode fechar o modelo entre os dois.
+    '''
+    def aquecer(self):
+        with self._trava:
+            self._carregar().process(np.zeros((256, 256, 3), dtype=np.uint8))
+        return self
+
+
+    # Altera a complexidade do modelo. O novo modelo é carregado na próxima estimativa
+    def definirComplexidade(self, complexity):
+        if complexity == self.complexity:
+            return self
+        with self._trava:
+            self.complexity = complexity
+            if self.pose is not None:
+                self.pose.close()
+                self.pose = None
+        return self
+
+
+    # Função de estimativa de postura. imgRGB: a mesma imagem já convertida para RGB, se disponível
+    def findPose(self, img, draw=True, imgRGB=None):
+        # Converte imagem para RGB
+        if imgRGB is None:
+            imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        # Realiza a estimativa de postura na imagem (o grafo do MediaPipe não pode ser usado por duas threads).
+        # O modelo é carregado com a mesma trava, para que definirComplexidade não o feche antes do process
+        with self._trava:
+            self.results = self._carregar().process(imgRGB)
+        # Desenha as linhas na imagem
+        if self.results.pose_landmarks:
+            if draw:
+                self.mpDraw.draw_landmarks(img, self.results.pose_landmarks, self.mpPose.POSE_CONNECTIONS)
+        return img
+
+
+    # Função que cria lista com as coordenadas dos pontos detectados
+    def findPosition(self, img, draw=True):
+        # Lista os pontos detectados
+        self.lmList = []
+        if self.results is not None and self.results.pose_landmarks:
+            for id, lm in enumerate(self.results.pose_landmarks.landmark):
+                # Dimenções da imagem
+                h, w, c = img.shape
+                # Coordenadas dos landmarks
+                cx, cy = int(lm.x * w), int(lm.y * h)
+                # Adiciona à lista a identificação e as coordenadas
+                self.lmList.append([id, cx, cy])
+                # Desenha os pontos na imagem
+                if draw:
+                    cv2.circle(img, (cx, cy), 5, (255, 0, 0), cv2.FILLED)
+        return self.lmList
+
+
+    # Função usada para definir postura de inspeção
+    def findAngle(self, img, p1, p2, p3, draw=False):
+
+        # define as coordenadas dos landmarks recebidos
+        x1, y1 = self.lmList[p1][1:]
+        x2, y2 = self.lmList[p2][1:]
+        x3, y3 = self.lmList[p3][1:]
+
+        # Calcula o angulo entre os três pontos de entrada
+        angle = angulo(self.lmList, p1, p2, p3)
+
+        # Se draw=True, desenha os pontos na imagem e o resultado do calculo
+        if draw:
+            cv2.line(img, (x1, y1), (x2, y2), (255, 255, 255), 3)
+            cv2.line(img, (x3, y3), (x2, y2), (255, 255, 255), 3)
+            cv2.circle(img, (x1, y1), 10, (0, 0, 255), cv2.FILLED)
+            cv2.circle(img, (x1, y1), 15, (0, 0, 255), 2)
+            cv2.circle(img, (x2, y2), 10, (0, 0, 255), cv2.FILLED)
+            cv2.circle(img, (x2, y2), 15, (0, 0, 255), 2)
+            cv2.circle(img, (x3, y3), 10, (0, 0, 255), cv2.FILLED)
+            cv2.circle(img, (x3, y3), 15, (0, 0, 255), 2)
+            cv2.putText(img, str(int(angle)), (x2 - 50, y2 +50), cv2.FONT_HERSHEY_COMPLEX, 2, (0, 0, 255), 2)
+        return angle
+
+
+    # Verifica se a pessoa está na postura de inspeção (braços abertos, cotovelos dobrados)
+    def posturaInspecao(self, img):
+        # Calcula ângulo dos pontos referentes ao ombro, ao cotovelo e ao pulso dos dois braços.
+        bracoDireito = self.findAngle(img, 12, 14, 16)
+        bracoEsquerdo = self.findAngle(img, 11, 13, 15)
+        return 20 < bracoEsquerdo < 160 and -160 < bracoDireito < -20
+
+
+    # Função que realiza a comparação com regiões de interesse
+    def comparar(self, img, x, y, w, h, classIds):
+        return compararROI(self.lmList, x, y, w, h, classIds)
+
+
+'''
+Ângulo (em graus) formado pelos landmarks p1, p2 e p3, com vértice em p2.
+'''
+def angulo(lmList, p1, p2, p3):
+    x1, y1 = lmList[p1][1:]
+    x2, y2 = lmList[p2][1:]
+    x3, y3 = lmList[p3][1:]
+    return math.degrees(math.atan2(y3 - y2, x3 - x2) - math.atan2(y1 - y2, x1 - x2))
+
+
+'''
+Ângulos dos braços direito e esquerdo (ombro, cotovelo e pulso), os mesmos usados na pose de inspeção.
+    Retorna None se não houver pessoa.
+'''
+def angulosBracos(lmList):
+    if not lmList:
+        return None
+    return angulo(lmList, 12, 14, 16), angulo(lmList, 11, 13, 15)
+
+
+'''
+Função que compara as coordenadas de uma caixa delimitadora com a região de interesse do corpo:
+    Recebe a lista de landmarks (findPosition), a caixa (x, y, w, h) e a classe do objeto.
+    Retorna 1 para sucesso, 2 para membro direito, 3 para membro esquerdo e 0 para insucesso.
+'''
+def compararROI(lmList, x, y, w, h, classIds):
+
+    # Se máscara:
+    if classIds == 0:
+        x0, y0 = lmList[0][1:]     # nariz
+        x9, y9 = lmList[9][1:]     # canto esquerdo da boca
+        x10, y10 = lmList[10][1:]  # canto direito da boca
+        if (x+w) >= x0 >= x and (y+h) >= y0 >= y:
+            if (x+w) >= x9 >= x and (y+h) >= y9 >= y:
+                if (x+w) >= x10 >= x and (y+h) >= y10 >= y:
+                    return 1
+                else:
+                    return 0
+            else:
+                return 0
+        else:
+            return 0
+
+    # Se capacete:
+    elif classIds == 1:
+        x0, y0 = lmList[0][1:]     # Nariz
+        if (x+w) >= x0 >= x and 2*(y+h) >= y0 >= y:
+            return 1
+        else:
+            return 0
+
+    # Se óculos
+    elif classIds == 2:
+        x2, y2 = lmList[2][1:]     # Olho esquerdo
+        x5, y5 = lmList[5][1:]     # OLho direito
+
+        if (x+w) >= x2 >= x and (y+h) >= y2 >= y:
+            if (x + w) >= x5 >= x and (y + h) >= y5 >= y:
+                return 1
+            else:
+                return 0
+        else:
+            return 0
+
+    # Se abafador
+    elif classIds == 3:
+        x7, y7 = lmList[7][1:]  # Orelha esquerda
+        x8, y8 = lmList[8][1:]  # Orelha direito
+
+        if (x + w) >= x7 >= x and (y + h) >= y7 >= y:
+            if (x + w) >= x8 >= x and (y + h) >= y8 >= y:
+                return 1
+            else:
+                return 0
+        else:
+            return 0
+
+    # Se colete
+    elif classIds == 4:
+        x12, y12 = lmList[12][1:]  # Ombro direito
+        x11, y11 = lmList[11][1:]  # Ombro esquerdo
+        x24, y24 = lmList[24][1:]  # Cintura direita
+        x23, y23 = lmList[23][1:]  # Cintura esquerda
+        if (x + w) >= x12 >= x and (y + h) >= y12 >= y:
+            if (x + w) >= x11 >= x and (y + h) >= y11 >= y:
+                if (x + w) >= x24 >= x and (y + h) >= y24 >= y:
+                    if (x + w) >= x23 >= x and (y + h) >= y23 >= y:
+                        return 1
+                    else:
+                        return 0
+                else:
+                    return 0
+            else:
+                return 0
+        else:
+            return 0
+
+    # Se luva
+    elif classIds == 5:
+        x16, y16 = lmList[16][1:]  # Pulso direito
+        x20, y20 = lmList[20][1:]  # Indicador direito
+        x15, y15 = lmList[15][1:]  # Pulso esquerdo
+        x19, y19 = lmList[19][1:]  # Indicador esquerda
+
+        if (x + w) >= x16 >= x and (y + h) >= y16 >= y and (x + w) >= x20 >= x and (y + h) >= y20 >= y:
+            # Retorna mão direita
+            return 2
+        elif (x + w) >= x15 >= x and (y + h) >= y15 >= y and (x + w) >= x19 >= x and (y + h) >= y19 >= y:
+            # Retorna mão esquerda
+            return 3
+        else:
+            return 0
+
+    # Se bota
+    elif classIds == 6:
+        x30, y30 = lmList[28][1:]  # Calcanhar direito
+        x32, y32 = lmList[32][1:]  # Ponta do pé direito
+        x29, y29 = lmList[27][1:]  # Calcanhar esquerdo
+        x31, y31 = lmList[31][1:]  # Ponta do pé esquerda
+        if (x + w) >= x30 >= x and (y + h) >= y30 >= y and (x + w) >= x32 >= x and (y + h) >= y32 >= y:
+            # Retorna mão direita
+            return 2
+        elif (x + w) >= x29 >= x and (y + h) >= y29 >= y and (x + w) >= x31 >= x and (y + h) >= y31 >= y:
+            # Retorna mão esquerda
+            return 3
+        else:
+            return 0
+
+
+# Teste de classe
+def main():
+    cap = cv2.VideoCapture("teste.mp4") # coloque na pasta principal um vídeo de seu interesse com o nome teste.mp4
+    pTime = 0
+    detector = poseDetector()
+    while True:
+        success, img = cap.read()
+        img = detector.findPose(img)
+        lmList = detector.findPosition(img, draw=False)
+        if len(lmList) != 0:
+            print(lmList[14])
+            cv2.circle(img, (lmList[14][1], lmList[14][2]), 15, (0, 0, 255), cv2.FILLED)
+
+        cTime = time.time()
+        fps = 1 / (cTime - pTime)
+        pTime = cTime
+
+        cv2.putText(img, str(int(fps)), (70, 50), cv2.FONT_HERSHEY_COMPLEX, 3, (255, 0, 0), 3)
+
+        cv2.imshow("Imagem", img)
+        cv2.waitKey(1)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,151 @@
+'''
+Nome:   Pré-processamento compartilhado de frames
+Sobre:  Produz, uma única vez por frame e a partir de uma única decodificação, cada representação usada no programa:
+            bgr         frame redimensionado para a largura de trabalho (postura, evidências)
+            rgb         conversão BGR -> RGB, usada pelo MediaPipe e na exibição do menu
+            blob        entrada da rede (whT x whT, float32 entre 0 e 1, RGB), gerado a partir do rgb
+            miniatura   rgb reduzido para o menu de detecção
+        Cada representação é calculada somente quando pedida e é gravada em buffers reaproveitados entre os frames,
+        sem novas alocações. O blob é idêntico ao de cv2.dnn.blobFromImage(bgr, 1 / 255, (whT, whT), swapRB=True),
+        usado pelo detector, pois a redução é feita canal a canal.
+        Os arrays de um frame preparado só são válidos até a preparação do frame seguinte. Para guardar um frame
+        (ou enviá-lo para outra thread), faça uma cópia.
+        As anotações da exibição (caixas, contagem) são desenhadas no rgb, com as cores em ordem RGB (ver rgb()).
+Desenvolvedor: felipeSperb
+'''
+
+import cv2
+import numpy as np
+
+
+# Converte uma cor BGR (usada nos desenhos do OpenCV) para desenhar em uma imagem RGB
+def rgb(cor):
+    return tuple(cor[::-1])
+
+
+class quadroPreparado():
+
+    def __init__(self, preparador, bgr):
+        self.preparador = preparador
+        self.bgr = bgr
+        self._rgb = None
+        self._blob = None
+        self._miniatura = None
+
+
+    # Frame em RGB (MediaPipe e exibição)
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = self.preparador._converter(self.bgr)
+        return self._rgb
+
+
+    # Entrada da rede, com forma (1, 3, whT, whT)
+    @property
+    def blob(self):
+        if self._blob is None:
+            self._blob = self.preparador._blob(self.rgb)
+        return self._blob
+
+
+    '''
+    Miniatura RGB do frame, com as anotações já desenhadas no rgb.
+        Deve ser pedida depois dos desenhos: o resultado é guardado e não é recalculado.
+    '''
+    def miniatura(self):
+        if self._miniatura is None:
+            self._miniatura = self.preparador._reduzir(self.rgb)
+        return self._miniatura
+
+
+class preparadorQuadros():
+
+    def __init__(self, largura=920, whT=416, larguraMiniatura=350):
+
+        '''
+        largura:    Largura de trabalho do frame (postura, exibição e evidências). Padrão para 920.
+
+        whT:    Resolução de entrada da rede. Padrão para 416, a mesma do detector.
+
+        larguraMiniatura:   Largura da miniatura do menu de detecção. Padrão para 350.
+        '''
+        self.largura = largura
+        self.whT = whT
+        self.larguraMiniatura = larguraMiniatura
+        self._buffers = {}
+        self._icones = {}
+
+        # Contagem de operações por representação e de buffers alocados (ver contagem)
+        self.operacoes = {'frames': 0, 'redimensionar': 0, 'rgb': 0, 'blob': 0, 'miniatura': 0}
+        self.alocacoes = 0
+        self.bytesAlocados = 0
+
+
+    # Retorna o buffer com o nome e a forma pedidos, alocando somente quando a forma muda
+    def _buffer(self, nome, forma, tipo=np.uint8):
+        buffer = self._buffers.get(nome)
+        if buffer is None or buffer.shape != forma or buffer.dtype != tipo:
+            buffer = np.empty(forma, dtype=tipo)
+            self._buffers[nome] = buffer
+            self.alocacoes += 1
+            self.bytesAlocados += buffer.nbytes
+        return buffer
+
+
+    '''
+    Prepara um frame decodificado (BGR).
+        O frame é redimensionado para a largura de trabalho, como imutils.resize (INTER_AREA). Frames que já
+        estão na largura de trabalho (por exemplo, de um armazém de quadros convertido com a mesma largura)
+        são usados sem cópia e não devem ser alterados.
+    '''
+    def preparar(self, frame):
+        self.operacoes['frames'] += 1
+        h, w = frame.shape[:2]
+        if w != self.largura:
+            altura = int(h * self.largura / float(w))
+            destino = self._buffer('bgr', (altura, self.largura, 3))
+            frame = cv2.resize(frame, (self.largura, altura), dst=destino, interpolation=cv2.INTER_AREA)
+            self.operacoes['redimensionar'] += 1
+        return quadroPreparado(self, frame)
+
+
+    def _converter(self, bgr):
+        self.operacoes['rgb'] += 1
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=self._buffer('rgb', bgr.shape))
+
+
+    # Mesmo resultado de blobFromImage(bgr, 1 / 255, (whT, whT), [0, 0, 0], swapRB=True, crop=False)
+    def _blob(self, imgRGB):
+        self.operacoes['blob'] += 1
+        reduzida = cv2.resize(imgRGB, (self.whT, self.whT), dst=self._buffer('rede', (self.whT, self.whT, 3)),
+                              interpolation=cv2.INTER_LINEAR)
+        blob = self._buffer('blob', (1, 3, self.whT, self.whT), np.float32)
+        np.multiply(reduzida.transpose(2, 0, 1), np.float32(1 / 255), out=blob[0], casting='unsafe')
+        return blob
+
+
+    def _reduzir(self, imgRGB):
+        self.operacoes['miniatura'] += 1
+        h, w = imgRGB.shape[:2]
+        altura = int(h * self.larguraMiniatura / float(w))
+        destino = self._buffer('miniatura', (altura, self.larguraMiniatura, 3))
+        return cv2.resize(imgRGB, (self.larguraMiniatura, altura), dst=destino, interpolation=cv2.INTER_AREA)
+
+
+    '''
+    Ícone (PNG com transparência) em RGBA, na escala da miniatura. Lido do disco uma única vez.
+    '''
+    def iconeMiniatura(self, arquivo):
+        icone = self._icones.get(arquivo)
+        if icone is None:
+            icone = cv2.cvtColor(cv2.imread(arquivo, cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGBA)
+            escala = self.larguraMiniatura / float(self.largura)
+            icone = cv2.resize(icone, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+            self._icones[arquivo] = icone
+        return icone
+
+
+    # Resumo das operações e das alocações feitas até aqui
+    def contagem(self):
+        return dict(self.operacoes, alocacoes=self.alocacoes, bytes_alocados=self.bytesAlocados)
@@ -0,0 +1,328 @@
+'''
+Nome:   Armazém de quadros
+Sobre:  Decodifica uma gravação uma única vez e guarda os quadros em blocos .npy (uint8) lidos com memória mapeada,
+        junto de um índice com o tempo de cada quadro.
+        Reprocessamentos seguintes não decodificam o vídeo: qualquer quadro ou intervalo é acessado diretamente,
+        sem cópia, e vários processos podem ler o mesmo armazém ao mesmo tempo (as páginas dos arquivos são
+        compartilhadas pelo sistema operacional).
+        Formato da pasta:
+            indice.json     dimensões, fps, fonte e quantidade de quadros de cada bloco
+            tempos.npy      tempo de cada quadro em segundos (float64)
+            bloco_000000.npy, bloco_000001.npy, ...    quadros BGR com forma (quadros, altura, largura, 3)
+        Os quadros retornados são somente leitura. Para desenhar sobre um quadro, faça uma cópia antes.
+        leitorArmazem imita a interface do cv2.VideoCapture, então o armazém pode ser usado no lugar de um arquivo
+        de vídeo no controlador de portarias e no benchmark.
+Uso:    python -m vcad_epis.quadros converter gravacao.mp4 gravacao_quadros --largura 920
+        python -m vcad_epis.quadros info gravacao_quadros
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import imutils
+import numpy as np
+
+
+arquivoIndice = 'indice.json'
+arquivoTempos = 'tempos.npy'
+
+
+def _arquivoBloco(pasta, bloco):
+    return os.path.join(pasta, 'bloco_{:06d}.npy'.format(bloco))
+
+
+# Retorna true se a pasta contém um armazém de quadros
+def ehArmazem(fonte):
+    return isinstance(fonte, str) and os.path.isfile(os.path.join(fonte, arquivoIndice))
+
+
+'''
+Decodifica um vídeo (arquivo, URL ou índice de câmera) e grava o armazém de quadros na pasta.
+    largura: Se informada, os quadros são redimensionados para esta largura (ex: 920, a do programa principal).
+    quadrosPorBloco: Quantidade de quadros de cada arquivo .npy.
+    maxQuadros: Quantidade máxima de quadros gravados.
+Retorna o armazém aberto para leitura.
+'''
+def converter(fonte, pasta, largura=None, quadrosPorBloco=256, maxQuadros=None):
+    os.makedirs(pasta, exist_ok=True)
+    cap = cv2.VideoCapture(fonte)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    tempos = []
+    blocos = []
+    mapa = None
+    forma = None
+    try:
+        while maxQuadros is None or len(tempos) < maxQuadros:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if largura is not None:
+                frame = imutils.resize(frame, width=largura)
+            if forma is None:
+                forma = frame.shape
+            elif frame.shape != forma:
+                # Mudança de resolução no meio do stream
+                frame = cv2.resize(frame, (forma[1], forma[0]))
+
+            posicao = len(tempos) - sum(blocos)
+            if mapa is None or posicao == quadrosPorBloco:
+                if mapa is not None:
+                    mapa.flush()
+                    blocos.append(quadrosPorBloco)
+                mapa = np.lib.format.open_memmap(_arquivoBloco(pasta, len(blocos)), mode='w+', dtype=np.uint8,
+                                                 shape=(quadrosPorBloco,) + forma)
+                posicao = 0
+            mapa[posicao] = frame
+            tempos.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+    finally:
+        cap.release()
+
+    if mapa is not None:
+        usados = len(tempos) - sum(blocos)
+        mapa.flush()
+        if usados < quadrosPorBloco:
+            # O último bloco é regravado somente com os quadros usados
+            ultimo = np.array(mapa[:usados])
+            del mapa
+            np.save(_arquivoBloco(pasta, len(blocos)), ultimo)
+        blocos.append(usados)
+
+    np.save(os.path.join(pasta, arquivoTempos), np.array(tempos, dtype=np.float64))
+    indice = {
+        'versao': 1,
+        'fonte': str(fonte),
+        'altura': forma[0] if forma else 0,
+        'largura': forma[1] if forma else 0,
+        'canais': forma[2] if forma and len(forma) > 2 else 1,
+        'fps': fps,
+        'quadrosPorBloco': quadrosPorBloco,
+        'blocos': blocos
+    }
+    temporario = os.path.join(pasta, arquivoIndice + '.tmp')
+    with open(temporario, 'w') as f:
+        json.dump(indice, f, indent=2)
+    os.replace(temporario, os.path.join(pasta, arquivoIndice))
+    return armazemQuadros(pasta)
+
+
+class armazemQuadros():
+
+    def __init__(self, pasta):
+
+        '''
+        Abre um armazém de quadros para leitura. Os blocos só são mapeados na primeira leitura.
+
+        pasta:  Pasta criada por converter.
+        '''
+        self.pasta = pasta
+        with open(os.path.join(pasta, arquivoIndice), 'rt') as f:
+            self.indice = json.load(f)
+        self.fps = self.indice['fps']
+        self.forma = (self.indice['altura'], self.indice['largura'], self.indice['canais'])
+        self.tempos = np.load(os.path.join(pasta, arquivoTempos), mmap_mode='r')
+        # Primeiro quadro de cada bloco
+        self._inicios = np.concatenate([[0], np.cumsum(self.indice['blocos'])]).astype(np.int64)
+        self._blocos = {}
+
+    def __len__(self):
+        return int(self._inicios[-1])
+
+    def _bloco(self, bloco):
+        if bloco not in self._blocos:
+            self._blocos[bloco] = np.load(_arquivoBloco(self.pasta, bloco), mmap_mode='r')
+        return self._blocos[bloco]
+
+    # Bloco e posição dentro do bloco de um quadro
+    def localizar(self, indice):
+        if not 0 <= indice < len(self):
+            raise IndexError('quadro {} fora do armazém ({} quadros)'.format(indice, len(self)))
+        bloco = int(np.searchsorted(self._inicios, indice, side='right')) - 1
+        return bloco, indice - int(self._inicios[bloco])
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            inicio, fim, passo = indice.indices(len(self))
+            if passo != 1:
+                raise ValueError('intervalos com passo não são suportados')
+            return self.intervalo(inicio, fim)
+        if indice < 0:
+            indice += len(self)
+        bloco, posicao = self.localizar(indice)
+        return self._bloco(bloco)[posicao]
+
+    '''
+    Partes de um intervalo de quadros [inicio, fim), uma por bloco, sem cópia.
+        Retorna uma lista de (primeiro quadro, matriz de quadros).
+    '''
+    def partes(self, inicio, fim):
+        fim = min(fim, len(self))
+        partes = []
+        while inicio < fim:
+            bloco, posicao = self.localizar(inicio)
+            quantidade = min(fim, int(self._inicios[bloco + 1])) - inicio
+            partes.append((inicio, self._bloco(bloco)[posicao:posicao + quantidade]))
+            inicio += quantidade
+        return partes
+
+    '''
+    Intervalo de quadros [inicio, fim) em uma única matriz.
+        Sem cópia quando o intervalo está em um único bloco. Caso contrário os blocos são concatenados.
+    '''
+    def intervalo(self, inicio, fim):
+        partes = self.partes(inicio, fim)
+        if not partes:
+            return np.empty((0,) + self.forma, dtype=np.uint8)
+        if len(partes) == 1:
+            return partes[0][1]
+        return np.concatenate([p for _, p in partes])
+
+    # Percorre os quadros do intervalo, retornando (índice, tempo, quadro)
+    def quadros(self, inicio=0, fim=None):
+        for primeiro, parte in self.partes(inicio, len(self) if fim is None else fim):
+            for n, frame in enumerate(parte):
+                yield primeiro + n, float(self.tempos[primeiro + n]), frame
+
+    # Índice do primeiro quadro com tempo maior ou igual a "segundos"
+    def indiceTempo(self, segundos):
+        return int(np.searchsorted(self.tempos, segundos, side='left'))
+
+    '''
+    Divide os quadros em "partes" intervalos [inicio, fim) de tamanhos parecidos, alinhados aos blocos sempre
+    que possível, para distribuir entre trabalhadores.
+    '''
+    def dividir(self, partes):
+        total = len(self)
+        limites = [0]
+        for n in range(1, partes):
+            alvo = total * n // partes
+            # Alinha ao início do bloco mais próximo
+            bloco = int(np.abs(self._inicios - alvo).argmin())
+            limites.append(max(limites[-1], int(self._inicios[bloco])))
+        limites.append(total)
+        return [(a, b) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+
+
+class leitorArmazem():
+
+    def __init__(self, pasta):
+
+        '''
+        Leitura sequencial de um armazém de quadros com a mesma interface do cv2.VideoCapture
+        (read, get, set, isOpened e release). Os quadros retornados por read são somente leitura.
+        '''
+        self.armazem = armazemQuadros(pasta)
+        self.posicao = 0
+
+    def isOpened(self):
+        return self.armazem is not None
+
+    def read(self):
+        if self.armazem is None or self.posicao >= len(self.armazem):
+            return False, None
+        frame = self.armazem[self.posicao]
+        self.posicao += 1
+        return True, frame
+
+    def get(self, propriedade):
+        if propriedade == cv2.CAP_PROP_POS_MSEC:
+            # Como no VideoCapture: tempo do último quadro lido
+            return float(self.armazem.tempos[max(0, self.posicao - 1)]) * 1000 if len(self.armazem) else 0.0
+        if propriedade == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.posicao)
+        if propriedade == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.armazem))
+        if propriedade == cv2.CAP_PROP_FPS:
+            return float(self.armazem.fps)
+        if propriedade == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.armazem.forma[1])
+        if propriedade == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.armazem.forma[0])
+        return 0.0
+
+    def set(self, propriedade, valor):
+        if propriedade == cv2.CAP_PROP_POS_FRAMES:
+            self.posicao = int(valor)
+            return True
+        if propriedade == cv2.CAP_PROP_POS_MSEC:
+            self.posicao = self.armazem.indiceTempo(valor / 1000)
+            return True
+        return False
+
+    def release(self):
+        self.armazem = None
+
+
+'''
+Abre uma fonte de vídeo: armazém de quadros (pasta com indice.json) ou qualquer fonte do cv2.VideoCapture.
+'''
+def abrirCaptura(fonte):
+    if ehArmazem(fonte):
+        return leitorArmazem(fonte)
+    return cv2.VideoCapture(fonte)
+
+
+# Armazém aberto em cada processo trabalhador
+_armazemTrabalhador = None
+
+
+def _iniciarTrabalhador(pasta):
+    global _armazemTrabalhador
+    _armazemTrabalhador = armazemQuadros(pasta)
+
+
+def _mapearIntervalo(funcao, inicio, fim):
+    return [funcao(indice, tempo, frame) for indice, tempo, frame in _armazemTrabalhador.quadros(inicio, fim)]
+
+
+'''
+Aplica funcao(indice, tempo, quadro) a todos os quadros do armazém em vários processos.
+    Cada processo mapeia os blocos do seu intervalo, sem copiar os quadros entre processos.
+    funcao deve ser definida no nível do módulo (para ser enviada aos processos).
+Retorna a lista de resultados na ordem dos quadros.
+'''
+def mapear(pasta, funcao, trabalhadores=2, inicio=0, fim=None):
+    armazem = armazemQuadros(pasta)
+    fim = len(armazem) if fim is None else min(fim, len(armazem))
+    intervalos = [(max(a, inicio), min(b, fim)) for a, b in armazem.dividir(trabalhadores * 4)
+                  if b > inicio and a < fim]
+    resultados = []
+    with ProcessPoolExecutor(max_workers=trabalhadores, initializer=_iniciarTrabalhador,
+                             initargs=(pasta,)) as executor:
+        futuros = [executor.submit(_mapearIntervalo, funcao, a, b) for a, b in intervalos]
+        for futuro in futuros:
+            resultados.extend(futuro.result())
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Armazém de quadros com memória mapeada.')
+    comandos = parser.add_subparsers(dest='comando')
+    conv = comandos.add_parser('converter', help='decodifica um vídeo e grava o armazém')
+    conv.add_argument('fonte', help='arquivo de vídeo, URL ou índice de câmera')
+    conv.add_argument('pasta', help='pasta do armazém')
+    conv.add_argument('--largura', type=int, default=None, help='redimensiona os quadros para esta largura')
+    conv.add_argument('--bloco', type=int, default=256, help='quadros por arquivo .npy (padrão 256)')
+    conv.add_argument('--max-quadros', type=int, default=None, help='quantidade máxima de quadros')
+    info = comandos.add_parser('info', help='mostra as informações de um armazém')
+    info.add_argument('pasta', help='pasta do armazém')
+    args = parser.parse_args(argv)
+
+    if args.comando == 'converter':
+        fonte = int(args.fonte) if args.fonte.isdigit() else args.fonte
+        armazem = converter(fonte, args.pasta, args.largura, args.bloco, args.max_quadros)
+    elif args.comando == 'info':
+        armazem = armazemQuadros(args.pasta)
+    else:
+        parser.print_help()
+        return
+    duracao = float(armazem.tempos[-1]) if len(armazem) else 0.0
+    print('Quadros: {}  blocos: {}  dimensões: {}x{}  fps: {:.1f}  duração: {:.1f} s'.format(
+        len(armazem), len(armazem.indice['blocos']), armazem.forma[1], armazem.forma[0], armazem.fps, duracao))
+
+
+if __name__ == "__main__":
+    main()
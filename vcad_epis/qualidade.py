@@ -0,0 +1,186 @@
+'''
+Nome:   Controle adaptativo de qualidade
+Sobre:  Mantém o tempo por frame dentro de um orçamento em computadores mais fracos, reduzindo (ou restaurando)
+        a qualidade em níveis. Cada nível define:
+            complexidade    complexidade do modelo de postura do MediaPipe (0, 1 ou 2)
+            saltoPose       a postura é estimada a cada N frames (nos demais, os últimos landmarks são mantidos)
+            whT             resolução de entrada da rede (múltiplo de 32)
+            fpsExibicao     taxa máxima de atualização da imagem no menu
+        O controlador recebe o tempo medido de cada frame e compara o percentil da janela com o orçamento:
+            acima do orçamento                      desce um nível (menor qualidade)
+            abaixo de orçamento * fatorSubida       sobe um nível (maior qualidade)
+        Histerese: a faixa entre os dois limites não gera mudanças, a janela é esvaziada a cada mudança, nenhuma
+        mudança ocorre antes de "espera" segundos e a subida exige "esperaSubida" segundos no nível atual. Se uma
+        subida não se sustentar (descida logo em seguida), a espera para subir dobra, evitando oscilação.
+        Toda mudança é auditada (auditoria e, opcionalmente, um registro JSON-lines).
+Uso:    controlador = controladorQualidade(orcamento=1 / 15, aoMudar=lambda nivel: aplicarNivel(nivel, pose, detector))
+        controlador.registrar(tempoDoFrame)
+Desenvolvedor: felipeSperb
+'''
+
+import time
+from collections import deque
+
+import numpy as np
+
+
+class nivelQualidade():
+
+    def __init__(self, complexidade=1, saltoPose=1, whT=416, fpsExibicao=30):
+        self.complexidade = complexidade
+        self.saltoPose = saltoPose
+        self.whT = whT
+        self.fpsExibicao = fpsExibicao
+
+    def paraDict(self):
+        return {'complexidade': self.complexidade, 'saltoPose': self.saltoPose, 'whT': self.whT,
+                'fpsExibicao': self.fpsExibicao}
+
+    def __repr__(self):
+        return 'nivelQualidade({complexidade}, {saltoPose}, {whT}, {fpsExibicao})'.format(**self.paraDict())
+
+
+# Níveis da maior para a menor qualidade. Cada nível altera um único parâmetro do anterior
+niveisPadrao = (
+    nivelQualidade(1, 1, 416, 30),
+    nivelQualidade(1, 2, 416, 30),
+    nivelQualidade(0, 2, 416, 30),
+    nivelQualidade(0, 2, 416, 15),
+    nivelQualidade(0, 3, 416, 15),
+    nivelQualidade(0, 3, 320, 15),
+    nivelQualidade(0, 3, 320, 10),
+    nivelQualidade(0, 4, 256, 10)
+)
+
+# Motivos das mudanças
+ACIMA = 'acima_orcamento'
+ABAIXO = 'abaixo_orcamento'
+
+
+'''
+Aplica um nível de qualidade aos componentes informados: complexidade da postura e resolução da rede
+(no detector e no pré-processamento). saltoPose e fpsExibicao são aplicados por quem exibe os frames.
+    A rede do darknet aceita qualquer resolução múltipla de 32. Um modelo ONNX com entrada fixa deve manter whT:
+    nesse caso (detector.entradaFixa) a resolução do nível é ignorada e o pré-processamento usa a do detector.
+'''
+def aplicarNivel(nivel, pose=None, detector=None, preparador=None):
+    if pose is not None:
+        pose.definirComplexidade(nivel.complexidade)
+    whT = nivel.whT
+    if detector is not None:
+        if detector.entradaFixa:
+            whT = detector.whT
+        else:
+            detector.whT = whT
+    if preparador is not None:
+        preparador.whT = whT
+
+
+class controladorQualidade():
+
+    def __init__(self, orcamento=1 / 15, niveis=niveisPadrao, janela=30, percentil=50, fatorSubida=0.6,
+                 espera=2.0, esperaSubida=10.0, esperaMaxima=300.0, relogio=time.monotonic, aoMudar=None,
+                 registro=None):
+
+        '''
+        orcamento:  Tempo máximo (em segundos) de processamento por frame. Padrão para 1/15 (15 FPS).
+
+        niveis: Níveis de qualidade, do melhor para o pior. Padrão para niveisPadrao.
+
+        janela: Quantidade de frames medidos antes de cada avaliação. Padrão para 30.
+
+        percentil:  Percentil da janela comparado com o orçamento. Padrão para 50 (mediana), que ignora os picos
+                    isolados (frame inspecionado, recarga do modelo de postura).
+
+        fatorSubida:    A qualidade só sobe quando o percentil ficar abaixo de orcamento * fatorSubida.
+                        Padrão para 0.6.
+
+        espera: Tempo mínimo (em segundos) entre duas mudanças. Padrão para 2.0.
+
+        esperaSubida:   Tempo mínimo (em segundos) no nível atual antes de subir. Dobra a cada subida que não se
+                        sustentar, até esperaMaxima. Padrão para 10.0 (máximo de 300.0).
+
+        relogio:    Função que retorna o tempo atual em segundos. Padrão para time.monotonic.
+
+        aoMudar:    Função chamada com o novo nivelQualidade a cada mudança (e uma vez na criação).
+
+        registro:   Objeto com o método escrever(dict) (ex: registro.registroInspecoes) que recebe a auditoria.
+        '''
+        self.orcamento = orcamento
+        self.niveis = tuple(niveis)
+        self.percentil = percentil
+        self.fatorSubida = fatorSubida
+        self.espera = espera
+        self.esperaBase = esperaSubida
+        self.esperaSubida = esperaSubida
+        self.esperaMaxima = esperaMaxima
+        self.relogio = relogio
+        self.aoMudar = aoMudar
+        self.registro = registro
+
+        self.indice = 0
+        self.tempos = deque(maxlen=janela)
+        # Mudanças realizadas (mais recentes no final)
+        self.auditoria = deque(maxlen=1000)
+        self._ultimaMudanca = relogio()
+        self._ultimaSubida = None
+        if aoMudar is not None:
+            aoMudar(self.nivel)
+
+
+    @property
+    def nivel(self):
+        return self.niveis[self.indice]
+
+
+    '''
+    Registra o tempo de processamento de um frame (em segundos).
+    Retorna o novo nivelQualidade se houve mudança, ou None.
+    '''
+    def registrar(self, segundos, tempo=None):
+        if tempo is None:
+            tempo = self.relogio()
+        self.tempos.append(segundos)
+        if len(self.tempos) < self.tempos.maxlen or tempo - self._ultimaMudanca < self.espera:
+            return None
+
+        # A última subida se sustentou: a espera para subir volta ao valor inicial
+        if self._ultimaSubida is not None and tempo - self._ultimaSubida >= self.esperaSubida:
+            self._ultimaSubida = None
+            self.esperaSubida = self.esperaBase
+
+        medido = float(np.percentile(self.tempos, self.percentil))
+        if medido > self.orcamento and self.indice < len(self.niveis) - 1:
+            # Subida recente que não se sustentou: a próxima tentativa espera o dobro
+            if self._ultimaSubida is not None:
+                self.esperaSubida = min(self.esperaSubida * 2, self.esperaMaxima)
+                self._ultimaSubida = None
+            return self._mudar(self.indice + 1, ACIMA, medido, tempo)
+        if medido < self.orcamento * self.fatorSubida and self.indice > 0 and \
+                tempo - self._ultimaMudanca >= self.esperaSubida:
+            self._ultimaSubida = tempo
+            return self._mudar(self.indice - 1, ABAIXO, medido, tempo)
+        return None
+
+
+    def _mudar(self, indice, motivo, medido, tempo):
+        anterior = self.indice
+        self.indice = indice
+        self._ultimaMudanca = tempo
+        self.tempos.clear()
+
+        mudanca = {
+            't': round(time.time(), 3),
+            'de': anterior,
+            'para': indice,
+            'motivo': motivo,
+            'medido_ms': round(medido * 1000, 2),
+            'orcamento_ms': round(self.orcamento * 1000, 2),
+            'nivel': self.nivel.paraDict()
+        }
+        self.auditoria.append(mudanca)
+        if self.registro is not None:
+            self.registro.escrever(mudanca)
+        if self.aoMudar is not None:
+            self.aoMudar(self.nivel)
+        return self.nivel
@@ -0,0 +1,250 @@
+'''
+Nome:   Registro de inspeções
+Sobre:  Grava um registro compacto por inspeção em um arquivo JSON-lines (uma linha JSON por inspeção):
+            t           momento da inspeção (segundos desde 1970)
+            portaria    identificação da câmera ou portaria
+            decisao     liberado, mal_posicionado ou negado
+            status      status de cada classe (positivo, alerta, negativo ou ignorado)
+            conf        confiança de cada classe positiva
+            alertas     quantidade de detecções fora da região de interesse
+            lat         tempo de cada etapa em milissegundos
+            angulos     ângulos dos braços direito e esquerdo (pose de inspeção)
+        As linhas são acumuladas em memória e gravadas em blocos (ao atingir o tamanho do buffer ou a cada
+        "intervalo" segundos). Quando o arquivo atinge o tamanho máximo ele é renomeado (inspecoes.1.jsonl,
+        inspecoes.2.jsonl, ...) e os mais antigos são apagados, limitando o espaço em disco e a memória usados.
+        Se a gravação falhar (disco cheio, arquivo bloqueado), o erro é informado e as linhas continuam no buffer
+        para a próxima tentativa.
+Uso:    python -m vcad_epis.registro Arquivos/Registros/inspecoes.jsonl
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+from .detector import lerClasses
+from .postura import angulosBracos
+
+
+# Arquivo padrão, relativo à pasta de execução
+arquivoRegistro = os.path.join('Arquivos', 'Registros', 'inspecoes.jsonl')
+
+
+'''
+Registro compacto de uma inspeção (dicionário pronto para JSON).
+'''
+def registroInspecao(resultado, classNames, portaria=None, tempo=None):
+    registro = {
+        't': round(time.time() if tempo is None else tempo, 3),
+        'portaria': portaria,
+        'decisao': resultado.decisao,
+        'status': {classNames[c]: s for c, s in enumerate(resultado.status)},
+        'conf': {classNames[c]: round(v, 3) for c, v in enumerate(resultado.confiancas) if v is not None},
+        'alertas': resultado.alertas
+    }
+    if resultado.latencias:
+        registro['lat'] = {etapa: round(ms, 2) for etapa, ms in resultado.latencias.items()}
+    angulos = angulosBracos(resultado.lmList)
+    if angulos is not None:
+        registro['angulos'] = [round(a, 1) for a in angulos]
+    return registro
+
+
+'''
+Arquivos do registro em ordem cronológica: os renomeados (do mais antigo ao mais recente) e o atual.
+'''
+def arquivosRegistro(arquivo):
+    base, extensao = os.path.splitext(arquivo)
+    antigos = []
+    n = 1
+    while os.path.exists('{}.{}{}'.format(base, n, extensao)):
+        antigos.append('{}.{}{}'.format(base, n, extensao))
+        n += 1
+    return antigos[::-1] + ([arquivo] if os.path.exists(arquivo) else [])
+
+
+'''
+Lê todos os registros, em ordem cronológica. Linhas incompletas (programa interrompido) são ignoradas.
+'''
+def lerRegistros(arquivo=arquivoRegistro):
+    for caminho in arquivosRegistro(arquivo):
+        with open(caminho, 'rt', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    yield json.loads(linha)
+                except ValueError:
+                    continue
+
+
+class registroInspecoes():
+
+    def __init__(self, arquivo=arquivoRegistro, tamanhoMaximo=16 << 20, arquivosMaximos=8, tamanhoBuffer=64 << 10,
+                 intervalo=2.0, classNames=None):
+
+        '''
+        arquivo:    Arquivo do registro (.jsonl). A pasta é criada se não existir.
+
+        tamanhoMaximo:  Tamanho (em bytes) a partir do qual o arquivo é renomeado. Padrão para 16 MB.
+
+        arquivosMaximos:    Quantidade de arquivos renomeados mantidos. Padrão para 8 (até 144 MB no total).
+
+        tamanhoBuffer:  Bytes acumulados em memória antes da gravação. Padrão para 64 kB.
+
+        intervalo:  Tempo máximo (em segundos) que um registro fica em memória antes de ser gravado.
+                    Uma thread em segundo plano grava o buffer mesmo sem novas inspeções. 0 desativa a thread.
+                    Padrão para 2.0.
+        '''
+        self.arquivo = arquivo
+        self.tamanhoMaximo = tamanhoMaximo
+        self.arquivosMaximos = arquivosMaximos
+        self.tamanhoBuffer = tamanhoBuffer
+        self.intervalo = intervalo
+        self.classNames = classNames if classNames is not None else lerClasses()
+        self.registros = 0
+
+        pasta = os.path.dirname(arquivo)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._buffer = []
+        self._bytesBuffer = 0
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        if intervalo > 0:
+            self._thread = threading.Thread(target=self._executar, daemon=True)
+            self._thread.start()
+        atexit.register(self.fechar)
+
+
+    '''
+    Registra uma inspeção.
+        portaria: Identificação da câmera ou portaria.
+        extras: Campos adicionais gravados no registro.
+    Retorna o registro gravado.
+    '''
+    def registrar(self, resultado, portaria=None, tempo=None, **extras):
+        registro = registroInspecao(resultado, self.classNames, portaria, tempo)
+        registro.update(extras)
+        self.escrever(registro)
+        return registro
+
+
+    # Acrescenta um registro (dicionário) ao buffer
+    def escrever(self, registro):
+        linha = (json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._trava:
+            self._buffer.append(linha)
+            self._bytesBuffer += len(linha)
+            self.registros += 1
+            if self._bytesBuffer >= self.tamanhoBuffer:
+                self._tentarGravar()
+
+
+    # Grava o buffer no arquivo
+    def descarregar(self):
+        with self._trava:
+            self._gravar()
+
+
+    # O buffer só é esvaziado depois da gravação: se ela falhar, as linhas são gravadas na próxima tentativa
+    def _gravar(self):
+        if not self._buffer:
+            return
+        bloco = b''.join(self._buffer)
+        try:
+            tamanho = os.path.getsize(self.arquivo)
+        except OSError:
+            tamanho = 0
+        if tamanho and tamanho + len(bloco) > self.tamanhoMaximo:
+            self._rotacionar()
+        with open(self.arquivo, 'ab') as f:
+            f.write(bloco)
+        self._buffer = []
+        self._bytesBuffer = 0
+
+
+    # Grava o buffer informando a falha sem interromper quem registrou (inspeção ou thread de gravação)
+    def _tentarGravar(self):
+        try:
+            self._gravar()
+        except OSError as erro:
+            print('Falha ao gravar o registro {} ({} linhas no buffer): {}'.format(
+                self.arquivo, len(self._buffer), erro), file=sys.stderr)
+
+
+    # inspecoes.jsonl -> inspecoes.1.jsonl -> inspecoes.2.jsonl ... O mais antigo é apagado
+    def _rotacionar(self):
+        base, extensao = os.path.splitext(self.arquivo)
+        nome = lambda n: '{}.{}{}'.format(base, n, extensao)
+        if os.path.exists(nome(self.arquivosMaximos)):
+            os.remove(nome(self.arquivosMaximos))
+        for n in range(self.arquivosMaximos - 1, 0, -1):
+            if os.path.exists(nome(n)):
+                os.replace(nome(n), nome(n + 1))
+        if self.arquivosMaximos > 0:
+            os.replace(self.arquivo, nome(1))
+        else:
+            os.remove(self.arquivo)
+
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            with self._trava:
+                try:
+                    self._tentarGravar()
+                except Exception as erro:
+                    # A thread continua: as linhas permanecem no buffer
+                    print('Erro na gravação do registro {}: {!r}'.format(self.arquivo, erro), file=sys.stderr)
+
+
+    # Grava o que estiver em memória e encerra a thread de gravação
+    def fechar(self):
+        self._parar.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+        self.descarregar()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.fechar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resumo do registro de inspeções.')
+    parser.add_argument('arquivo', nargs='?', default=arquivoRegistro, help='arquivo do registro (.jsonl)')
+    parser.add_argument('--portaria', default=None, help='considera somente esta portaria')
+    args = parser.parse_args(argv)
+
+    total = 0
+    decisoes = {}
+    falhas = {}
+    portarias = set()
+    for registro in lerRegistros(args.arquivo):
+        if args.portaria is not None and registro.get('portaria') != args.portaria:
+            continue
+        total += 1
+        portarias.add(registro.get('portaria'))
+        decisoes[registro['decisao']] = decisoes.get(registro['decisao'], 0) + 1
+        for classe, status in registro.get('status', {}).items():
+            if status in ('negativo', 'alerta'):
+                chave = (classe, status)
+                falhas[chave] = falhas.get(chave, 0) + 1
+
+    print('Inspeções: {}  portarias: {}'.format(total, len(portarias)))
+    for decisao, quantidade in sorted(decisoes.items()):
+        print('{:16s} {:6d}'.format(decisao, quantidade))
+    for (classe, status), quantidade in sorted(falhas.items(), key=lambda item: -item[1]):
+        print('{:10s} {:9s} {:6d}'.format(classe, status, quantidade))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+'''
+Nome:   Serviço local de inspeção
+Sobre:  Expõe a inspeção de EPIs através de uma API HTTP local, permitindo que um único computador
+        atenda várias câmeras (clientes leves) sem que cada portaria carregue sua própria cópia da rede.
+        Os clientes enviam frames JPEG e recebem as detecções de cada classe, o resultado da comparação
+        com as regiões de interesse e a decisão de acesso.
+        Internamente é mantido um conjunto (pool) de inspetores já carregados. Os pedidos aguardam em uma
+        fila limitada e, opcionalmente, são agrupados em lotes (micro-batching) para executar a rede
+        uma única vez para vários frames.
+Rotas:  POST /inspect   corpo: imagem JPEG/PNG. Parâmetro opcional ?requeridos=1111111 (um dígito por classe)
+        GET  /saude     estado do serviço (instâncias, tamanho do lote e pedidos na fila)
+        GET  /metrics   métricas no formato do Prometheus
+Uso:    python -m vcad_epis.servico --porta 8080 --instancias 2 --lote 4
+        cliente = clienteInspecao('http://127.0.0.1:8080')
+        resposta = cliente.inspecionar(frame)
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, TimeoutError as tempoEsgotado
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from . import metricas as mt
+from .inspecao import Inspector
+from .politica import observadorPolitica
+from .postura import poseDetector
+
+
+# Erro lançado quando a fila de pedidos está cheia
+class filaCheia(Exception):
+    pass
+
+
+# Pedido de inspeção aguardando na fila
+class _pedido():
+
+    def __init__(self, frame, requeridos, lmList=None):
+        self.frame = frame
+        self.requeridos = requeridos
+        self.lmList = lmList
+        self.futuro = Future()
+        self.chegada = time.perf_counter()
+
+
+class filaJusta():
+
+    def __init__(self, maxsize=0, maxPorChave=0):
+
+        '''
+        Fila com uma subfila por cliente (chave), atendidas em rodízio.
+        Um cliente com muitos pedidos não impede que os pedidos dos demais sejam atendidos.
+        Depois de fechada (ver fechar), get retorna None quando não houver mais pedidos.
+
+        maxsize:    Quantidade máxima de pedidos na fila. 0 para ilimitado.
+
+        maxPorChave:    Quantidade máxima de pedidos de um mesmo cliente. 0 para ilimitado.
+        '''
+        self.maxsize = maxsize
+        self.maxPorChave = maxPorChave
+        self._filas = OrderedDict()
+        self._tamanho = 0
+        self._fechada = False
+        self._cond = threading.Condition()
+
+
+    # Adiciona sem bloquear. Lança queue.Full se a fila (ou a subfila do cliente) estiver cheia
+    def put_nowait(self, item, chave=None):
+        with self._cond:
+            subfila = self._filas.get(chave)
+            if self.maxsize and self._tamanho >= self.maxsize:
+                raise queue.Full
+            if self.maxPorChave and subfila is not None and len(subfila) >= self.maxPorChave:
+                raise queue.Full
+            if subfila is None:
+                subfila = self._filas[chave] = deque()
+            subfila.append(item)
+            self._tamanho += 1
+            self._cond.notify()
+
+
+    # Encerramento: os itens restantes continuam sendo entregues e, depois deles, get retorna None
+    def fechar(self):
+        with self._cond:
+            self._fechada = True
+            self._cond.notify_all()
+
+
+    '''
+    Retira o próximo item do rodízio. Lança queue.Empty se o timeout esgotar.
+        Retorna None se a fila estiver fechada e vazia.
+    '''
+    def get(self, block=True, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._tamanho > 0 or self._fechada, timeout if block else 0):
+                raise queue.Empty
+            if self._tamanho == 0:
+                return None
+            chave, subfila = next(iter(self._filas.items()))
+            item = subfila.popleft()
+            self._tamanho -= 1
+            # O cliente atendido vai para o fim do rodízio
+            if subfila:
+                self._filas.move_to_end(chave)
+            else:
+                del self._filas[chave]
+            return item
+
+
+    def qsize(self):
+        with self._cond:
+            return self._tamanho
+
+
+'''
+Cria um inspetor para o serviço.
+    Os frames chegam de câmeras diferentes, por isso a postura é estimada como imagem estática (mode=True),
+    sem o rastreamento entre frames consecutivos.
+'''
+def criarInspetor(metricas=None):
+    return Inspector(pose=poseDetector(mode=True), metricas=metricas)
+
+
+class poolInspetores():
+
+    def __init__(self, instancias=1, lote=1, esperaLote=0.01, tamanhoFila=32, metricas=None, fabrica=criarInspetor,
+                 maxPorCliente=0, aquecer=True):
+
+        '''
+        instancias: Quantidade de inspetores (cópias da rede e do estimador de postura) mantidos carregados.
+                    Cada instância é atendida por uma thread própria.
+                    Padrão para 1.
+
+        lote:   Quantidade máxima de frames executados juntos na rede.
+                Padrão para 1 (sem micro-batching).
+
+        esperaLote: Tempo máximo (em segundos) que um pedido aguarda a chegada de outros para formar um lote.
+                    Padrão para 0.01.
+
+        tamanhoFila:    Quantidade máxima de pedidos aguardando. Acima disso enviar lança filaCheia.
+                        Padrão para 32.
+
+        metricas:   Coletor de métricas compartilhado pelos inspetores. Padrão para desabilitado.
+
+        fabrica:    Função que recebe o coletor de métricas e retorna um novo inspetor.
+
+        maxPorCliente:  Quantidade máxima de pedidos de um mesmo cliente na fila. 0 para ilimitado.
+                        Os clientes são atendidos em rodízio (ver filaJusta).
+
+        aquecer:    Se definido como true, cada thread carrega seus modelos e executa uma inferência de
+                    aquecimento antes de atender o primeiro pedido (ver Inspector.aquecer). "pronto" é
+                    sinalizado quando todas terminarem. Padrão para true.
+        '''
+        self.lote = max(1, lote)
+        self.esperaLote = esperaLote
+        self.metricas = metricas if metricas is not None else mt.coletorMetricas(habilitado=False)
+        self.fila = filaJusta(tamanhoFila, maxPorCliente)
+        self.inspetores = [fabrica(self.metricas) for _ in range(max(1, instancias))]
+        self.ativo = True
+        self.aquecer = aquecer
+        self.pronto = threading.Event()
+        self._aquecidos = 0
+        self._trava = threading.Lock()
+        if not aquecer:
+            self.pronto.set()
+
+        self.threads = []
+        for inspetor in self.inspetores:
+            thread = threading.Thread(target=self._trabalhar, args=(inspetor,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+
+    '''
+    Coloca um frame BGR na fila e retorna um Future com o InspectionResult.
+        lmList: Landmarks já estimados para o frame. Se não informado, a postura é estimada pelo inspetor.
+        cliente: Identificação de quem enviou (câmera, endereço). Usada no rodízio entre clientes.
+    '''
+    def enviar(self, frame, requeridos=None, lmList=None, cliente=None):
+        if not self.ativo:
+            raise RuntimeError('pool de inspetores encerrado')
+        pedido = _pedido(frame, requeridos, lmList)
+        try:
+            self.fila.put_nowait(pedido, cliente)
+        except queue.Full:
+            self.metricas.incrementar('pedidos_rejeitados')
+            raise filaCheia('fila de inspeção cheia ({} pedidos)'.format(self.fila.maxsize))
+        return pedido.futuro
+
+
+    # Inspeciona um frame e aguarda o resultado
+    def inspecionar(self, frame, requeridos=None, timeout=None, lmList=None, cliente=None):
+        return self.enviar(frame, requeridos, lmList, cliente).result(timeout)
+
+
+    # Retira da fila até "lote" pedidos, aguardando no máximo esperaLote após o primeiro
+    def _coletarLote(self):
+        primeiro = self.fila.get()
+        if primeiro is None:
+            return None
+        pedidos = [primeiro]
+        limite = time.perf_counter() + self.esperaLote
+        while len(pedidos) < self.lote:
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                pedido = self.fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            if pedido is None:
+                # Fila fechada e vazia
+                break
+            pedidos.append(pedido)
+        return pedidos
+
+
+    # Aquece o inspetor da thread e sinaliza "pronto" quando todos estiverem aquecidos
+    def _aquecer(self, inspetor):
+        try:
+            inspetor.aquecer()
+        except Exception as erro:
+            # Os modelos serão carregados na primeira inspeção
+            print('Falha no aquecimento: {}'.format(erro))
+        with self._trava:
+            self._aquecidos += 1
+            if self._aquecidos == len(self.inspetores):
+                self.pronto.set()
+
+
+    # Aguarda o aquecimento de todos os inspetores. Retorna false se o tempo acabar antes
+    def aguardarPronto(self, timeout=None):
+        return self.pronto.wait(timeout)
+
+
+    '''
+    Laço de cada thread: coleta um lote, inspeciona e entrega os resultados.
+        Qualquer erro do lote é entregue aos pedidos que o aguardam (Future.set_exception), sem encerrar a thread.
+    '''
+    def _trabalhar(self, inspetor):
+        if self.aquecer:
+            self._aquecer(inspetor)
+        while True:
+            pedidos = self._coletarLote()
+            if pedidos is None:
+                return
+            try:
+                agora = time.perf_counter()
+                for pedido in pedidos:
+                    self.metricas.registrar('fila', agora - pedido.chegada)
+                with self.metricas.cronometrar('lote'):
+                    resultados = inspetor.inspecionarLote([p.frame for p in pedidos], [p.requeridos for p in pedidos],
+                                                          [p.lmList for p in pedidos])
+                if len(resultados) != len(pedidos):
+                    raise RuntimeError('lote com {} pedidos retornou {} resultados'.format(len(pedidos),
+                                                                                          len(resultados)))
+            except Exception as erro:
+                self.metricas.incrementar('pedidos_erro')
+                for pedido in pedidos:
+                    pedido.futuro.set_exception(erro)
+            else:
+                for pedido, resultado in zip(pedidos, resultados):
+                    pedido.futuro.set_result(resultado)
+
+
+    # Encerra as threads após o término dos pedidos já enfileirados
+    def encerrar(self):
+        if not self.ativo:
+            return
+        self.ativo = False
+        self.fila.fechar()
+        for thread in self.threads:
+            thread.join()
+
+
+'''
+Converte o parâmetro "requeridos" (ex: 1111100 ou 1,1,1,1,1,0,0) em lista de inteiros.
+'''
+def lerRequeridos(texto, quantidade=7):
+    digitos = [c for c in texto if c in '01']
+    if len(digitos) != quantidade:
+        raise ValueError('requeridos deve conter {} valores 0 ou 1'.format(quantidade))
+    return [int(c) for c in digitos]
+
+
+'''
+Cria o servidor HTTP do serviço de inspeção. Use serve_forever() para atendê-lo.
+'''
+def criarServidor(pool, host='127.0.0.1', porta=8080, timeout=30.0):
+    classNames = pool.inspetores[0].classNames
+
+    class _Handler(BaseHTTPRequestHandler):
+
+        def _responder(self, codigo, corpo, tipo='application/json'):
+            if not isinstance(corpo, bytes):
+                corpo = json.dumps(corpo).encode('utf-8')
+            self.send_response(codigo)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_GET(self):
+            rota = urllib.parse.urlparse(self.path).path
+            if rota == '/saude':
+                self._responder(200, {'instancias': len(pool.inspetores), 'lote': pool.lote,
+                                      'fila': pool.fila.qsize(), 'ativo': pool.ativo,
+                                      'pronto': pool.pronto.is_set()})
+            elif rota == '/metrics':
+                self._responder(200, pool.metricas.formatoPrometheus().encode('utf-8'),
+                                'text/plain; version=0.0.4; charset=utf-8')
+            else:
+                self._responder(404, {'erro': 'rota inexistente'})
+
+        def do_POST(self):
+            url = urllib.parse.urlparse(self.path)
+            if url.path != '/inspect':
+                self._responder(404, {'erro': 'rota inexistente'})
+                return
+
+            try:
+                tamanho = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                tamanho = -1
+            if tamanho < 0:
+                self._responder(400, {'erro': 'Content-Length inválido'})
+                return
+            dados = np.frombuffer(self.rfile.read(tamanho), dtype=np.uint8)
+            frame = cv2.imdecode(dados, cv2.IMREAD_COLOR) if tamanho else None
+            if frame is None:
+                self._responder(400, {'erro': 'imagem inválida'})
+                return
+
+            requeridos = None
+            parametros = urllib.parse.parse_qs(url.query)
+            if 'requeridos' in parametros:
+                try:
+                    requeridos = lerRequeridos(parametros['requeridos'][0], len(classNames))
+                except ValueError as erro:
+                    self._responder(400, {'erro': str(erro)})
+                    return
+
+            try:
+                resultado = pool.inspecionar(frame, requeridos, timeout, cliente=self.client_address[0])
+            except filaCheia as erro:
+                self._responder(503, {'erro': str(erro)})
+                return
+            except tempoEsgotado:
+                self._responder(504, {'erro': 'tempo de inspeção esgotado'})
+                return
+            except Exception as erro:
+                # Erro do inspetor, entregue pelo pool através do Future
+                print('Erro na inspeção: {!r}'.format(erro), file=sys.stderr)
+                self._responder(500, {'erro': '{}: {}'.format(type(erro).__name__, erro)})
+                return
+
+            resposta = resultado.paraDict(classNames)
+            resposta['pessoa'] = bool(resultado.lmList)
+            self._responder(200, resposta)
+
+        # Não imprime cada requisição no terminal
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, porta), _Handler)
+
+
+class clienteInspecao():
+
+    def __init__(self, url='http://127.0.0.1:8080', timeout=30.0):
+
+        '''
+        url:    Endereço do serviço de inspeção.
+
+        timeout:    Tempo máximo de espera por resposta, em segundos.
+        '''
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+
+    # Envia um frame BGR (ou os bytes de uma imagem JPEG/PNG) e retorna o resultado em forma de dicionário
+    def inspecionar(self, imagem, requeridos=None, qualidade=90):
+        if isinstance(imagem, np.ndarray):
+            ok, codificada = cv2.imencode('.jpg', imagem, [cv2.IMWRITE_JPEG_QUALITY, qualidade])
+            if not ok:
+                raise ValueError('não foi possível codificar a imagem')
+            imagem = codificada.tobytes()
+        endereco = self.url + '/inspect'
+        if requeridos is not None:
+            endereco += '?requeridos=' + ''.join(str(int(r)) for r in requeridos)
+        pedido = urllib.request.Request(endereco, data=imagem, headers={'Content-Type': 'image/jpeg'})
+        with urllib.request.urlopen(pedido, timeout=self.timeout) as resposta:
+            return json.loads(resposta.read().decode('utf-8'))
+
+
+    # Consulta o estado do serviço
+    def saude(self):
+        with urllib.request.urlopen(self.url + '/saude', timeout=self.timeout) as resposta:
+            return json.loads(resposta.read().decode('utf-8'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serviço local de inspeção de EPIs (HTTP).')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--instancias', type=int, default=1, help='inspetores carregados (padrão 1)')
+    parser.add_argument('--lote', type=int, default=1, help='frames por execução da rede (padrão 1)')
+    parser.add_argument('--espera-lote', type=float, default=10, help='espera máxima para formar lote, em ms')
+    parser.add_argument('--fila', type=int, default=32, help='pedidos aguardando antes de rejeitar (padrão 32)')
+    parser.add_argument('--politica', default=None, help='arquivo de política (.json/.yaml), recarregado ao alterar')
+    args = parser.parse_args(argv)
+
+    metricas = mt.coletorMetricas()
+    pool = poolInspetores(args.instancias, args.lote, args.espera_lote / 1000, args.fila, metricas)
+    if args.politica:
+        def aplicar(politica):
+            for inspetor in pool.inspetores:
+                inspetor.aplicarPolitica(politica)
+            print('Política "{}" aplicada'.format(politica.nome))
+        observadorPolitica(args.politica, aplicar).iniciar()
+    servidor = criarServidor(pool, args.host, args.porta)
+    print('Serviço de inspeção em http://{}:{}'.format(args.host, args.porta))
+
+    # O servidor atende /saude durante o aquecimento ("pronto": false)
+    inicio = time.perf_counter()
+
+    def informarPronto():
+        pool.aguardarPronto()
+        print('Pronto em {:.1f} s'.format(time.perf_counter() - inicio))
+    threading.Thread(target=informarPronto, daemon=True).start()
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        pool.encerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+'''
+Nome:   Varredura de limiares de confiança
+Sobre:  Executa o detector sobre imagens rotuladas (arquivos .txt da YOLO ao lado de cada imagem) com uma confiança
+        mínima baixa e calcula, para cada classe, a curva de precisão e revocação (recall) em função do limiar.
+        Como a supressão não máxima é gulosa pela confiança, filtrar as detecções depois da NMS equivale a
+        executar o detector com o limiar maior, então a rede é executada uma única vez por imagem.
+        Para cada classe é sugerido o maior limiar que ainda atinge a revocação desejada, ou seja, o que gera
+        menos detecções (e menos trabalho nas etapas seguintes) sem perder EPIs.
+Uso:    python -m vcad_epis.varredura --lista YOLOv4/data/test.txt --recall 0.9 --recall-classe luva=0.95
+Desenvolvedor: felipeSperb
+'''
+
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from .cache import cacheInferencia, compactarSaida, hashConfiguracao, hashFrame, pastaCache
+from .detector import detectorEPI, lerClasses
+
+
+# Limiares avaliados na curva
+limiaresPadrao = [round(0.05 * i, 2) for i in range(1, 20)] + [0.97, 0.99]
+
+
+'''
+Lê uma lista de imagens no formato do darknet (train.txt, test.txt), uma imagem por linha.
+    Caminhos relativos são resolvidos a partir de "raiz". Padrão para a raiz do darknet, a pasta acima da
+    pasta da lista: as linhas "data/obj/x.jpg" de "YOLOv4/data/test.txt" são resolvidas em "YOLOv4".
+'''
+def lerLista(arquivo, raiz=None):
+    if raiz is None:
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(arquivo)))
+    with open(arquivo, 'rt') as f:
+        for linha in f:
+            linha = linha.strip()
+            if linha:
+                yield linha if os.path.isabs(linha) else os.path.join(raiz, linha)
+
+
+'''
+Lê o arquivo de marcação de uma imagem: uma linha "classe x y w h" por objeto, coordenadas normalizadas.
+    Linhas fora do formato ou com classe fora de [0, quantidadeClasses) são ignoradas.
+    Retorna a lista de rótulos (vazia se o arquivo não existir) e a quantidade de linhas ignoradas.
+'''
+def lerRotulos(caminhoImagem, quantidadeClasses):
+    rotulos = []
+    ignorados = 0
+    arquivo = os.path.splitext(caminhoImagem)[0] + '.txt'
+    if not os.path.exists(arquivo):
+        return rotulos, ignorados
+    with open(arquivo, 'rt') as f:
+        for linha in f:
+            partes = linha.split()
+            if not partes:
+                continue
+            try:
+                classId = int(partes[0])
+                valores = [float(v) for v in partes[1:]]
+            except ValueError:
+                classId, valores = -1, []
+            if len(valores) != 4 or not 0 <= classId < quantidadeClasses:
+                ignorados += 1
+                continue
+            rotulos.append((classId, valores))
+    return rotulos, ignorados
+
+
+'''
+Intersecção sobre união de duas caixas (centro x, centro y, largura, altura).
+'''
+def iou(a, b):
+    ax1, ay1, ax2, ay2 = a[0] - a[2] / 2, a[1] - a[3] / 2, a[0] + a[2] / 2, a[1] + a[3] / 2
+    bx1, by1, bx2, by2 = b[0] - b[2] / 2, b[1] - b[3] / 2, b[0] + b[2] / 2, b[1] + b[3] / 2
+    inter = max(0.0, min(ax2, bx2) - max(ax1, bx1)) * max(0.0, min(ay2, by2) - max(ay1, by1))
+    uniao = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / uniao if uniao > 0 else 0.0
+
+
+'''
+Casa as detecções de uma imagem com os rótulos verdadeiros:
+    Em ordem decrescente de confiança, cada detecção é verdadeiro positivo se tiver IOU >= limiarIOU com um
+    rótulo da mesma classe ainda não casado. Cada rótulo é casado no máximo uma vez.
+    deteccoes: lista de (classId, confianca, posicao). rotulos: lista de (classId, posicao).
+    Retorna a lista de (classId, confianca, verdadeiroPositivo).
+'''
+def casar(deteccoes, rotulos, limiarIOU=0.5):
+    usados = [False] * len(rotulos)
+    registros = []
+    for classId, confianca, posicao in sorted(deteccoes, key=lambda d: -d[1]):
+        melhor, indice = limiarIOU, -1
+        for i, (classeRotulo, caixa) in enumerate(rotulos):
+            if usados[i] or classeRotulo != classId:
+                continue
+            valor = iou(posicao, caixa)
+            if valor >= melhor:
+                melhor, indice = valor, i
+        if indice >= 0:
+            usados[indice] = True
+        registros.append((classId, confianca, indice >= 0))
+    return registros
+
+
+'''
+Curva de precisão e revocação de uma classe.
+    registros: lista de (confianca, verdadeiroPositivo) da classe. totalRotulos: quantidade de objetos verdadeiros.
+    Retorna uma lista de dicionários {limiar, precisao, recall, deteccoes} para cada limiar.
+'''
+def curvaPR(registros, totalRotulos, limiares=limiaresPadrao):
+    confs = np.array([r[0] for r in registros], dtype=np.float64)
+    tps = np.array([r[1] for r in registros], dtype=bool)
+    curva = []
+    for limiar in limiares:
+        manter = confs > limiar
+        n = int(manter.sum())
+        tp = int(tps[manter].sum())
+        curva.append({
+            'limiar': limiar,
+            'precisao': tp / n if n else 1.0,
+            'recall': tp / totalRotulos if totalRotulos else 0.0,
+            'deteccoes': n
+        })
+    return curva
+
+
+'''
+Sugere o maior limiar da curva cuja revocação atinge o alvo. Retorna None se nenhum atingir.
+'''
+def sugerirLimiar(curva, recallAlvo):
+    candidatos = [p['limiar'] for p in curva if p['recall'] >= recallAlvo]
+    return max(candidatos) if candidatos else None
+
+
+'''
+Executa o detector em todas as imagens da lista e retorna os registros de cada classe, o total de rótulos e a
+quantidade de rótulos inválidos (ignorados, ver lerRotulos).
+    As imagens são lidas uma a uma, a memória usada não depende do tamanho da lista.
+    cache: Cache de inferência (ver cache.cacheInferencia). Imagens já vistas não executam a rede.
+'''
+def coletar(imagens, detector, limiarIOU=0.5, cache=None):
+    classNames = lerClasses()
+    registros = [[] for _ in classNames]
+    totais = [0] * len(classNames)
+    invalidos = 0
+    for caminho in imagens:
+        frame = cv2.imread(caminho)
+        if frame is None:
+            print('Imagem ignorada: {}'.format(caminho), file=sys.stderr)
+            continue
+        rotulos, ignorados = lerRotulos(caminho, len(classNames))
+        invalidos += ignorados
+        for classId, _ in rotulos:
+            totais[classId] += 1
+        if cache is None:
+            saida = detector.inferir(frame)
+        else:
+            chave = hashFrame(frame)
+            dados = cache.ler(chave)
+            if dados is None:
+                saida = [compactarSaida(detector.inferir(frame))]
+                cache.gravar(chave, saida[0], frame.shape)
+            else:
+                saida = [dados[0]]
+        deteccoes = [(d.classId, d.confianca, d.posicao) for d in detector.decodificar(saida, frame.shape)]
+        for classId, confianca, tp in casar(deteccoes, rotulos, limiarIOU):
+            registros[classId].append((confianca, tp))
+    return registros, totais, invalidos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Curvas de precisão e revocação por classe e sugestão de limiares.')
+    parser.add_argument('--lista', required=True, help='lista de imagens rotuladas (ex: data/test.txt)')
+    parser.add_argument('--raiz', default=None,
+                        help='pasta base dos caminhos relativos da lista (padrão: pasta acima da pasta da lista)')
+    parser.add_argument('--recall', type=float, default=0.9, help='revocação desejada para todas as classes')
+    parser.add_argument('--recall-classe', action='append', default=[], help='revocação de uma classe, ex: luva=0.95')
+    parser.add_argument('--iou', type=float, default=0.5, help='IOU mínimo para casar detecção e rótulo')
+    parser.add_argument('--minimo', type=float, default=0.05, help='confiança mínima usada na coleta')
+    parser.add_argument('--cache', default=None, const=pastaCache, nargs='?',
+                        help='usa o cache de inferência (pasta padrão: Arquivos/Cache)')
+    parser.add_argument('--saida', default=None, help='arquivo JSON do relatório (padrão: terminal)')
+    args = parser.parse_args(argv)
+
+    classNames = lerClasses()
+    alvos = [args.recall] * len(classNames)
+    for item in args.recall_classe:
+        nome, valor = item.split('=')
+        alvos[classNames.index(nome)] = float(valor)
+
+    detector = detectorEPI(confThreshold=args.minimo)
+    cache = cacheInferencia(args.cache, hashConfiguracao(detector)) if args.cache else None
+    registros, totais, invalidos = coletar(lerLista(args.lista, args.raiz), detector, args.iou, cache)
+    if invalidos:
+        print('Rótulos inválidos ignorados: {}'.format(invalidos), file=sys.stderr)
+
+    relatorio = {'classes': {}, 'confianca': {}, 'rotulosInvalidos': invalidos}
+    for c, nome in enumerate(classNames):
+        curva = curvaPR(registros[c], totais[c])
+        sugerido = sugerirLimiar(curva, alvos[c])
+        relatorio['classes'][nome] = {'rotulos': totais[c], 'recallAlvo': alvos[c], 'limiarSugerido': sugerido,
+                                      'curva': curva}
+        if sugerido is not None:
+            relatorio['confianca'][nome] = sugerido
+
+    texto = json.dumps(relatorio, indent=2)
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    # Resumo (a chave "confianca" do relatório pode ser copiada para o arquivo de política)
+    for nome in classNames:
+        c = relatorio['classes'][nome]
+        print('{:10s} rótulos: {:5d}  limiar sugerido: {}'.format(nome, c['rotulos'], c['limiarSugerido']),
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()